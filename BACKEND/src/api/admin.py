@@ -5,23 +5,25 @@ from django.contrib import messages
 from django.urls import path
 from django.http import HttpResponse, JsonResponse
 from .forms import CsvImportForm, ImageImportForm, CategoryCsvImportForm
+from .services.background_removal import requeue_jobs
+from .services.images import display_images_prefetch, get_display_image_url
+from .services.media_files import list_images
+from .services.ratings import rebuild_rating_summaries
+from .services.versions import bump_on_commit
 import csv
 import io
 import requests
 from requests.exceptions import RequestException
 from urllib.parse import urlparse
 from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
 from django.utils.text import slugify
 import os
 from pathlib import Path
-from django.conf import settings
 from django.core.paginator import Paginator
-from django.utils import timezone
-from datetime import datetime
-from urllib.parse import quote
 
 from decimal import InvalidOperation, Decimal
-from .models import SiteSettings, Category, Product, ProductImage, ProductCarousel, ProductPromotion, ParametrePage, Commentaire, Order, OrderItem, PendingPayPalOrder, PendingMTNMoMoOrder, PendingOrangeMoneyOrder
+from .models import SiteSettings, Category, Product, ProductImage, ProductCarousel, ProductPromotion, ParametrePage, Commentaire, Order, OrderItem, PendingPayPalOrder, PendingMTNMoMoOrder, PendingOrangeMoneyOrder, BackgroundRemovalJob, ImageDerivative
 
 
 
@@ -572,49 +574,9 @@ class CategoryAdmin(admin.ModelAdmin):
         return render(request, 'admin/import_category_images.html', context)
 
     def list_category_files_view(self, request):
-        """Vue pour afficher toutes les images du dossier media/categories/"""
-        # Chemin du dossier categories
-        categories_dir = settings.MEDIA_ROOT / 'categories'
-
-        # Créer le dossier s'il n'existe pas
-        categories_dir.mkdir(parents=True, exist_ok=True)
-
-        # Lister tous les fichiers image
-        image_extensions = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp', '.svg'}
-        files_data = []
-
-        if categories_dir.exists():
-            for file_path in categories_dir.iterdir():
-                if file_path.is_file() and file_path.suffix.lower() in image_extensions:
-                    # Obtenir les informations du fichier
-                    stat = file_path.stat()
-
-                    # Date de modification du fichier
-                    modified_time = datetime.fromtimestamp(stat.st_mtime, tz=timezone.get_current_timezone())
-
-                    # Taille du fichier
-                    size_bytes = stat.st_size
-                    size_mb = round(size_bytes / (1024 * 1024), 2)
-
-                    # Nom du fichier
-                    filename = file_path.name
-
-                    # URL du fichier
-                    relative_path = f'categories/{filename}'
-                    file_url = f"{settings.MEDIA_URL}{relative_path}"
-                    # URL encodée pour l'affichage dans le navigateur
-                    encoded_filename = quote(filename, safe='')
-                    full_url = f"{settings.MEDIA_URL}categories/{encoded_filename}"
-
-                    files_data.append({
-                        'name': filename,
-                        'url': file_url,
-                        'full_url': full_url,
-                        'size_bytes': size_bytes,
-                        'size_mb': size_mb,
-                        'modified_date': modified_time,
-                        'created_date': datetime.fromtimestamp(stat.st_ctime, tz=timezone.get_current_timezone()),
-                    })
+        """Vue pour afficher toutes les images du dossier categories/ du stockage des médias"""
+        # Stockage local ou partagé (STORAGES['default']) : tailles, dates et URL lues via le stockage
+        files_data = list_images('categories')
 
         # Trier par date de modification (plus récent en premier)
         files_data.sort(key=lambda x: x['modified_date'], reverse=True)
@@ -655,11 +617,11 @@ class CategoryAdmin(admin.ModelAdmin):
         # Sécuriser le nom du fichier (empêcher les paths relatifs)
         file_name = os.path.basename(file_name)
 
-        # Chemin complet du fichier
-        file_path = settings.MEDIA_ROOT / 'categories' / file_name
+        # Nom du fichier dans le stockage
+        storage_name = f'categories/{file_name}'
 
-        # Vérifier que le fichier existe et est dans le bon dossier
-        if file_path.exists() and file_path.parent == settings.MEDIA_ROOT / 'categories':
+        # Vérifier que le fichier existe
+        if file_name not in ('', '.', '..') and default_storage.exists(storage_name):
             try:
                 # Vérifier si l'image est utilisée par une catégorie
                 categories_using_image = Category.objects.filter(
@@ -675,7 +637,7 @@ class CategoryAdmin(admin.ModelAdmin):
                             category.save()
 
                 # Supprimer le fichier
-                file_path.unlink()
+                default_storage.delete(storage_name)
                 messages.success(request, f"L'image '{file_name}' a été supprimée avec succès.")
             except Exception as e:
                 messages.error(request, f"Erreur lors de la suppression: {str(e)}")
@@ -802,11 +764,15 @@ class ProductAdmin(admin.ModelAdmin):
 
     def make_active(self, request, queryset):
         queryset.update(is_active=True)
+        # update() n'envoie pas de signaux : invalider les index de listing
+        bump_on_commit('product', 'product_names')
 
     make_active.short_description = "Activer les produits sélectionnés"
 
     def make_inactive(self, request, queryset):
         queryset.update(is_active=False)
+        # update() n'envoie pas de signaux : invalider les index de listing
+        bump_on_commit('product', 'product_names')
 
     make_inactive.short_description = "Désactiver les produits sélectionnés"
 
@@ -1323,49 +1289,9 @@ class ProductAdmin(admin.ModelAdmin):
         return render(request, 'admin/import_images.html', context)
 
     def list_product_files_view(self, request):
-        """Vue pour afficher toutes les images du dossier media/products/"""
-        # Chemin du dossier products
-        products_dir = settings.MEDIA_ROOT / 'products'
-
-        # Créer le dossier s'il n'existe pas
-        products_dir.mkdir(parents=True, exist_ok=True)
-
-        # Lister tous les fichiers image
-        image_extensions = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp', '.svg'}
-        files_data = []
-
-        if products_dir.exists():
-            for file_path in products_dir.iterdir():
-                if file_path.is_file() and file_path.suffix.lower() in image_extensions:
-                    # Obtenir les informations du fichier
-                    stat = file_path.stat()
-
-                    # Date de modification du fichier
-                    modified_time = datetime.fromtimestamp(stat.st_mtime, tz=timezone.get_current_timezone())
-
-                    # Taille du fichier
-                    size_bytes = stat.st_size
-                    size_mb = round(size_bytes / (1024 * 1024), 2)
-
-                    # Nom du fichier
-                    filename = file_path.name
-
-                    # URL du fichier
-                    relative_path = f'products/{filename}'
-                    file_url = f"{settings.MEDIA_URL}{relative_path}"
-                    # URL encodée pour l'affichage dans le navigateur
-                    encoded_filename = quote(filename, safe='')
-                    full_url = f"{settings.MEDIA_URL}products/{encoded_filename}"
-
-                    files_data.append({
-                        'name': filename,
-                        'url': file_url,
-                        'full_url': full_url,
-                        'size_bytes': size_bytes,
-                        'size_mb': size_mb,
-                        'modified_date': modified_time,
-                        'created_date': datetime.fromtimestamp(stat.st_ctime, tz=timezone.get_current_timezone()),
-                    })
+        """Vue pour afficher toutes les images du dossier products/ du stockage des médias"""
+        # Stockage local ou partagé (STORAGES['default']) : tailles, dates et URL lues via le stockage
+        files_data = list_images('products')
 
         # Trier par date de modification (plus récent en premier)
         files_data.sort(key=lambda x: x['modified_date'], reverse=True)
@@ -1406,11 +1332,11 @@ class ProductAdmin(admin.ModelAdmin):
         # Sécuriser le nom du fichier (empêcher les paths relatifs)
         file_name = os.path.basename(file_name)
 
-        # Chemin complet du fichier
-        file_path = settings.MEDIA_ROOT / 'products' / file_name
+        # Nom du fichier dans le stockage
+        storage_name = f'products/{file_name}'
 
-        # Vérifier que le fichier existe et est dans le bon dossier
-        if file_path.exists() and file_path.parent == settings.MEDIA_ROOT / 'products':
+        # Vérifier que le fichier existe
+        if file_name not in ('', '.', '..') and default_storage.exists(storage_name):
             try:
                 # Vérifier si l'image est utilisée par un produit
                 products_using_image = Product.objects.filter(
@@ -1426,7 +1352,7 @@ class ProductAdmin(admin.ModelAdmin):
                             product.save()
 
                 # Supprimer le fichier
-                file_path.unlink()
+                default_storage.delete(storage_name)
                 messages.success(request, f"L'image '{file_name}' a été supprimée avec succès.")
             except Exception as e:
                 messages.error(request, f"Erreur lors de la suppression: {str(e)}")
@@ -1549,6 +1475,12 @@ class ProductCarouselAdmin(admin.ModelAdmin):
         }),
     )
 
+    def get_queryset(self, request):
+        # Images préchargées : aperçu sans requête par ligne
+        return super().get_queryset(request).select_related('product').prefetch_related(
+            display_images_prefetch('product__')
+        )
+
     # 💰 Prix du produit (lecture seule)
     def product_price(self, obj):
         return obj.product.price
@@ -1665,18 +1597,15 @@ class ProductPromotionAdmin(admin.ModelAdmin):
 
     discount_percent_display.short_description = "Réduction"
 
+    def get_queryset(self, request):
+        # Images préchargées : miniatures sans requête par ligne
+        return super().get_queryset(request).select_related('product').prefetch_related(
+            display_images_prefetch('product__')
+        )
+
     # 🔹 LOGIQUE IMAGE (réutilisable)
     def _get_product_image(self, obj):
-        primary = obj.product.images.filter(is_primary=True).first()
-        if primary:
-            return primary.image.url
-
-        first = obj.product.images.first()
-        if first:
-            return first.image.url
-
-        # Utilise image_display_url qui gère image ET image_url
-        return obj.product.image_display_url
+        return get_display_image_url(obj.product)
 
     # 🔹 PRÉ-REMPLIR promo_price
     def get_changeform_initial_data(self, request):
@@ -2064,21 +1993,31 @@ class CommentaireAdmin(admin.ModelAdmin):
     
     actions = ['approve_commentaires', 'reject_commentaires', 'flag_commentaires']
     
+    def _moderate(self, queryset, **values):
+        """
+        Mise à jour en masse (sans signaux) puis reconstruction des résumés
+        de notes des produits concernés, en une passe.
+        """
+        product_ids = set(queryset.values_list('product_id', flat=True))
+        updated = queryset.update(**values)
+        rebuild_rating_summaries(product_ids)
+        return updated
+
     def approve_commentaires(self, request, queryset):
         """Approuver les commentaires sélectionnés"""
-        updated = queryset.update(is_approved=True, is_flagged=False)
+        updated = self._moderate(queryset, is_approved=True, is_flagged=False)
         self.message_user(request, f'{updated} commentaire(s) approuvé(s).')
     approve_commentaires.short_description = "Approuver les commentaires sélectionnés"
     
     def reject_commentaires(self, request, queryset):
         """Rejeter les commentaires sélectionnés"""
-        updated = queryset.update(is_approved=False)
+        updated = self._moderate(queryset, is_approved=False)
         self.message_user(request, f'{updated} commentaire(s) rejeté(s).')
     reject_commentaires.short_description = "Rejeter les commentaires sélectionnés"
     
-    def     flag_commentaires(self, request, queryset):
+    def flag_commentaires(self, request, queryset):
         """Signaler les commentaires sélectionnés"""
-        updated = queryset.update(is_flagged=True, is_approved=False)
+        updated = self._moderate(queryset, is_flagged=True, is_approved=False)
         self.message_user(request, f'{updated} commentaire(s) signalé(s).')
     flag_commentaires.short_description = "Signaler les commentaires sélectionnés"
 
@@ -2192,4 +2131,31 @@ class PendingOrangeMoneyOrderAdmin(admin.ModelAdmin):
         ("Dates", {
             "fields": ("created_at", "updated_at"),
         }),
-    )
\ No newline at end of file
+    )
+
+@admin.register(BackgroundRemovalJob)
+class BackgroundRemovalJobAdmin(admin.ModelAdmin):
+    list_display = ("source_name", "status", "attempts", "next_attempt_at", "updated_at")
+    list_filter = ("status",)
+    search_fields = ("source_name", "output_name", "cache_key")
+    readonly_fields = ("cache_key", "source_name", "output_name", "attempts", "started_at", "last_error", "created_at", "updated_at")
+    ordering = ("-updated_at",)
+    actions = ["retry_jobs"]
+
+    def retry_jobs(self, request, queryset):
+        """Remettre en file les travaux sélectionnés (compteur de tentatives remis à zéro)"""
+        updated, running = requeue_jobs(queryset)
+        message = f'{updated} travail(aux) remis en file.'
+        if running:
+            message += f' {running} en cours de traitement, laissé(s) au processus qui les traite.'
+        self.message_user(request, message)
+    retry_jobs.short_description = "Relancer les travaux sélectionnés"
+
+
+@admin.register(ImageDerivative)
+class ImageDerivativeAdmin(admin.ModelAdmin):
+    list_display = ("source_name", "output_name", "profile", "output_size", "status", "updated_at")
+    list_filter = ("kind", "status", "profile")
+    search_fields = ("source_name", "output_name")
+    readonly_fields = ("kind", "source_name", "source_mtime", "source_size", "profile", "output_name", "output_size", "created_at", "updated_at")
+    ordering = ("-updated_at",)
@@ -1,6 +1,23 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def _ensure_search_index(sender, using, **kwargs):
+    """
+    Index de recherche FTS5 (créé par la migration 0024) : recréé si absent,
+    notamment pour la base de test construite sans migrations.
+    """
+    from django.db import connections
+    from .services.search import ensure_search_index
+
+    ensure_search_index(connections[using])
 
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from . import checks, signals  # noqa: F401  (enregistre les vérifications, branche les receivers)
+
+        post_migrate.connect(_ensure_search_index, sender=self)
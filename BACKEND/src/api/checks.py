@@ -0,0 +1,23 @@
+"""
+Vérifications de configuration (manage.py check, exécutées aussi au démarrage du serveur).
+"""
+from django.conf import settings
+from django.core.checks import Warning, register
+from django.core.files.storage import FileSystemStorage, storages
+
+
+@register()
+def shared_version_dir_check(app_configs, **kwargs):
+    """
+    Stockage partagé (plusieurs serveurs) : les versions de api.services.versions doivent l'être
+    aussi, sinon une image sans fond terminée sur un nœud n'invalide pas les caches des autres.
+    """
+    if isinstance(storages['default'], FileSystemStorage) or getattr(settings, 'CACHE_VERSION_DIR', None):
+        return []
+    return [Warning(
+        "Stockage de fichiers partagé, mais CACHE_VERSION_DIR n'est pas défini : les versions de cache "
+        "restent propres à chaque serveur.",
+        hint="Définir CACHE_VERSION_DIR sur un répertoire commun à tous les serveurs (NFS, EFS, ...), "
+             "voir DEPLOYMENT.md, « Plusieurs serveurs ».",
+        id='api.W001',
+    )]
@@ -0,0 +1,168 @@
+"""
+Benchmark de la suppression d'arrière-plan (rembg) sur un jeu d'images produits.
+
+Mesure, sur les mêmes images :
+- profils (api.services.background_removal.REMOVAL_PROFILES) : chargement du modèle,
+  latence par image, RSS maximale du processus et taille des sorties, chaque profil
+  dans un processus neuf (la RSS d'un profil n'inclut pas les modèles des autres) ;
+- sans session : rembg.remove() recharge le modèle à chaque image (ancien comportement),
+  contre la session réutilisée (get_rembg_session), pour le profil courant ;
+- débit du mode parallèle (remove_backgrounds_parallel) pour chaque --workers, chaque
+  mesure lancée depuis un processus neuf sans session : toutes les lignes, 1 processus
+  compris, incluent le chargement du modèle et sont donc comparables.
+
+Les images viennent de products/ dans le stockage des médias (les --limit premières par
+nom) ou de --images (noms dans le stockage, ex. products/chaise.jpg). Les sorties sont
+écrites sous bench_background_removal/<identifiant>/ dans le même stockage, puis
+supprimées : le cache n'est pas modifié.
+
+Usage:
+  python manage.py bench_background_removal
+  python manage.py bench_background_removal --profiles fast default --limit 12
+  python manage.py bench_background_removal --workers 1 2 4
+"""
+import os
+import resource
+import statistics
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import PurePosixPath
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+
+from api.services.background_removal import (
+    _init_pool_worker, _remove_background_and_save, get_rembg_session, get_removal_profile, nobg_output_format,
+    remove_backgrounds_parallel, removal_profiles,
+)
+
+IMAGE_SUFFIXES = {'.jpg', '.jpeg', '.png', '.webp'}
+
+
+def _sample_images(options):
+    if options['images']:
+        return options['images']
+    try:
+        _, files = default_storage.listdir('products')
+    except FileNotFoundError:
+        return []
+    images = sorted(f'products/{name}' for name in files if PurePosixPath(name).suffix.lower() in IMAGE_SUFFIXES)
+    return images[:options['limit']]
+
+
+def _read(name):
+    with default_storage.open(name, 'rb') as f:
+        return f.read()
+
+
+def _max_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # Ko sous Linux
+
+
+def _bench_profile(profile, images, out_dir):
+    """Exécuté dans un processus neuf : (chargement s, latences s, RSS max Mo, octets écrits)."""
+    _, params = get_removal_profile(profile)
+    start = time.perf_counter()
+    get_rembg_session(params['model'])
+    load = time.perf_counter() - start
+
+    latencies, written = [], 0
+    for i, name in enumerate(images):
+        output = f"{out_dir}/{profile}-{i}.{nobg_output_format()['format']}"
+        start = time.perf_counter()
+        _remove_background_and_save(name, output, profile)
+        latencies.append(time.perf_counter() - start)
+        written += default_storage.size(output)
+    return load, latencies, _max_rss_mb(), written
+
+
+def _bench_parallel(items, workers):
+    """Exécuté dans un processus neuf (sessions vidées par _init_pool_worker) : résultats du traitement."""
+    return list(remove_backgrounds_parallel(items, workers=workers))
+
+
+class Command(BaseCommand):
+    help = "Benchmark rembg : profils (latence, mémoire, taille), session réutilisée, traitement parallèle"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--images', nargs='+', help="Images à traiter, noms dans le stockage (défaut: products/)")
+        parser.add_argument('--limit', type=int, default=8, help="Nombre d'images de products/ (défaut: 8)")
+        parser.add_argument('--profiles', nargs='+', help="Profils à comparer (défaut: tous)")
+        parser.add_argument('--workers', nargs='+', type=int, default=[1, 2],
+                            help="Nombres de processus à comparer (défaut: 1 2)")
+
+    def handle(self, *args, **options):
+        try:
+            from rembg import new_session, remove
+        except ImportError:
+            raise CommandError("rembg n'est pas installé (pip install rembg).")
+
+        images = _sample_images(options)
+        if not images:
+            raise CommandError("Aucune image à traiter.")
+        source_bytes = sum(default_storage.size(name) for name in images)
+        profiles = options['profiles'] or list(removal_profiles())
+        for profile in profiles:
+            get_removal_profile(profile)  # profil inconnu : erreur avant le premier calcul
+        self.stdout.write(
+            f"{len(images)} image(s), {source_bytes / 1024:.0f} Ko en entrée, "
+            f"RSS du processus principal {_max_rss_mb():.0f} Mo"
+        )
+
+        out = f"bench_background_removal/{uuid.uuid4().hex}"
+        written_names = []
+        try:
+            self.stdout.write("Profils (un processus neuf par profil) :")
+            for profile in profiles:
+                extension = nobg_output_format()['format']
+                written_names += [f"{out}/{profile}-{i}.{extension}" for i in range(len(images))]
+                with ProcessPoolExecutor(max_workers=1) as pool:
+                    load, latencies, rss, written = pool.submit(_bench_profile, profile, images, out).result()
+                model = get_removal_profile(profile)[1]['model']
+                self.stdout.write(
+                    f"  {profile:<20} {model:<18} chargement {load:5.1f} s   "
+                    f"médiane {statistics.median(latencies):5.2f} s/image   max {max(latencies):5.2f} s   "
+                    f"RSS max {rss:6.0f} Mo   sortie {written / 1024:7.0f} Ko"
+                )
+
+            # Session créée à chaque appel (modèle rechargé), puis session du processus
+            no_session, with_session = [], []
+            session = get_rembg_session()  # chargement du modèle hors mesure
+            model = get_removal_profile()[1]['model']
+            for name in images:
+                data = _read(name)
+                start = time.perf_counter()
+                remove(data, session=new_session(model))  # ce que fait remove(data) sans session
+                no_session.append(time.perf_counter() - start)
+                start = time.perf_counter()
+                remove(data, session=session)
+                with_session.append(time.perf_counter() - start)
+            self.stdout.write(
+                f"Session ({get_removal_profile()[0]}) :\n"
+                f"  sans session        : {statistics.median(no_session):6.2f} s/image (médiane)\n"
+                f"  session réutilisée  : {statistics.median(with_session):6.2f} s/image (médiane)"
+            )
+
+            self.stdout.write("Traitement parallèle :")
+            for workers in options['workers']:
+                extension = nobg_output_format()['format']
+                items = [(name, f"{out}/{workers}-{i}.{extension}") for i, name in enumerate(images)]
+                written_names += [output for _, output in items]
+                # Processus neuf : la session chargée plus haut n'avantage pas la ligne à 1 processus
+                start = time.perf_counter()
+                with ProcessPoolExecutor(
+                    max_workers=1, initializer=_init_pool_worker, initargs=(os.cpu_count() or 1,),
+                ) as pool:
+                    results = pool.submit(_bench_parallel, items, workers).result()
+                elapsed = time.perf_counter() - start
+                errors = [error for _, _, error, _ in results if error]
+                if errors:
+                    raise CommandError(f"{len(errors)} erreur(s) : {errors[0]}")
+                self.stdout.write(
+                    f"  {workers} processus         : {len(images) / elapsed:6.2f} image(s)/s "
+                    f"({elapsed:.1f} s, processus neufs, chargement du modèle compris)"
+                )
+        finally:
+            for name in written_names:
+                default_storage.delete(name)
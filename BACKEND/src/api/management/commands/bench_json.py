@@ -0,0 +1,123 @@
+"""
+Compare le rendu et la lecture JSON de DRF (json) et d'orjson (api.renderers) sur
+les sorties réelles des serializers de l'API : page boutique, page de recherche,
+liste de commentaires et un gros listing. Les instances sont construites en
+mémoire : la base de données n'est pas utilisée.
+
+Usage:
+  python manage.py bench_json
+  python manage.py bench_json --items 5000 --repeat 200
+"""
+import io
+import random
+import statistics
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from api.management.commands.bench_search import BRANDS, WORDS
+from api.models import Category, Commentaire, Product
+from api.renderers import FastJSONParser, FastJSONRenderer, orjson
+from api.serializers import BoutiqueProductSerializer, CommentaireSerializer, ProductSearchSerializer
+
+
+class _BasePricing:
+    """Contexte 'pricing' sans requête : prix de base des produits (PricingResolver sans promotion)."""
+
+    def get(self, product):
+        return product.price, product.compare_at_price or product.price
+
+
+def _sentence(rng, count):
+    return ' '.join(rng.choice(WORDS) for _ in range(count))
+
+
+def _products(rng, count):
+    categories = [Category(id=i, name=f"{WORDS[i].capitalize()}", slug=f"categorie-{i}") for i in range(10)]
+    now = timezone.now()
+    return [
+        Product(
+            id=i,
+            name=f"{rng.choice(BRANDS)} {_sentence(rng, 4)} {i}",
+            slug=f"produit-{i}",
+            price=Decimal(rng.randrange(1000, 500000)) / 100,
+            compare_at_price=Decimal(rng.randrange(500000, 600000)) / 100,
+            image_url=f"https://cdn.example.com/produits/{i}.jpg",
+            description=_sentence(rng, 80),
+            shot_description=_sentence(rng, 15),
+            category=categories[i % len(categories)],
+            created_at=now - timedelta(minutes=i),
+            updated_at=now,
+        )
+        for i in range(1, count + 1)
+    ]
+
+
+def _page(results, page_size):
+    return {
+        'count': 1000, 'page': 1, 'page_size': page_size, 'total_pages': 1000 // page_size + 1,
+        'results': results, 'has_next': True, 'has_previous': False,
+    }
+
+
+def _time_ms(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+class Command(BaseCommand):
+    help = "Benchmark du rendu JSON de l'API : JSONRenderer de DRF contre FastJSONRenderer (orjson)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=1000, help="Taille du gros listing (défaut: 1000)")
+        parser.add_argument('--repeat', type=int, default=100, help="Répétitions par mesure (médiane)")
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            raise CommandError("orjson n'est pas installé : FastJSONRenderer utilise json (pip install orjson).")
+
+        rng = random.Random(42)
+        products = _products(rng, max(options['items'], 50))
+        comments = [
+            Commentaire(
+                id=i, product=products[i % len(products)], nom=f"Client {i}", email=f"client{i}@example.com",
+                commentaire=_sentence(rng, 30), note=rng.randint(1, 5), save_email=False, is_approved=True,
+                created_at=timezone.now(), updated_at=timezone.now(),
+            )
+            for i in range(1, 101)
+        ]
+        context = {'pricing': _BasePricing()}
+        payloads = {
+            'boutique (24)': _page(BoutiqueProductSerializer(products[:24], many=True, context=context).data, 24),
+            'recherche (50)': _page(ProductSearchSerializer(products[:50], many=True, context=context).data, 50),
+            'commentaires (100)': _page(CommentaireSerializer(comments, many=True).data, 100),
+            f"listing ({options['items']})": BoutiqueProductSerializer(
+                products[:options['items']], many=True, context=context
+            ).data,
+        }
+
+        drf_renderer, fast_renderer = JSONRenderer(), FastJSONRenderer()
+        drf_parser, fast_parser = JSONParser(), FastJSONParser()
+        for name, data in payloads.items():
+            body = drf_renderer.render(data)
+            if fast_renderer.render(data) != body:
+                raise CommandError(f"{name}: sortie différente de celle de JSONRenderer")
+
+            drf_ms = _time_ms(lambda: drf_renderer.render(data), options['repeat'])
+            fast_ms = _time_ms(lambda: fast_renderer.render(data), options['repeat'])
+            drf_parse_ms = _time_ms(lambda: drf_parser.parse(io.BytesIO(body)), options['repeat'])
+            fast_parse_ms = _time_ms(lambda: fast_parser.parse(io.BytesIO(body)), options['repeat'])
+            self.stdout.write(
+                f"  {name:<20} {len(body) / 1024:8.1f} Ko   rendu: json {drf_ms:7.3f} ms  orjson {fast_ms:7.3f} ms"
+                f" (x{drf_ms / fast_ms if fast_ms else 0:.1f})   lecture: json {drf_parse_ms:7.3f} ms"
+                f"  orjson {fast_parse_ms:7.3f} ms (x{drf_parse_ms / fast_parse_ms if fast_parse_ms else 0:.1f})"
+            )
@@ -0,0 +1,112 @@
+"""
+Coût par ligne des listings produits : ModelSerializer sur des instances complètes
+contre lecture allégée (api.services.projections : colonnes .only() + fonctions simples).
+
+Les lignes sont construites en mémoire comme le fait l'ORM (Model.from_db), avec
+toutes les colonnes ou seulement celles de la projection : la base de données
+n'est pas utilisée.
+
+Usage:
+  python manage.py bench_projections
+  python manage.py bench_projections --rows 24 100 1000 --repeat 50
+"""
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from api.management.commands.bench_json import _BasePricing, _sentence
+from api.management.commands.bench_search import BRANDS, WORDS
+from api.models import Category, Product
+from api.serializers import BoutiqueProductSerializer, MaSelectionProductSerializer, NewProductItemSerializer
+from api.services.projections import (
+    MA_SELECTION_PRODUCT_FIELDS, NEW_PRODUCT_FIELDS, PRODUCT_LIST_FIELDS,
+    ma_selection_product_data, new_product_data, product_list_data,
+)
+
+
+def _row_values(rng, i, now):
+    """Valeurs de toutes les colonnes d'un produit, par attname."""
+    return {
+        'id': i, 'name': f"{rng.choice(BRANDS)} {_sentence(rng, 4)} {i}", 'category_id': 1,
+        'slug': f"produit-{i}", 'description': _sentence(rng, 80), 'shot_description': _sentence(rng, 15),
+        'price': rng.randrange(1000, 500000), 'compare_at_price': None, 'image': '',
+        'image_url': f"https://cdn.example.com/produits/{i}.jpg", 'stock': 5, 'is_active': True,
+        'created_at': now - timedelta(minutes=i), 'updated_at': now, 'effective_price': 0,
+        'effective_compare_at_price': None, 'price_source': 'base', 'price_valid_until': None,
+    }
+
+
+def _materialize(rows, columns, category):
+    """Instances telles que les construit l'ORM pour SELECT <columns> (+ select_related('category'))."""
+    products = []
+    for values in rows:
+        product = Product.from_db('default', columns, [values[name] for name in columns])
+        product.category = category
+        products.append(product)
+    return products
+
+
+def _local_columns(projection):
+    """attnames des colonnes de Product lues par .only(*projection)."""
+    names = {field.split('__')[0] for field in projection}
+    return [f.attname for f in Product._meta.concrete_fields if f.name in names or f.attname in names]
+
+
+def _time_us_per_row(fn, rows, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1_000_000 / rows
+
+
+class Command(BaseCommand):
+    help = "Benchmark des listings produits : ModelSerializer contre projection (.only() + fonctions)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', nargs='+', type=int, default=[24, 100, 1000],
+                            help="Nombres de lignes (défaut: 24 100 1000)")
+        parser.add_argument('--repeat', type=int, default=30, help="Répétitions par mesure (médiane)")
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        now = timezone.now()
+        category = Category(id=1, name=WORDS[0].capitalize(), slug='categorie-1')
+        all_columns = [f.attname for f in Product._meta.concrete_fields]
+        pricing = _BasePricing()
+
+        shapes = [
+            ('boutique / recherche', PRODUCT_LIST_FIELDS,
+             lambda products: BoutiqueProductSerializer(products, many=True, context={'pricing': pricing}).data,
+             lambda products: product_list_data(products, pricing)),
+            ('nouveaux produits', NEW_PRODUCT_FIELDS,
+             lambda products: NewProductItemSerializer(products, many=True).data,
+             new_product_data),
+            ('ma selection', MA_SELECTION_PRODUCT_FIELDS,
+             lambda products: MaSelectionProductSerializer(products, many=True).data,
+             ma_selection_product_data),
+        ]
+
+        for count in options['rows']:
+            rows = [_row_values(rng, i, now) for i in range(1, count + 1)]
+            for name, projection, serialize, project in shapes:
+                columns = _local_columns(projection)
+                full = _materialize(rows, all_columns, category)
+                light = _materialize(rows, columns, category)
+                if [dict(item) for item in serialize(full)] != project(light):
+                    raise CommandError(f"{name}: représentation différente de celle du serializer")
+
+                before = _time_us_per_row(
+                    lambda: serialize(_materialize(rows, all_columns, category)), count, options['repeat'])
+                after = _time_us_per_row(
+                    lambda: project(_materialize(rows, columns, category)), count, options['repeat'])
+                self.stdout.write(
+                    f"  {count:>5} lignes  {name:<22} serializer: {before:7.1f} µs/ligne"
+                    f"   projection: {after:7.1f} µs/ligne   (x{before / after if after else 0:.1f}, "
+                    f"{len(columns)}/{len(all_columns)} colonnes)"
+                )
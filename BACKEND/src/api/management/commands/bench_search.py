@@ -0,0 +1,114 @@
+"""
+Compare la recherche icontains (LIKE sur 3 colonnes + count) et la recherche FTS5 (bm25)
+sur un catalogue synthétique. Utilise une base SQLite temporaire : la base du site
+n'est pas touchée.
+
+Usage:
+  python manage.py bench_search
+  python manage.py bench_search --sizes 10000 100000 --repeat 20
+"""
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.services.search import BM25_WEIGHTS, FTS_TABLE, build_match_query, search_index_statements
+
+
+WORDS = [
+    'ordinateur', 'portable', 'écran', 'clavier', 'souris', 'câble', 'réseau', 'imprimante',
+    'téléphone', 'chargeur', 'batterie', 'processeur', 'mémoire', 'disque', 'stockage',
+    'caméra', 'sécurité', 'routeur', 'commutateur', 'onduleur', 'haut-parleur', 'casque',
+    'tablette', 'accessoire', 'garantie', 'livraison', 'qualité', 'rapide', 'noir', 'blanc',
+]
+BRANDS = ['HP', 'Lenovo', 'Dell', 'Asus', 'Acer', 'Samsung', 'Epson', 'Canon', 'TP-Link', 'Cisco']
+QUERIES = ['ecran', 'imprimante epson', 'cable reseau', 'lenovo', 'batterie portable']
+
+
+def _sentence(rng, count):
+    return ' '.join(rng.choice(WORDS) for _ in range(count))
+
+
+def _build_database(path, size, rng):
+    db = sqlite3.connect(path)
+    db.execute(
+        "CREATE TABLE api_product (id INTEGER PRIMARY KEY, name TEXT, description TEXT, "
+        "shot_description TEXT, is_active BOOL, created_at TEXT)"
+    )
+    for statement in search_index_statements():
+        db.execute(statement)
+    rows = (
+        (
+            i + 1,
+            f"{rng.choice(BRANDS)} {_sentence(rng, 4)} {i}",
+            _sentence(rng, 80),
+            _sentence(rng, 15),
+            1,
+            f"2025-01-01 00:00:{i % 60:02d}",
+        )
+        for i in range(size)
+    )
+    db.executemany("INSERT INTO api_product VALUES (?, ?, ?, ?, ?, ?)", rows)
+    db.commit()
+    return db
+
+
+def _time_ms(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+class Command(BaseCommand):
+    help = "Benchmark de la recherche produits : icontains (LIKE) contre FTS5 (bm25)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[10000, 100000],
+                            help="Tailles de catalogue (défaut: 10000 100000)")
+        parser.add_argument('--repeat', type=int, default=10, help="Répétitions par requête (médiane)")
+        parser.add_argument('--limit', type=int, default=1000, help="Limite de résultats (défaut: 1000)")
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        weights = ', '.join(str(w) for w in BM25_WEIGHTS)
+        limit = options['limit']
+
+        for size in options['sizes']:
+            with tempfile.TemporaryDirectory() as tmp:
+                self.stdout.write(f"Construction d'un catalogue de {size} produits...")
+                db = _build_database(os.path.join(tmp, 'bench.sqlite3'), size, rng)
+
+                for query in QUERIES:
+                    pattern = f"%{query}%"
+
+                    def like_search():
+                        where = ("is_active AND (name LIKE ? OR description LIKE ? OR shot_description LIKE ?)")
+                        db.execute(f"SELECT COUNT(*) FROM api_product WHERE {where}", [pattern] * 3).fetchone()
+                        db.execute(
+                            f"SELECT id FROM api_product WHERE {where} ORDER BY created_at DESC LIMIT ?",
+                            [pattern] * 3 + [limit],
+                        ).fetchall()
+
+                    def fts_search():
+                        db.execute(
+                            f"SELECT api_product.id FROM api_product JOIN {FTS_TABLE} "
+                            f"ON {FTS_TABLE}.rowid = api_product.id "
+                            f"WHERE {FTS_TABLE} MATCH ? AND api_product.is_active "
+                            f"ORDER BY bm25({FTS_TABLE}, {weights}) LIMIT ?",
+                            [build_match_query(query), limit],
+                        ).fetchall()
+
+                    like_ms = _time_ms(like_search, options['repeat'])
+                    fts_ms = _time_ms(fts_search, options['repeat'])
+                    self.stdout.write(
+                        f"  {size:>7} produits  q={query!r:<22} icontains: {like_ms:8.2f} ms"
+                        f"   fts5: {fts_ms:8.2f} ms   (x{like_ms / fts_ms if fts_ms else 0:.1f})"
+                    )
+                db.close()
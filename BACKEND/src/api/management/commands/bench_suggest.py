@@ -0,0 +1,74 @@
+"""
+Mesure l'index d'autocomplétion (api.services.suggest) sur un catalogue synthétique :
+temps de construction, mémoire occupée et latence des suggestions.
+N'utilise pas la base de données.
+
+Usage:
+  python manage.py bench_suggest
+  python manage.py bench_suggest --products 100000 --categories 200
+"""
+import random
+import statistics
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from api.management.commands.bench_search import BRANDS, WORDS
+from api.services.suggest import SuggestIndex
+
+QUERIES = ['e', 'ec', 'ecr', 'lenovo', 'imprimante ep', 'cable res', 'hp por', 'xyz']
+
+
+class Command(BaseCommand):
+    help = "Benchmark de l'index d'autocomplétion : construction, mémoire, latence"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100000, help="Nombre de produits (défaut: 100000)")
+        parser.add_argument('--categories', type=int, default=200, help="Nombre de catégories (défaut: 200)")
+        parser.add_argument('--repeat', type=int, default=200, help="Répétitions par requête (médiane)")
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        products = [
+            (i, f"{rng.choice(BRANDS)} {' '.join(rng.choice(WORDS) for _ in range(4))} {i}", f"produit-{i}")
+            for i in range(1, options['products'] + 1)
+        ]
+        categories = [
+            (i, f"{rng.choice(WORDS).capitalize()} {i}", f"categorie-{i}")
+            for i in range(1, options['categories'] + 1)
+        ]
+
+        index = SuggestIndex()
+        start = time.perf_counter()
+        index.build(products, categories)
+        build_s = time.perf_counter() - start
+
+        # Mémoire : seconde construction sous tracemalloc (plus lente, non chronométrée)
+        tracemalloc.start()
+        measured = SuggestIndex()
+        measured.build(products, categories)
+        traced, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del measured
+
+        self.stdout.write(
+            f"{len(index)} entrées indexées en {build_s:.2f} s — mémoire: "
+            f"{traced / 1024 / 1024:.1f} Mo (tracemalloc), {index.memory_usage() / 1024 / 1024:.1f} Mo (estimation)"
+        )
+
+        for query in QUERIES:
+            timings = []
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                results = index.search(query, 8)
+                timings.append((time.perf_counter() - start) * 1000)
+            self.stdout.write(
+                f"  q={query!r:<16} {statistics.median(timings):7.3f} ms (médiane)"
+                f"  p95 {sorted(timings)[int(len(timings) * 0.95) - 1]:7.3f} ms  {len(results)} résultat(s)"
+            )
+
+        start = time.perf_counter()
+        for pk, name, slug in products[:1000]:
+            index.upsert('product', pk, name + ' v2', slug)
+        self.stdout.write(f"Mise à jour incrémentale: {(time.perf_counter() - start):.3f} ms par produit")
@@ -0,0 +1,21 @@
+"""
+Construit l'instantané pré-rendu de la page d'accueil (/api/homepage/snapshot/).
+Normalement reconstruit automatiquement (signaux, expiration) : à exécuter après
+un déploiement pour que la première requête ne paie pas la construction.
+
+Usage:
+  python manage.py build_homepage_snapshot
+"""
+from django.core.management.base import BaseCommand
+
+from api.services.homepage import build_snapshot
+
+
+class Command(BaseCommand):
+    help = "Construit l'instantané pré-rendu de la page d'accueil"
+
+    def handle(self, *args, **options):
+        snapshot = build_snapshot()
+        self.stdout.write(self.style.SUCCESS(
+            f"Terminé: {len(snapshot.body)} octets ({len(snapshot.gzip_body)} en gzip), ETag {snapshot.etag}"
+        ))
@@ -1,15 +1,34 @@
 """
 Commande de pre-warm du cache des images carousel sans arrière-plan.
-À exécuter après le déploiement en production pour éviter les premiers appels lents.
+À exécuter après le déploiement en production : les images sont traitées immédiatement,
+sans passer par la file (process_background_removal_jobs). Chaque image est réservée
+comme un travail de la file (acquire_job) juste avant son traitement, pas au moment de la
+collecte : une image déjà en cours sur un autre nœud (worker ou autre pre-warm) est laissée
+à celui-ci, et une réservation n'attend jamais assez pour être reprise comme interrompue.
+Si le traitement s'arrête (pool cassé, processus tué par manque de mémoire), les images
+réservées non terminées sont rendues à la file comme une tentative échouée.
+
+--workers N répartit les images sur N processus (une session rembg chacun, les cœurs
+partagés entre eux). Le rapport donne la durée de chaque image, le débit total et,
+pour la sortie (WebP rogné et réduit, voir nobg_output_format), la taille et la durée
+d'encodage comparées au PNG pleine taille de l'ancienne sortie (--no-compare pour l'omettre).
 
 Usage:
   python manage.py prewarm_carousel_nobg
+  python manage.py prewarm_carousel_nobg --workers 4
 """
+import time
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
 from django.core.management.base import BaseCommand
 from django.conf import settings
 
 from api.models import ProductCarousel
-from api.services.background_removal import get_carousel_image_no_background
+from api.services.background_removal import (
+    acquire_job, complete_job, nobg_output_format, nobg_target, record_derivative, remove_backgrounds_parallel,
+)
+from api.services.images import display_images_prefetch, get_display_image_field
 
 
 class Command(BaseCommand):
@@ -22,6 +41,17 @@ class Command(BaseCommand):
             default=True,
             help="Ne traiter que les produits carousel actifs (défaut: True)",
         )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Nombre de processus de traitement (défaut: 1)",
+        )
+        parser.add_argument(
+            "--no-compare",
+            action="store_true",
+            help="Ne pas encoder le PNG pleine taille de comparaison",
+        )
 
     def handle(self, *args, **options):
         if not getattr(settings, "CAROUSEL_REMOVE_BACKGROUND", True):
@@ -32,7 +62,9 @@ class Command(BaseCommand):
             )
             return
 
-        queryset = ProductCarousel.objects.select_related("product")
+        queryset = ProductCarousel.objects.select_related("product").prefetch_related(
+            display_images_prefetch("product__")
+        )
         if options.get("active_only", True):
             queryset = queryset.filter(is_active=True)
 
@@ -43,41 +75,115 @@ class Command(BaseCommand):
 
         self.stdout.write(f"Pré-traitement de {total} produit(s) carousel...")
 
-        ok = 0
         skipped = 0
-        errors = 0
+        cached = 0
+        locked = 0
+        items = {}  # nom de la source -> (clé, nom de la sortie) ; une image partagée n'est traitée qu'une fois
+        names = {}
+        jobs = {}  # nom de la source -> travail réservé non terminé (BackgroundRemovalJob)
 
         for carousel in queryset:
-            image_field = None
-            primary = carousel.product.images.filter(is_primary=True).first()
-            if primary and primary.image:
-                image_field = primary.image
-            else:
-                first = carousel.product.images.first()
-                if first and first.image:
-                    image_field = first.image
-            if not image_field and carousel.product.image:
-                image_field = carousel.product.image
+            image_field = get_display_image_field(carousel.product)
 
             if not image_field:
                 skipped += 1
                 continue
 
+            source_name = image_field.name
+            if source_name in items:
+                continue
             try:
-                url = get_carousel_image_no_background(image_field)
-                if url and "carousel_nobg" in str(url):
-                    ok += 1
-                    self.stdout.write(f"  OK: {carousel.product.name}")
-                else:
+                if not default_storage.exists(source_name):
                     skipped += 1
-            except Exception as e:
-                errors += 1
-                self.stdout.write(
-                    self.style.ERROR(f"  Erreur {carousel.product.name}: {e}")
+                    continue
+                cache_key, output_name = nobg_target(source_name)
+            except (ValueError, OSError, SuspiciousFileOperation):
+                skipped += 1
+                continue
+
+            if default_storage.exists(output_name):
+                # Déjà calculée : enregistrée si elle ne l'est pas encore (ImageDerivative)
+                record_derivative(source_name, output_name)
+                cached += 1
+                continue
+            items[source_name] = (cache_key, output_name)
+            names[source_name] = carousel.product.name
+
+        def reserved():
+            """Réserve chaque image au moment où un processus est libre pour la traiter."""
+            nonlocal locked
+            for source_name, (cache_key, output_name) in items.items():
+                job = acquire_job(cache_key, source_name, output_name)
+                if job is None:
+                    locked += 1
+                    self.stdout.write(f"  En cours sur un autre nœud : {names[source_name]}")
+                    continue
+                jobs[source_name] = job
+                yield source_name, output_name
+
+        ok = 0
+        errors = 0
+        busy = 0.0
+        totals = {"source_bytes": 0, "bytes": 0, "encode_seconds": 0.0, "png_bytes": 0, "png_encode_seconds": 0.0}
+        compare = not options["no_compare"]
+        start = time.perf_counter()
+
+        results = remove_backgrounds_parallel(reserved(), workers=options["workers"], compare=compare)
+        try:
+            for source, duration, error, stats in results:
+                busy += duration
+                job = jobs.pop(source)
+                if error:
+                    errors += 1
+                    complete_job(job, error)
+                    self.stdout.write(self.style.ERROR(f"  Erreur {names[source]}: {error}"))
+                    continue
+                ok += 1
+                record_derivative(source, items[source][1])
+                # Réponses du carousel et instantané de la page d'accueil recalculés (bump('carousel'))
+                complete_job(job)
+                stats["source_bytes"] = default_storage.size(source)
+                for key in totals:
+                    totals[key] += stats.get(key, 0)
+                line = (
+                    f"  OK: {names[source]} ({duration:.2f} s) source {stats['source_bytes'] / 1024:.0f} Ko, "
+                    f"sortie {stats['bytes'] / 1024:.0f} Ko en {stats['encode_seconds'] * 1000:.0f} ms"
                 )
+                if compare:
+                    line += (
+                        f" (PNG pleine taille {stats['png_bytes'] / 1024:.0f} Ko "
+                        f"en {stats['png_encode_seconds'] * 1000:.0f} ms)"
+                    )
+                self.stdout.write(line)
+        except BaseException as e:
+            # Réservations en cours rendues à la file (retentées après le délai, ou abandonnées)
+            for job in jobs.values():
+                complete_job(job, f"Pre-warm interrompu ({type(e).__name__}: {e})")
+            raise
+
+        elapsed = time.perf_counter() - start
 
         self.stdout.write(
             self.style.SUCCESS(
-                f"Terminé: {ok} traité(s), {skipped} ignoré(s), {errors} erreur(s)"
+                f"Terminé: {ok} traité(s), {cached} déjà en cache, {locked} en cours ailleurs, "
+                f"{skipped} ignoré(s), {errors} erreur(s)"
             )
         )
+        processed = ok + errors
+        if processed:
+            self.stdout.write(
+                f"Durée totale {elapsed:.1f} s, {processed / max(elapsed, 1e-6):.2f} image(s)/s "
+                f"({options['workers']} processus, {busy / processed:.2f} s par image en moyenne)"
+            )
+        if ok:
+            output = nobg_output_format()
+            summary = (
+                f"Sortie {output['format'].upper()} {output['max_size'][0]}x{output['max_size'][1]} max : "
+                f"{totals['bytes'] / 1024:.0f} Ko en {totals['encode_seconds']:.2f} s "
+                f"(sources {totals['source_bytes'] / 1024:.0f} Ko)"
+            )
+            if compare:
+                summary += (
+                    f", PNG pleine taille {totals['png_bytes'] / 1024:.0f} Ko en {totals['png_encode_seconds']:.2f} s"
+                )
+            self.stdout.write(summary)
@@ -0,0 +1,38 @@
+"""
+Worker de la file de suppression d'arrière-plan (BackgroundRemovalJob).
+Les images du carousel pas encore traitées sont mises en file par l'API ; ce
+worker les traite une par une, hors requêtes HTTP. Plusieurs workers peuvent
+tourner en parallèle : chaque travail est réservé par un seul d'entre eux.
+
+Usage:
+  python manage.py process_background_removal_jobs            # en continu (service)
+  python manage.py process_background_removal_jobs --once     # vide la file puis s'arrête (cron)
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.services.background_removal import process_pending_jobs
+
+
+class Command(BaseCommand):
+    help = "Traite la file des suppressions d'arrière-plan des images du carousel"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Traiter les travaux dus puis s'arrêter")
+        parser.add_argument("--sleep", type=float, default=5.0,
+                            help="Attente (secondes) quand la file est vide (défaut: 5)")
+
+    def handle(self, *args, **options):
+        if options["once"]:
+            processed = process_pending_jobs()
+            self.stdout.write(self.style.SUCCESS(f"Terminé: {processed} travail(aux) traité(s)"))
+            return
+
+        self.stdout.write("Worker de suppression de fond démarré (Ctrl+C pour arrêter)")
+        try:
+            while True:
+                if not process_pending_jobs(limit=50):
+                    time.sleep(options["sleep"])
+        except KeyboardInterrupt:
+            self.stdout.write("Arrêt du worker")
@@ -0,0 +1,18 @@
+"""
+Reconstruit les résumés de notes des produits (ProductRatingSummary) en une passe.
+À exécuter après une modification directe des commentaires en base.
+
+Usage:
+  python manage.py rebuild_rating_summaries
+"""
+from django.core.management.base import BaseCommand
+
+from api.services.ratings import rebuild_rating_summaries
+
+
+class Command(BaseCommand):
+    help = "Reconstruit les résumés de notes (nombre, somme, répartition 1-5 étoiles) de tous les produits"
+
+    def handle(self, *args, **options):
+        total = rebuild_rating_summaries()
+        self.stdout.write(self.style.SUCCESS(f"Terminé: {total} résumé(s) reconstruit(s)"))
@@ -0,0 +1,21 @@
+"""
+Reconstruit l'index de recherche plein texte des produits (table FTS5 api_product_fts).
+Normalement inutile (triggers SQLite) : à exécuter après une restauration de base
+ou une modification de la table api_product hors Django.
+
+Usage:
+  python manage.py rebuild_search_index
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from api.services.search import fts_enabled, rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = "Reconstruit l'index de recherche plein texte (FTS5) des produits"
+
+    def handle(self, *args, **options):
+        if not fts_enabled():
+            raise CommandError("La recherche FTS5 nécessite SQLite (PRODUCT_SEARCH_FTS activé).")
+        total = rebuild_search_index()
+        self.stdout.write(self.style.SUCCESS(f"Terminé: {total} produit(s) indexé(s)"))
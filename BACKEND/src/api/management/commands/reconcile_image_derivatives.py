@@ -0,0 +1,137 @@
+"""
+Compare en bloc les images dérivées enregistrées (ImageDerivative) aux fichiers du stockage
+des médias (STORAGES['default'], local ou partagé) :
+- périmées : source supprimée, ou remplacée sous le même nom (date ou taille différente) ;
+  pour une ligne en file ou en échec, aussi un travail (BackgroundRemovalJob) supprimé ou
+  terminé sans sortie enregistrée ;
+- sorties manquantes : ligne prête dont le fichier n'existe plus ;
+- autre profil : ligne d'un profil ou format qui n'est plus celui de la configuration ;
+- fichiers orphelins : fichiers de carousel_nobg/ qu'aucune ligne ne référence, dont les
+  temporaires d'une écriture interrompue (plus anciens que --min-age, un worker peut être
+  en train d'écrire les plus récents).
+
+Sans --fix, la commande ne fait que le rapport. Avec --fix : les lignes périmées passent
+au statut « Périmée » (l'image est remise en file au prochain affichage), les lignes sans
+sortie et d'un autre profil sont supprimées, ainsi que les fichiers qui ne servent plus.
+
+Usage:
+  python manage.py reconcile_image_derivatives
+  python manage.py reconcile_image_derivatives --fix
+"""
+import time
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from api.models import BackgroundRemovalJob, ImageDerivative
+from api.services.background_removal import nobg_profile
+from api.services.versions import bump
+
+DERIVATIVE_DIR = 'carousel_nobg'
+
+
+def _output_files():
+    """{nom dans le stockage: timestamp de modification} des fichiers de carousel_nobg/."""
+    try:
+        _, files = default_storage.listdir(DERIVATIVE_DIR)
+    except FileNotFoundError:
+        return {}
+    names = (f"{DERIVATIVE_DIR}/{filename}" for filename in files)
+    return {name: default_storage.get_modified_time(name).timestamp() for name in names}
+
+
+def _source_stat(name):
+    """(timestamp de modification, taille) de la source, ou None si elle n'existe plus."""
+    try:
+        if not default_storage.exists(name):
+            return None
+        return default_storage.get_modified_time(name).timestamp(), default_storage.size(name)
+    except FileNotFoundError:
+        return None
+
+
+class Command(BaseCommand):
+    help = "Détecte (et corrige avec --fix) les images dérivées périmées, manquantes ou orphelines"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--fix", action="store_true", help="Corriger au lieu de seulement signaler")
+        parser.add_argument("--min-age", type=int, default=3600,
+                            help="Âge minimal (secondes) d'un fichier orphelin à supprimer (défaut: 3600)")
+
+    def handle(self, *args, **options):
+        current_profile = nobg_profile()
+        files = _output_files()
+
+        stale, missing, other_profile = [], [], []
+        referenced = set()
+        rows = ImageDerivative.objects.filter(kind=ImageDerivative.KIND_CAROUSEL_NOBG).only(
+            "id", "source_name", "source_mtime", "source_size", "profile", "output_name", "status",
+        )
+        waiting = []  # lignes en file ou en échec : comparées aux travaux ci-dessous
+        for row in rows.iterator(chunk_size=1000):
+            if row.profile != current_profile:
+                other_profile.append(row)
+                continue
+            referenced.add(row.output_name)
+            if row.status == ImageDerivative.STATUS_STALE:
+                continue
+            if _source_stat(row.source_name) != (row.source_mtime, row.source_size):
+                stale.append(row)
+            elif row.status != ImageDerivative.STATUS_READY:
+                waiting.append(row)
+            elif row.output_name not in files:
+                missing.append(row)
+
+        # Un travail par fichier de sortie (même clé, voir nobg_target)
+        job_statuses = dict(BackgroundRemovalJob.objects.filter(
+            output_name__in=[row.output_name for row in waiting],
+        ).values_list("output_name", "status"))
+        stale.extend(
+            row for row in waiting
+            if job_statuses.get(row.output_name) in (None, BackgroundRemovalJob.STATUS_DONE)
+        )
+
+        now = time.time()
+        orphans = [
+            name for name, mtime in files.items()
+            if name not in referenced and now - mtime >= options["min_age"]
+        ]
+
+        self.stdout.write(
+            f"{len(stale)} périmée(s), {len(missing)} sortie(s) manquante(s), "
+            f"{len(other_profile)} d'un autre profil, {len(orphans)} fichier(s) orphelin(s)"
+        )
+        if options["verbosity"] > 1:
+            for label, names in (
+                ("périmée", [row.source_name for row in stale]),
+                ("manquante", [row.output_name for row in missing]),
+                ("autre profil", [row.output_name for row in other_profile]),
+                ("orphelin", orphans),
+            ):
+                for name in names:
+                    self.stdout.write(f"  {label}: {name}")
+
+        if not options["fix"]:
+            if stale or missing or other_profile or orphans:
+                self.stdout.write("Relancer avec --fix pour corriger.")
+            return
+
+        # Fichiers qui ne servent plus : sorties périmées ou d'un autre profil, orphelins
+        obsolete = {row.output_name for row in stale + other_profile} - {row.output_name for row in missing}
+        obsolete.update(orphans)
+        deleted = 0
+        for name in obsolete:
+            if default_storage.exists(name):
+                default_storage.delete(name)
+                deleted += 1
+
+        ImageDerivative.objects.filter(pk__in=[row.pk for row in stale]).update(status=ImageDerivative.STATUS_STALE)
+        ImageDerivative.objects.filter(pk__in=[row.pk for row in missing + other_profile]).delete()
+        if stale or missing:
+            # Réponses du carousel à recalculer : ces images sont servies en original puis remises en file
+            bump("carousel")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Terminé: {len(stale)} ligne(s) marquée(s) périmée(s), {len(missing) + len(other_profile)} "
+            f"ligne(s) supprimée(s), {deleted} fichier(s) supprimé(s)"
+        ))
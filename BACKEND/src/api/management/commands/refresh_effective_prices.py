@@ -0,0 +1,38 @@
+"""
+Recalcule les prix effectifs matérialisés sur Product (effective_price, ...).
+Les listings recalculent déjà à la demande les prix dont une borne de flash ou de
+promotion est passée ; cette commande permet de le faire par cron ou de tout recalculer.
+
+Usage:
+  python manage.py refresh_effective_prices          # prix dont une borne est passée
+  python manage.py refresh_effective_prices --all    # tous les produits
+"""
+from django.core.management.base import BaseCommand
+
+from api.models import Product
+from api.services.pricing import (
+    EFFECTIVE_PRICE_FIELDS,
+    refresh_effective_prices,
+    refresh_expired_prices,
+)
+
+
+class Command(BaseCommand):
+    help = "Recalcule les prix effectifs (flash / promotion / prix de base) des produits"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            default=False,
+            help="Recalculer tous les produits (défaut: seulement ceux dont une borne est passée)",
+        )
+
+    def handle(self, *args, **options):
+        if options["all"]:
+            products = Product.objects.only("id", "price", "compare_at_price", *EFFECTIVE_PRICE_FIELDS)
+            updated = refresh_effective_prices(products)
+        else:
+            updated = refresh_expired_prices()
+
+        self.stdout.write(self.style.SUCCESS(f"Terminé: {updated} produit(s) mis à jour"))
@@ -0,0 +1,92 @@
+"""
+Middlewares d'instrumentation de l'API.
+
+MetricsMiddleware (settings.METRICS_ENABLED) : durée, code de réponse et temps SQL
+de chaque requête, par nom de route (api.services.metrics, exposé sur /metrics).
+
+QueryBudgetMiddleware (settings.QUERY_BUDGET_ENABLED) : requêtes SQL de chaque requête HTTP
+- en-têtes X-DB-Queries et Server-Timing (durée SQL / durée totale), hors production
+  (settings.QUERY_BUDGET_HEADERS, par défaut DEBUG) ;
+- avertissement (logger api.query_budget) quand une route dépasse son budget de
+  requêtes ou répète la même requête (N+1), voir api.services.query_budget.
+"""
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from .services import metrics
+from .services.query_budget import QueryRecorder, get_query_budget
+
+logger = logging.getLogger('api.query_budget')
+
+
+def _route_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return (match.url_name if match else None) or 'unmatched'
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        if not metrics.metrics_enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        db_time = [0.0]
+
+        def timed_execute(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                db_time[0] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timed_execute))
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        route = _route_name(request)
+        metrics.inc('http_requests_total', route=route, method=request.method, status=str(response.status_code))
+        metrics.observe('http_request_duration_seconds', duration, route=route, method=request.method)
+        metrics.observe('http_request_db_duration_seconds', db_time[0], route=route)
+        return response
+
+
+class QueryBudgetMiddleware:
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_BUDGET_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.headers = getattr(settings, 'QUERY_BUDGET_HEADERS', settings.DEBUG)
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with recorder.record():
+            response = self.get_response(request)
+        total = time.perf_counter() - start
+
+        route = _route_name(request)
+        budget = get_query_budget(route)
+        repeated = recorder.repeated()
+        if recorder.count > budget or repeated:
+            logger.warning(
+                "%s %s (%s): %d requête(s) SQL pour un budget de %d, %.1f ms%s",
+                request.method, request.path, route, recorder.count, budget, recorder.duration * 1000,
+                ''.join(f"\n  {count}x {sql[:300]}" for sql, count in repeated),
+            )
+
+        if self.headers:
+            response['X-DB-Queries'] = str(recorder.count)
+            response['Server-Timing'] = (
+                f'db;dur={recorder.duration * 1000:.1f};desc="{recorder.count} requêtes SQL", '
+                f'total;dur={total * 1000:.1f}'
+            )
+        return response
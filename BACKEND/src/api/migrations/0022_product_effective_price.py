@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:09
+
+from django.db import migrations, models
+from django.db.models import F
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+
+def init_effective_prices(apps, schema_editor):
+    """
+    Prix de base immédiatement, puis price_valid_until dans le passé :
+    le premier listing (refresh_expired_prices) applique flashs et promotions.
+    """
+    Product = apps.get_model('api', 'Product')
+    Product.objects.update(
+        effective_price=F('price'),
+        effective_compare_at_price=Coalesce(F('compare_at_price'), F('price')),
+        price_source='base',
+        price_valid_until=timezone.now(),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0021_remove_parametrepage_ma_selection_title_maselection'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='effective_compare_at_price',
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='effective_price',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='price_source',
+            field=models.CharField(choices=[('base', 'Prix de base'), ('promotion', 'Promotion'), ('flash', 'Flash')], default='base', editable=False, max_length=10),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='price_valid_until',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, help_text='Prochaine date de début/fin de flash ou de promotion (recalcul du prix effectif)', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_active', 'effective_price'], name='api_product_is_acti_b786c7_idx'),
+        ),
+        migrations.RunPython(init_effective_prices, migrations.RunPython.noop),
+    ]
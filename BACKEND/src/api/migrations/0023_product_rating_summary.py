@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def build_rating_summaries(apps, schema_editor):
+    """Résumés initiaux (commentaires approuvés et non signalés)."""
+    Commentaire = apps.get_model('api', 'Commentaire')
+    ProductRatingSummary = apps.get_model('api', 'ProductRatingSummary')
+
+    summaries = {}
+    rows = (
+        Commentaire.objects
+        .filter(is_approved=True, is_flagged=False)
+        .order_by()
+        .values('product_id', 'note')
+        .annotate(total=Count('id'))
+    )
+    for row in rows:
+        note, total = row['note'], row['total']
+        if note not in range(1, 6):
+            continue
+        summary = summaries.setdefault(row['product_id'], ProductRatingSummary(product_id=row['product_id']))
+        setattr(summary, f'count_{note}', total)
+        summary.approved_count += total
+        summary.rating_sum += total * note
+    ProductRatingSummary.objects.bulk_create(summaries.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0022_product_effective_price'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductRatingSummary',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rating_summary', serialize=False, to='api.product', verbose_name='Produit')),
+                ('approved_count', models.PositiveIntegerField(default=0, verbose_name='Commentaires approuvés')),
+                ('rating_sum', models.PositiveIntegerField(default=0, verbose_name='Somme des notes')),
+                ('count_1', models.PositiveIntegerField(default=0)),
+                ('count_2', models.PositiveIntegerField(default=0)),
+                ('count_3', models.PositiveIntegerField(default=0)),
+                ('count_4', models.PositiveIntegerField(default=0)),
+                ('count_5', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Résumé des notes',
+                'verbose_name_plural': 'Résumés des notes',
+            },
+        ),
+        migrations.RunPython(build_rating_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+from django.db import migrations
+
+# Ordres figés à la création de l'index (ne dépendent pas de api.services.search, qui peut évoluer)
+CREATE_SEARCH_INDEX = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS api_product_fts USING fts5(
+        name, description, shot_description,
+        content='api_product', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS api_product_fts_ai AFTER INSERT ON api_product BEGIN
+        INSERT INTO api_product_fts(rowid, name, description, shot_description)
+        VALUES (new.id, new.name, new.description, new.shot_description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS api_product_fts_ad AFTER DELETE ON api_product BEGIN
+        INSERT INTO api_product_fts(api_product_fts, rowid, name, description, shot_description)
+        VALUES ('delete', old.id, old.name, old.description, old.shot_description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS api_product_fts_au AFTER UPDATE OF name, description, shot_description ON api_product BEGIN
+        INSERT INTO api_product_fts(api_product_fts, rowid, name, description, shot_description)
+        VALUES ('delete', old.id, old.name, old.description, old.shot_description);
+        INSERT INTO api_product_fts(rowid, name, description, shot_description)
+        VALUES (new.id, new.name, new.description, new.shot_description);
+    END""",
+    # Indexation des produits existants
+    "INSERT INTO api_product_fts(api_product_fts) VALUES ('rebuild')",
+]
+
+DROP_SEARCH_INDEX = [
+    "DROP TRIGGER IF EXISTS api_product_fts_ai",
+    "DROP TRIGGER IF EXISTS api_product_fts_ad",
+    "DROP TRIGGER IF EXISTS api_product_fts_au",
+    "DROP TABLE IF EXISTS api_product_fts",
+]
+
+
+class Migration(migrations.Migration):
+    """Table FTS5 + triggers de la recherche plein texte (SQLite, seule base du projet)."""
+
+    dependencies = [
+        ('api', '0023_product_rating_summary'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_SEARCH_INDEX, DROP_SEARCH_INDEX),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0024_product_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='commentaire',
+            index=models.Index(fields=['product', 'created_at', 'id'], name='api_comment_product_ad6050_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_active', 'created_at', 'id'], name='api_product_is_acti_ac91e5_idx'),
+        ),
+    ]
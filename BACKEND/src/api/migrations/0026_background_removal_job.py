@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:41
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0025_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BackgroundRemovalJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cache_key', models.CharField(max_length=64, unique=True, verbose_name='Clé de cache')),
+                ('source_name', models.CharField(help_text='Chemin relatif à MEDIA_ROOT', max_length=500, verbose_name='Image source')),
+                ('output_name', models.CharField(help_text='Chemin relatif à MEDIA_ROOT', max_length=500, verbose_name='Image sans fond')),
+                ('status', models.CharField(choices=[('pending', 'En attente'), ('running', 'En cours'), ('done', 'Terminé'), ('failed', 'Échec')], default='pending', max_length=20)),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Tentatives')),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Prochaine tentative')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Début du traitement')),
+                ('last_error', models.TextField(blank=True, verbose_name='Dernière erreur')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Suppression de fond',
+                'verbose_name_plural': 'Suppressions de fond',
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='api_backgro_status_5b98b0_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0026_background_removal_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageDerivative',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('carousel_nobg', 'Carousel sans fond')], default='carousel_nobg', max_length=32, verbose_name='Type')),
+                ('source_name', models.CharField(help_text='Chemin relatif à MEDIA_ROOT', max_length=500, verbose_name='Image source')),
+                ('source_mtime', models.FloatField(verbose_name='Date de modification de la source')),
+                ('source_size', models.PositiveBigIntegerField(verbose_name='Taille de la source')),
+                ('profile', models.CharField(help_text='Profil de suppression de fond et format de sortie', max_length=64, verbose_name='Profil')),
+                ('output_name', models.CharField(help_text='Chemin relatif à MEDIA_ROOT', max_length=500, verbose_name='Image dérivée')),
+                ('output_size', models.PositiveIntegerField(default=0, verbose_name="Taille de l'image dérivée")),
+                ('status', models.CharField(choices=[('ready', 'Prête'), ('stale', 'Périmée')], default='ready', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Image dérivée',
+                'verbose_name_plural': 'Images dérivées',
+                'constraints': [models.UniqueConstraint(fields=('kind', 'profile', 'source_name'), name='unique_image_derivative')],
+            },
+        ),
+    ]
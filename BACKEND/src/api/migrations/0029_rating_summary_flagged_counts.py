@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:15
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_flagged_counts(apps, schema_editor):
+    """Commentaires approuvés mais signalés, comptés à part dans les résumés."""
+    Commentaire = apps.get_model('api', 'Commentaire')
+    ProductRatingSummary = apps.get_model('api', 'ProductRatingSummary')
+
+    summaries = {}
+    rows = (
+        Commentaire.objects
+        .filter(is_approved=True, is_flagged=True, product__isnull=False)
+        .order_by()
+        .values('product_id', 'note')
+        .annotate(total=Count('id'))
+    )
+    for row in rows:
+        note, total = row['note'], row['total']
+        if note not in range(1, 6):
+            continue
+        summary = summaries.setdefault(row['product_id'], ProductRatingSummary(product_id=row['product_id']))
+        summary.flagged_count += total
+        summary.flagged_rating_sum += total * note
+    ProductRatingSummary.objects.bulk_create(
+        summaries.values(),
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=['product'],
+        update_fields=['flagged_count', 'flagged_rating_sum'],
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0028_product_search_index_model'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productratingsummary',
+            name='flagged_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Commentaires approuvés signalés'),
+        ),
+        migrations.AddField(
+            model_name='productratingsummary',
+            name='flagged_rating_sum',
+            field=models.PositiveIntegerField(default=0, verbose_name='Somme des notes signalées'),
+        ),
+        migrations.RunPython(fill_flagged_counts, migrations.RunPython.noop),
+    ]
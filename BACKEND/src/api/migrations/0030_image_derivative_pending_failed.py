@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0029_rating_summary_flagged_counts'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='imagederivative',
+            name='status',
+            field=models.CharField(choices=[('ready', 'Prête'), ('pending', 'En file'), ('failed', 'Échec'), ('stale', 'Périmée')], default='ready', max_length=20),
+        ),
+    ]
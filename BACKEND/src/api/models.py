@@ -1,8 +1,11 @@
 from django.core.validators import FileExtensionValidator
 from django.core.exceptions import ValidationError
 from django.db import models
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+from .services.singletons import load_singleton
+
 
 # Informations générales sur l'entreprise
 
@@ -92,8 +95,9 @@ class SiteSettings(models.Model):
     def load(cls):
         """
         Retourne l'instance existante si elle existe.
+        Mise en cache dans le processus, rechargée quand la version 'site_settings' change.
         """
-        return cls.objects.first()
+        return load_singleton(cls, 'site_settings')
 
 
 # Fin Informations générales sur l'entreprise
@@ -159,8 +163,9 @@ class ParametrePage(models.Model):
     def load(cls):
         """
         Retourne l'instance existante si elle existe.
+        Mise en cache dans le processus, rechargée quand la version 'parametre_page' change.
         """
-        return cls.objects.first()
+        return load_singleton(cls, 'parametre_page')
 
 
 # Fin Paramètres de page
@@ -220,8 +225,9 @@ class MaSelection(models.Model):
     def load(cls):
         """
         Retourne l'instance existante si elle existe.
+        Mise en cache dans le processus, rechargée quand la version 'ma_selection' change.
         """
-        return cls.objects.first()
+        return load_singleton(cls, 'ma_selection')
 
 
 # Fin Ma Selection
@@ -273,8 +279,31 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Prix payé par le client (flash > promotion > prix de base), matérialisé pour le tri/filtrage SQL.
+    # Recalculé par api.signals et api.services.pricing.refresh_expired_prices (ne pas modifier à la main).
+    PRICE_SOURCE_CHOICES = [
+        ('base', 'Prix de base'),
+        ('promotion', 'Promotion'),
+        ('flash', 'Flash'),
+    ]
+    effective_price = models.IntegerField(default=0, editable=False)
+    effective_compare_at_price = models.IntegerField(blank=True, null=True, editable=False)
+    price_source = models.CharField(max_length=10, choices=PRICE_SOURCE_CHOICES, default='base', editable=False)
+    price_valid_until = models.DateTimeField(
+        blank=True,
+        null=True,
+        db_index=True,
+        editable=False,
+        help_text="Prochaine date de début/fin de flash ou de promotion (recalcul du prix effectif)"
+    )
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['is_active', 'effective_price']),
+            # Pagination par curseur (created_at, id)
+            models.Index(fields=['is_active', 'created_at', 'id']),
+        ]
 
     def __str__(self):
         return self.name
@@ -288,17 +317,23 @@ class Product(models.Model):
             return self.image_url
         return None
 
+    def get_rating_summary(self):
+        try:
+            return self.rating_summary
+        except ProductRatingSummary.DoesNotExist:
+            return None
+
     @property
     def average_rating(self):
-        """Retourne la note moyenne des commentaires approuvés"""
-        from django.db.models import Avg
-        avg = self.commentaires.filter(is_approved=True).aggregate(Avg('note'))['note__avg']
-        return round(avg, 1) if avg else 0.0
+        """Retourne la note moyenne des commentaires approuvés, signalés compris (ProductRatingSummary)"""
+        summary = self.get_rating_summary()
+        return summary.all_approved_average_rating if summary else 0.0
 
     @property
     def comment_count(self):
-        """Retourne le nombre de commentaires approuvés"""
-        return self.commentaires.filter(is_approved=True).count()
+        """Retourne le nombre de commentaires approuvés, signalés compris (ProductRatingSummary)"""
+        summary = self.get_rating_summary()
+        return summary.all_approved_count if summary else 0
 
 
 class Commentaire(models.Model):
@@ -352,6 +387,8 @@ class Commentaire(models.Model):
         indexes = [
             models.Index(fields=['product', 'is_approved']),
             models.Index(fields=['created_at']),
+            # Pagination par curseur des commentaires d'un produit (created_at, id)
+            models.Index(fields=['product', 'created_at', 'id']),
         ]
     
     def __str__(self):
@@ -373,6 +410,94 @@ class Commentaire(models.Model):
             raise ValidationError({'commentaire': 'Le commentaire ne peut pas dépasser 1000 caractères.'})
 
 
+class ProductRatingSummary(models.Model):
+    """
+    Résumé des notes d'un produit : commentaires approuvés et non signalés
+    (approved_count, rating_sum, count_1 à count_5), plus les commentaires
+    approuvés mais signalés (flagged_count, flagged_rating_sum). Mis à jour de façon incrémentale par api.signals et par les actions de
+    modération de CommentaireAdmin ; reconstruit par la commande
+    rebuild_rating_summaries.
+    """
+    product = models.OneToOneField(
+        Product,
+        related_name='rating_summary',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        verbose_name="Produit"
+    )
+    approved_count = models.PositiveIntegerField(default=0, verbose_name="Commentaires approuvés")
+    rating_sum = models.PositiveIntegerField(default=0, verbose_name="Somme des notes")
+    count_1 = models.PositiveIntegerField(default=0)
+    count_2 = models.PositiveIntegerField(default=0)
+    count_3 = models.PositiveIntegerField(default=0)
+    count_4 = models.PositiveIntegerField(default=0)
+    count_5 = models.PositiveIntegerField(default=0)
+    flagged_count = models.PositiveIntegerField(default=0, verbose_name="Commentaires approuvés signalés")
+    flagged_rating_sum = models.PositiveIntegerField(default=0, verbose_name="Somme des notes signalées")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Résumé des notes"
+        verbose_name_plural = "Résumés des notes"
+
+    def __str__(self):
+        return f"{self.product_id} : {self.average_rating}/5 ({self.approved_count})"
+
+    @property
+    def average_rating(self):
+        if not self.approved_count:
+            return 0.0
+        return round(self.rating_sum / self.approved_count, 1)
+
+    @property
+    def all_approved_count(self):
+        return self.approved_count + self.flagged_count
+
+    @property
+    def all_approved_average_rating(self):
+        if not self.all_approved_count:
+            return 0.0
+        return round((self.rating_sum + self.flagged_rating_sum) / self.all_approved_count, 1)
+
+    def count_for(self, note):
+        return getattr(self, f'count_{note}')
+
+    @property
+    def rating_distribution(self):
+        """{note: {'count', 'percent'}} pour les notes 1 à 5"""
+        total = self.approved_count
+        return {
+            note: {
+                'count': self.count_for(note),
+                'percent': round((self.count_for(note) / total * 100) if total > 0 else 0, 1)
+            }
+            for note in range(1, 6)
+        }
+
+
+class ProductSearchIndex(models.Model):
+    """
+    Table FTS5 api_product_fts de la recherche plein texte (api.services.search), créée par la
+    migration 0024 et tenue à jour par des triggers. Non gérée par Django : sert à la jointure
+    Product.search_index (filter(search_index__match=...)), jamais écrite par l'ORM.
+    """
+    product = models.OneToOneField(
+        Product,
+        related_name='search_index',
+        on_delete=models.DO_NOTHING,
+        primary_key=True,
+        db_column='rowid',
+        db_constraint=False,
+    )
+    # Colonne cachée de FTS5 portant le nom de la table : `api_product_fts = 'requête'` équivaut à
+    # `api_product_fts MATCH 'requête'` (toutes les colonnes indexées)
+    match = models.TextField(db_column='api_product_fts')
+
+    class Meta:
+        managed = False
+        db_table = 'api_product_fts'
+
+
 class ProductImage(models.Model):
     product = models.ForeignKey(Product, related_name='images', on_delete=models.CASCADE)
     image = models.ImageField(upload_to='products/')
@@ -416,16 +541,99 @@ class ProductCarousel(models.Model):
         Sinon la première image
         Sinon l'image par défaut du produit
         """
-        primary_image = self.product.images.filter(is_primary=True).first()
-        if primary_image:
-            return primary_image.image.url
+        from .services.images import get_display_image_url
+
+        # Utilise les images préchargées si disponibles (voir display_images_prefetch)
+        return get_display_image_url(self.product)
+
+
+class BackgroundRemovalJob(models.Model):
+    """
+    Suppression d'arrière-plan à effectuer hors requête HTTP (api.services.background_removal).
+    Une ligne par image source et version du fichier (cache_key) : les demandes simultanées
+    pour la même image partagent le même travail. Traité par la commande
+    process_background_removal_jobs ; un échec est retenté avec un délai croissant.
+    """
+    STATUS_PENDING = "pending"
+    STATUS_RUNNING = "running"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "En attente"),
+        (STATUS_RUNNING, "En cours"),
+        (STATUS_DONE, "Terminé"),
+        (STATUS_FAILED, "Échec"),
+    ]
+
+    cache_key = models.CharField("Clé de cache", max_length=64, unique=True)
+    source_name = models.CharField("Image source", max_length=500, help_text="Chemin relatif à MEDIA_ROOT")
+    output_name = models.CharField("Image sans fond", max_length=500, help_text="Chemin relatif à MEDIA_ROOT")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveSmallIntegerField("Tentatives", default=0)
+    next_attempt_at = models.DateTimeField("Prochaine tentative", default=timezone.now)
+    started_at = models.DateTimeField("Début du traitement", null=True, blank=True)
+    last_error = models.TextField("Dernière erreur", blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Suppression de fond"
+        verbose_name_plural = "Suppressions de fond"
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.source_name} ({self.get_status_display()})"
 
-        first_image = self.product.images.first()
-        if first_image:
-            return first_image.image.url
 
-        # Utilise image_display_url qui gère image ET image_url
-        return self.product.image_display_url
+class ImageDerivative(models.Model):
+    """
+    Image dérivée (version sans fond du carousel) : une ligne par fichier source, type et
+    profil, prête ou pas encore (en file, abandonnée). L'API lit cette ligne (préchargée pour
+    tout le carousel) au lieu d'interroger le système de fichiers ; la commande
+    reconcile_image_derivatives compare en bloc les lignes aux fichiers (sources modifiées,
+    sorties manquantes ou orphelines).
+    """
+    KIND_CAROUSEL_NOBG = "carousel_nobg"
+    KIND_CHOICES = [
+        (KIND_CAROUSEL_NOBG, "Carousel sans fond"),
+    ]
+
+    STATUS_READY = "ready"
+    STATUS_PENDING = "pending"
+    STATUS_FAILED = "failed"
+    STATUS_STALE = "stale"
+    STATUS_CHOICES = [
+        (STATUS_READY, "Prête"),
+        (STATUS_PENDING, "En file"),
+        (STATUS_FAILED, "Échec"),
+        (STATUS_STALE, "Périmée"),
+    ]
+
+    kind = models.CharField("Type", max_length=32, choices=KIND_CHOICES, default=KIND_CAROUSEL_NOBG)
+    source_name = models.CharField("Image source", max_length=500, help_text="Chemin relatif à MEDIA_ROOT")
+    source_mtime = models.FloatField("Date de modification de la source")
+    source_size = models.PositiveBigIntegerField("Taille de la source")
+    profile = models.CharField("Profil", max_length=64, help_text="Profil de suppression de fond et format de sortie")
+    output_name = models.CharField("Image dérivée", max_length=500, help_text="Chemin relatif à MEDIA_ROOT")
+    output_size = models.PositiveIntegerField("Taille de l'image dérivée", default=0)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_READY)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Image dérivée"
+        verbose_name_plural = "Images dérivées"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['kind', 'profile', 'source_name'],
+                name='unique_image_derivative'
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.source_name} -> {self.output_name} ({self.get_status_display()})"
 
 
 # Fin produit carousel
@@ -8,6 +8,8 @@ import requests
 import uuid
 from decimal import Decimal
 
+from .services.metrics import observe_outbound
+
 logger = logging.getLogger(__name__)
 
 # URLs MTN MoMo selon l'environnement
@@ -33,14 +35,16 @@ def _get_access_token():
     token_url = f"{base_url}/collection/token/"
     
     try:
-        response = requests.post(
-            token_url,
-            auth=(api_user, api_key),
-            headers={
-                "Ocp-Apim-Subscription-Key": subscription_key
-            },
-            timeout=10
-        )
+        with observe_outbound('mtn_momo', 'token') as call:
+            response = requests.post(
+                token_url,
+                auth=(api_user, api_key),
+                headers={
+                    "Ocp-Apim-Subscription-Key": subscription_key
+                },
+                timeout=10
+            )
+            call['status'] = response.status_code
         response.raise_for_status()
         data = response.json()
         return data.get("access_token")
@@ -85,18 +89,20 @@ def request_payment(phone_number, amount, currency="XAF", external_id=None):
     }
     
     try:
-        response = requests.post(
-            request_url,
-            json=payload,
-            headers={
-                "Authorization": f"Bearer {access_token}",
-                "X-Target-Environment": target_environment,
-                "Content-Type": "application/json",
-                "Ocp-Apim-Subscription-Key": subscription_key,
-                "X-Reference-Id": external_id
-            },
-            timeout=30
-        )
+        with observe_outbound('mtn_momo', 'request_payment') as call:
+            response = requests.post(
+                request_url,
+                json=payload,
+                headers={
+                    "Authorization": f"Bearer {access_token}",
+                    "X-Target-Environment": target_environment,
+                    "Content-Type": "application/json",
+                    "Ocp-Apim-Subscription-Key": subscription_key,
+                    "X-Reference-Id": external_id
+                },
+                timeout=30
+            )
+            call['status'] = response.status_code
         
         # 202 Accepted = demande créée avec succès
         if response.status_code == 202:
@@ -136,15 +142,17 @@ def check_payment_status(transaction_id):
     status_url = f"{base_url}/collection/v1_0/requesttopay/{transaction_id}"
     
     try:
-        response = requests.get(
-            status_url,
-            headers={
-                "Authorization": f"Bearer {access_token}",
-                "X-Target-Environment": target_environment,
-                "Ocp-Apim-Subscription-Key": subscription_key
-            },
-            timeout=10
-        )
+        with observe_outbound('mtn_momo', 'payment_status') as call:
+            response = requests.get(
+                status_url,
+                headers={
+                    "Authorization": f"Bearer {access_token}",
+                    "X-Target-Environment": target_environment,
+                    "Ocp-Apim-Subscription-Key": subscription_key
+                },
+                timeout=10
+            )
+            call['status'] = response.status_code
         response.raise_for_status()
         data = response.json()
         
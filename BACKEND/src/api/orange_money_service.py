@@ -8,6 +8,8 @@ import requests
 import uuid
 from decimal import Decimal
 
+from .services.metrics import observe_outbound
+
 logger = logging.getLogger(__name__)
 
 # URLs Orange Money selon l'environnement
@@ -34,13 +36,15 @@ def _get_access_token():
     token_url = f"{base_url}/oauth/v2/token"
     
     try:
-        response = requests.post(
-            token_url,
-            auth=(client_id, client_secret),
-            data={"grant_type": "client_credentials"},
-            headers={"Content-Type": "application/x-www-form-urlencoded"},
-            timeout=10
-        )
+        with observe_outbound('orange_money', 'token') as call:
+            response = requests.post(
+                token_url,
+                auth=(client_id, client_secret),
+                data={"grant_type": "client_credentials"},
+                headers={"Content-Type": "application/x-www-form-urlencoded"},
+                timeout=10
+            )
+            call['status'] = response.status_code
         response.raise_for_status()
         data = response.json()
         return data.get("access_token")
@@ -83,15 +87,17 @@ def request_payment(phone_number, amount, currency="XAF", external_id=None):
     }
     
     try:
-        response = requests.post(
-            request_url,
-            json=payload,
-            headers={
-                "Authorization": f"Bearer {access_token}",
-                "Content-Type": "application/json",
-            },
-            timeout=30
-        )
+        with observe_outbound('orange_money', 'request_payment') as call:
+            response = requests.post(
+                request_url,
+                json=payload,
+                headers={
+                    "Authorization": f"Bearer {access_token}",
+                    "Content-Type": "application/json",
+                },
+                timeout=30
+            )
+            call['status'] = response.status_code
         
         # 201 Created ou 200 OK = demande créée avec succès
         if response.status_code in [200, 201]:
@@ -132,13 +138,15 @@ def check_payment_status(transaction_id):
     status_url = f"{base_url}/api/v1/webpayments/{transaction_id}/status"
     
     try:
-        response = requests.get(
-            status_url,
-            headers={
-                "Authorization": f"Bearer {access_token}",
-            },
-            timeout=10
-        )
+        with observe_outbound('orange_money', 'payment_status') as call:
+            response = requests.get(
+                status_url,
+                headers={
+                    "Authorization": f"Bearer {access_token}",
+                },
+                timeout=10
+            )
+            call['status'] = response.status_code
         response.raise_for_status()
         data = response.json()
         
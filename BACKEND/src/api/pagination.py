@@ -0,0 +1,146 @@
+"""
+Pagination par curseur (keyset) sur (created_at, id), en option des listings paginés.
+
+Au lieu de queryset[start:end] + count(), chaque page filtre à partir de la
+dernière ligne vue : WHERE (created_at, id) < (curseur) ORDER BY -created_at, -id
+LIMIT page_size + 1. Une page profonde coûte donc autant que la première, et le
+total n'est calculé que sur demande (?count=1).
+
+Activation : ?pagination=cursor pour la première page, puis ?cursor=<next|previous>.
+Les curseurs sont opaques et signés (django.core.signing, SECRET_KEY) : la position
+`n` qui applique la limite max_results ne peut pas être modifiée par le client.
+"""
+from datetime import datetime
+
+from django.core import signing
+from django.db.models import Q
+
+CURSOR_PARAM = 'cursor'
+CURSOR_SALT = 'api.pagination.cursor'
+
+
+def wants_cursor(request):
+    """Vrai si le client a choisi la pagination par curseur."""
+    params = request.query_params
+    return CURSOR_PARAM in params or params.get('pagination') == 'cursor'
+
+
+def wants_count(request):
+    """Vrai si le client demande le total (?count=1)."""
+    return request.query_params.get('count', '').lower() in ('1', 'true', 'yes')
+
+
+def encode_cursor(created_at, pk, reverse=False, position=0):
+    payload = {'c': created_at.isoformat(), 'i': pk, 'n': position}
+    if reverse:
+        payload['r'] = 1
+    return signing.dumps(payload, salt=CURSOR_SALT)
+
+
+def decode_cursor(token):
+    """Retourne (created_at, id, reverse, position). Lève ValueError si le curseur est invalide ou modifié."""
+    try:
+        payload = signing.loads(token, salt=CURSOR_SALT)
+        created_at = datetime.fromisoformat(payload['c'])
+        pk = int(payload['i'])
+        position = int(payload.get('n', 0))
+    except (signing.BadSignature, ValueError, TypeError, KeyError):
+        raise ValueError("Curseur de pagination invalide.")
+    if position < 0:
+        raise ValueError("Curseur de pagination invalide.")
+    return created_at, pk, bool(payload.get('r')), position
+
+
+class KeysetPaginator:
+    """
+    Pagination keyset du plus récent au plus ancien.
+
+    Usage :
+        paginator = KeysetPaginator(request, page_size=10)
+        rows = list(paginator.filter(queryset)[:paginator.limit + 1])
+        rows = paginator.page(rows)
+        data = paginator.get_links()
+
+    max_results : limite totale (anti-scraping), conservée d'un curseur à l'autre.
+    """
+    ordering = ('-created_at', '-id')
+
+    def __init__(self, request, page_size, max_results=None):
+        self.page_size = page_size
+        self.max_results = max_results
+        token = request.query_params.get(CURSOR_PARAM, '').strip()
+        self.cursor = decode_cursor(token) if token else None
+        self.reverse = bool(self.cursor and self.cursor[2])
+        self.rows = []
+        self.has_more = False
+
+    @property
+    def limit(self):
+        """Nombre de lignes de la page (page_size, réduit en fin de limite max_results)."""
+        if self.max_results is None or self.reverse:
+            return self.page_size
+        position = self.cursor[3] if self.cursor else 0
+        return max(0, min(self.page_size, self.max_results - position))
+
+    def filter(self, queryset):
+        """Applique le curseur et l'ordre (created_at, id) au queryset."""
+        if self.cursor is None:
+            return queryset.order_by(*self.ordering)
+        created_at, pk = self.cursor[:2]
+        if self.reverse:
+            return queryset.filter(
+                Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk)
+            ).order_by('created_at', 'id')
+        return queryset.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+        ).order_by(*self.ordering)
+
+    def page(self, rows):
+        """Reçoit au plus limit + 1 lignes (ordre de filter()), retourne la page dans l'ordre d'affichage."""
+        rows = list(rows)
+        limit = self.limit
+        self.has_more = len(rows) > limit
+        rows = rows[:limit]
+        if self.reverse:
+            rows.reverse()
+        self.rows = rows
+        return rows
+
+    @property
+    def start(self):
+        """Position de la première ligne de la page dans la liste complète."""
+        if self.cursor is None:
+            return 0
+        position = self.cursor[3]
+        return max(0, position - len(self.rows)) if self.reverse else position
+
+    @property
+    def has_next(self):
+        if self.reverse:
+            return bool(self.rows) or self.has_more
+        if self.max_results is not None and self.start + len(self.rows) >= self.max_results:
+            return False
+        return self.has_more
+
+    @property
+    def has_previous(self):
+        if self.reverse:
+            return self.has_more
+        return self.cursor is not None
+
+    def get_links(self):
+        """Curseurs opaques next / previous (None en bout de liste)."""
+        next_cursor = previous_cursor = None
+        if self.rows:
+            first, last = self.rows[0], self.rows[-1]
+            if self.has_next:
+                next_cursor = encode_cursor(last.created_at, last.id, position=self.start + len(self.rows))
+            if self.has_previous:
+                previous_cursor = encode_cursor(first.created_at, first.id, reverse=True, position=self.start)
+        return {
+            'page_size': self.page_size,
+            'next': next_cursor,
+            'previous': previous_cursor,
+            'has_next': next_cursor is not None,
+            'has_previous': previous_cursor is not None,
+        }
@@ -7,6 +7,8 @@ import os
 import requests
 from decimal import Decimal
 
+from .services.metrics import observe_outbound
+
 logger = logging.getLogger(__name__)
 
 # URLs PayPal selon l'environnement
@@ -38,13 +40,15 @@ def get_access_token():
 
     base = _base_url()
     url = f"{base}/v1/oauth2/token"
-    response = requests.post(
-        url,
-        headers={"Accept": "application/json", "Accept-Language": "en_US"},
-        auth=(client_id, client_secret),
-        data={"grant_type": "client_credentials"},
-        timeout=15,
-    )
+    with observe_outbound('paypal', 'token') as call:
+        response = requests.post(
+            url,
+            headers={"Accept": "application/json", "Accept-Language": "en_US"},
+            auth=(client_id, client_secret),
+            data={"grant_type": "client_credentials"},
+            timeout=15,
+        )
+        call['status'] = response.status_code
     response.raise_for_status()
     data = response.json()
     return data.get("access_token")
@@ -85,12 +89,14 @@ def create_order(amount_value, currency="EUR", return_url="", cancel_url=""):
             "cancel_url": cancel_url or return_url,
         }
 
-    response = requests.post(
-        url,
-        headers=_auth_headers(token),
-        json=payload,
-        timeout=15,
-    )
+    with observe_outbound('paypal', 'create_order') as call:
+        response = requests.post(
+            url,
+            headers=_auth_headers(token),
+            json=payload,
+            timeout=15,
+        )
+        call['status'] = response.status_code
     response.raise_for_status()
     data = response.json()
     order_id = data.get("id")
@@ -114,11 +120,13 @@ def capture_order(paypal_order_id):
     base = _base_url()
     url = f"{base}/v2/checkout/orders/{paypal_order_id}/capture"
 
-    response = requests.post(
-        url,
-        headers=_auth_headers(token),
-        json={},
-        timeout=15,
-    )
+    with observe_outbound('paypal', 'capture_order') as call:
+        response = requests.post(
+            url,
+            headers=_auth_headers(token),
+            json={},
+            timeout=15,
+        )
+        call['status'] = response.status_code
     response.raise_for_status()
     return response.json()
@@ -0,0 +1,66 @@
+"""
+Rendu et lecture JSON de l'API avec orjson (repli sur le module json de DRF).
+
+orjson encode les réponses plusieurs fois plus vite que json de la bibliothèque
+standard (listings boutique, recherche, commentaires). Le résultat est le même
+que celui de rest_framework.renderers.JSONRenderer :
+- Decimal -> nombre (float), chaînes paresseuses (gettext_lazy) -> str, timedelta,
+  UUID, QuerySet... : même conversion que rest_framework.utils.encoders.JSONEncoder ;
+- datetime au format ISO 8601 avec « Z » pour UTC ;
+- \\u2028 et \\u2029 échappés (JSON inclus dans du JavaScript).
+
+Sans orjson installé, ou pour les cas qu'il ne couvre pas (indentation demandée,
+UNICODE_JSON / COMPACT_JSON désactivés, entiers de plus de 64 bits), le rendu
+passe par le JSONRenderer de DRF.
+"""
+import codecs
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # dépendance optionnelle
+    orjson = None
+else:
+    ORJSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+# Types non gérés nativement par orjson : conversion de l'encodeur de DRF
+_default = JSONEncoder().default
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer de DRF, encodé par orjson quand c'est possible."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None or orjson is None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=_default, option=ORJSON_OPTIONS)
+        except (orjson.JSONEncodeError, TypeError):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Comme DRF : JSON valide en tant que JavaScript
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+
+class FastJSONParser(JSONParser):
+    """JSONParser de DRF, décodé par orjson pour les corps UTF-8."""
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or codecs.lookup(encoding).name != 'utf-8':
+            return super().parse(stream, media_type, parser_context)
+
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from .services.images import get_display_image_field, get_display_image_url
 from .models import (
     SiteSettings,
     ProductCarousel,
@@ -86,6 +87,19 @@ class SiteSettingsSerializer(serializers.ModelSerializer):
 # Produit du carousel
 # Produit du carousel
 
+class ProductCarouselListSerializer(serializers.ListSerializer):
+    """Précharge les images sans fond de tout le carousel en une requête (ImageDerivative)."""
+
+    def to_representation(self, data):
+        from api.services.background_removal import prefetch_nobg_derivatives
+
+        items = list(data.all() if hasattr(data, 'all') else data)
+        self.context['nobg_derivatives'] = prefetch_nobg_derivatives(
+            get_display_image_field(item.product) for item in items
+        )
+        return super().to_representation(items)
+
+
 class ProductCarouselSerializer(serializers.ModelSerializer):
     # On expose des champs additionnels qui viennent du produit
     product_name = serializers.CharField(source='product.name', read_only=True)
@@ -94,6 +108,7 @@ class ProductCarouselSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = ProductCarousel
+        list_serializer_class = ProductCarouselListSerializer
         fields = [
             'id',
             'product',
@@ -111,22 +126,16 @@ class ProductCarouselSerializer(serializers.ModelSerializer):
     def get_product_image(self, obj):
         """
         Retourne l'image principale du produit SANS arrière-plan pour le carousel.
-        L'image originale n'est jamais modifiée. Les versions sans fond sont mises en cache.
+        L'image originale n'est jamais modifiée. Les versions sans fond sont mises en cache ;
+        une image pas encore traitée est mise en file et l'originale est renvoyée en attendant.
         Pour les images externes (image_url), retourne l'URL telle quelle.
         """
         from api.services.background_removal import get_carousel_image_no_background
 
-        primary_image = obj.product.images.filter(is_primary=True).first()
-        if primary_image and primary_image.image:
-            return get_carousel_image_no_background(primary_image.image)
-
-        first_image = obj.product.images.first()
-        if first_image and first_image.image:
-            return get_carousel_image_no_background(first_image.image)
-
-        # Produit.image (ImageField local)
-        if obj.product.image:
-            return get_carousel_image_no_background(obj.product.image)
+        # Image principale, sinon première image, sinon Produit.image (préchargées par la vue)
+        image_field = get_display_image_field(obj.product)
+        if image_field:
+            return get_carousel_image_no_background(image_field, derivatives=self.context.get('nobg_derivatives'))
 
         # image_url externe : pas de suppression de fond, retourne l'URL telle quelle
         return obj.product.image_display_url
@@ -174,16 +183,7 @@ class ProductPromotionSerializer(serializers.ModelSerializer):
 
     def get_product_image(self, obj):
         """Image principale du produit (image ou image_url)"""
-        primary = obj.product.images.filter(is_primary=True).first()
-        if primary:
-            return primary.image.url
-
-        first = obj.product.images.first()
-        if first:
-            return first.image.url
-
-        # Utilise image_display_url qui gère image ET image_url
-        return obj.product.image_display_url
+        return get_display_image_url(obj.product)
 
 # Produit categorie
 # Produit categorie
@@ -244,6 +244,8 @@ class NewProductItemSerializer(serializers.ModelSerializer):
 class CategoryNewProductsSerializer(serializers.ModelSerializer):
     """
     Catégorie + produits récents limités.
+    Les produits peuvent être fournis déjà chargés via le contexte
+    ('products_by_category' : {category_id: [produits]}).
     """
     products = serializers.SerializerMethodField()
 
@@ -252,8 +254,13 @@ class CategoryNewProductsSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'slug', 'products']
 
     def get_products(self, obj):
+        products_by_category = self.context.get('products_by_category')
+        if products_by_category is not None:
+            # Représentation de NewProductItemSerializer, sans serializer par produit
+            return new_product_data(products_by_category.get(obj.id, []))
+
         limit = self.context.get('products_limit')
-        products_qs = obj.products.filter(is_active=True).order_by('-created_at')
+        products_qs = obj.products.filter(is_active=True).select_related('category').order_by('-created_at')
         if limit:
             products_qs = products_qs[:limit]
         return NewProductItemSerializer(products_qs, many=True).data
@@ -267,56 +274,80 @@ class CategoryNewProductsSerializer(serializers.ModelSerializer):
 # Flash promotion produit principal
 
 from rest_framework import serializers
+from django.db.models import QuerySet
 from django.utils import timezone
 from .models import FlashProductItem
+from .services.pricing import PricingResolver
+from .services.projections import new_product_data
 from datetime import timedelta
 
 
-def compute_product_pricing(product):
+class PricingFieldsMixin:
     """
-    Calcule le prix final et le prix de comparaison en tenant compte :
-    - du produit lui‑même
-    - d'une éventuelle promotion (ProductPromotion)
-    - d'un éventuel flash principal (FlashProductItem is_main=True)
+    Fournit get_price / get_compare_at_price à partir du PricingResolver
+    partagé via le contexte (clé 'pricing').
+    Sans contexte, un resolver est créé une seule fois pour tout le lot sérialisé.
     """
-    from .models import ProductFlash, ProductPromotion  # import local pour éviter les cycles
 
-    # Valeurs de base
-    base_price = product.price or 0
-    original_price = product.compare_at_price or base_price
-    final_price = base_price
+    def _get_pricing(self, obj):
+        pricing = self.context.get('pricing')
+        if pricing is None:
+            instance = getattr(self.root, 'instance', None)
+            products = instance if isinstance(instance, (list, tuple, QuerySet)) else [obj]
+            pricing = PricingResolver(products)
+            if hasattr(self.root, '_context'):
+                self.root._context['pricing'] = pricing
+        return pricing.get(obj)
+
+    def get_price(self, obj):
+        final_price, _ = self._get_pricing(obj)
+        return final_price
+
+    def get_compare_at_price(self, obj):
+        _, original_price = self._get_pricing(obj)
+        return original_price
 
-    now = timezone.now()
 
-    # 1) Flash principal (prioritaire)
-    flash_item = FlashProductItem.objects.filter(
-        product=product,
-        is_main=True,
-        flash__is_active=True,
-    ).select_related("flash").first()
+def format_remaining_time(end_date, now=None):
+    """
+    Retourne le temps restant jusqu'à end_date au format JJ-HH-MM-SS
+    ("00-00-00-00" si terminé, None sans date de fin).
+    """
+    if not end_date:
+        return None
+
+    # Calcul du delta
+    delta = end_date - (now or timezone.now())
 
-    if flash_item and flash_item.flash:
-        start = flash_item.start_date
-        end = flash_item.end_date
+    # Si temps écoulé → retourner 00-00-00-00
+    if delta.total_seconds() <= 0:
+        return "00-00-00-00"
 
-        if (not start or start <= now) and (not end or end >= now):
-            # Dans MainFlashProductSerializer, compare_at_price est utilisé comme prix promo
-            if flash_item.compare_at_price:
-                final_price = flash_item.compare_at_price
-                original_price = base_price
-                return final_price, original_price
+    # Extraire jour/heure/min/sec
+    days = delta.days
+    hours, remainder = divmod(delta.seconds, 3600)
+    minutes, seconds = divmod(remainder, 60)
 
-    # 2) Promotion standard
-    promo = getattr(product, "promotion", None)
-    if promo and promo.is_active and promo.promo_price:
-        start = promo.start_date
-        end = promo.end_date
+    # Retourner avec padding 2 digits
+    return f"{days:02d}-{hours:02d}-{minutes:02d}-{seconds:02d}"
 
-        if (not start or start <= now) and (not end or end >= now):
-            final_price = promo.promo_price
-            original_price = base_price
 
-    return final_price, original_price
+def refresh_remaining_time(data):
+    """
+    Recalcule remaining_time à partir de end_date dans des données déjà sérialisées
+    (dict ou liste de dicts), pour les réponses flash servies depuis le cache.
+    """
+    from django.utils.dateparse import parse_datetime
+
+    now = timezone.now()
+    for row in (data if isinstance(data, list) else [data]):
+        if not isinstance(row, dict) or 'remaining_time' not in row:
+            continue
+        end_date = row.get('end_date')
+        if isinstance(end_date, str):
+            end_date = parse_datetime(end_date)
+        row['remaining_time'] = format_remaining_time(end_date, now)
+    return data
 
 
 class MainFlashProductSerializer(serializers.ModelSerializer):
@@ -367,25 +398,7 @@ class MainFlashProductSerializer(serializers.ModelSerializer):
         """
         Retourne le temps restant dans le format JJ-HH-MM-SS
         """
-        now = timezone.now()
-
-        if not obj.end_date:
-            return None
-
-        # Calcul du delta
-        delta = obj.end_date - now
-
-        # Si temps écoulé → retourner 00-00-00-00
-        if delta.total_seconds() <= 0:
-            return "00-00-00-00"
-
-        # Extraire jour/heure/min/sec
-        days = delta.days
-        hours, remainder = divmod(delta.seconds, 3600)
-        minutes, seconds = divmod(remainder, 60)
-
-        # Retourner avec padding 2 digits
-        return f"{days:02d}-{hours:02d}-{minutes:02d}-{seconds:02d}"
+        return format_remaining_time(obj.end_date)
 
 
 class SecondaryFlashProductSerializer(serializers.ModelSerializer):
@@ -416,42 +429,38 @@ class SecondaryFlashProductSerializer(serializers.ModelSerializer):
         """Retourne l'image du produit"""
         return obj.image_display_url
 
+    def _get_flash(self, obj):
+        """
+        Flash actif partagé via le contexte (clé 'flash', voir load_active_flash_snapshot).
+        Sans contexte, il est recherché une seule fois pour tout le lot.
+        """
+        if 'flash' not in self.context:
+            flash = ProductFlash.objects.filter(is_active=True, secondary_products=obj).first()
+            if hasattr(self.root, '_context'):
+                self.root._context['flash'] = flash
+            return flash
+        return self.context['flash']
+
     def get_start_date(self, obj):
         """Retourne la date de début pour ce produit secondaire"""
-        flash = ProductFlash.objects.filter(is_active=True, secondary_products=obj).first()
+        flash = self._get_flash(obj)
         return flash.secondary_start_date if flash else None
 
     def get_end_date(self, obj):
         """Retourne la date de fin pour ce produit secondaire"""
-        flash = ProductFlash.objects.filter(is_active=True, secondary_products=obj).first()
+        flash = self._get_flash(obj)
         return flash.secondary_end_date if flash else None
 
     def get_remaining_time(self, obj):
         """Retourne le temps restant formaté (jour-heure-min-seconde)"""
-        flash = ProductFlash.objects.filter(is_active=True, secondary_products=obj).first()
-
-        if not flash or not flash.secondary_end_date:
-            return None
-
-        from django.utils import timezone
-        now = timezone.now()
-
-        delta = flash.secondary_end_date - now
-
-        if delta.total_seconds() <= 0:
-            return "00-00-00-00"  # Le compte à rebours est terminé
-
-        days = delta.days
-        hours, remainder = divmod(delta.seconds, 3600)
-        minutes, seconds = divmod(remainder, 60)
-
-        return f"{days:02d}-{hours:02d}-{minutes:02d}-{seconds:02d}"
+        flash = self._get_flash(obj)
+        return format_remaining_time(flash.secondary_end_date) if flash else None
 
 
 # Recherche de produits
 # Recherche de produits
 
-class ProductSearchSerializer(serializers.ModelSerializer):
+class ProductSearchSerializer(PricingFieldsMixin, serializers.ModelSerializer):
     """
     Serializer pour les résultats de recherche de produits.
     """
@@ -460,8 +469,6 @@ class ProductSearchSerializer(serializers.ModelSerializer):
     compare_at_price = serializers.SerializerMethodField()
     category = serializers.SerializerMethodField()
     category_slug = serializers.SerializerMethodField()
-    price = serializers.SerializerMethodField()
-    compare_at_price = serializers.SerializerMethodField()
 
     class Meta:
         model = Product
@@ -482,72 +489,17 @@ class ProductSearchSerializer(serializers.ModelSerializer):
     def get_image(self, obj):
         return obj.image_display_url
 
-    def get_price(self, obj):
-        final_price, _ = compute_product_pricing(obj)
-        return final_price
-
-    def get_compare_at_price(self, obj):
-        _, original_price = compute_product_pricing(obj)
-        return original_price
-
     def get_category(self, obj):
         return obj.category.name if obj.category else None
 
     def get_category_slug(self, obj):
         return obj.category.slug if obj.category else None
 
-    # Même logique de prix que pour le détail produit (flash / promo / prix normal)
-    def _get_pricing(self, obj):
-        from django.utils import timezone
-
-        base_price = obj.price or 0
-        original_price = obj.compare_at_price or base_price
-        final_price = base_price
-
-        now = timezone.now()
-
-        # 1) Flash principal prioritaire
-        flash_item = FlashProductItem.objects.filter(
-            product=obj,
-            is_main=True,
-            flash__is_active=True,
-        ).select_related("flash").first()
-
-        if flash_item and flash_item.flash:
-            start = flash_item.start_date
-            end = flash_item.end_date
-
-            if (not start or start <= now) and (not end or end >= now):
-                if flash_item.compare_at_price:
-                    final_price = flash_item.compare_at_price
-                    original_price = base_price
-                    return final_price, original_price
-
-        # 2) Promotion standard
-        promo = getattr(obj, "promotion", None)
-        if promo and promo.is_active and promo.promo_price:
-            start = promo.start_date
-            end = promo.end_date
-
-            if (not start or start <= now) and (not end or end >= now):
-                final_price = promo.promo_price
-                original_price = base_price
-
-        return final_price, original_price
-
-    def get_price(self, obj):
-        final_price, _ = self._get_pricing(obj)
-        return final_price
-
-    def get_compare_at_price(self, obj):
-        _, original_price = self._get_pricing(obj)
-        return original_price
-
 
 # Boutique
 # Boutique
 
-class BoutiqueProductSerializer(serializers.ModelSerializer):
+class BoutiqueProductSerializer(PricingFieldsMixin, serializers.ModelSerializer):
     """
     Serializer pour les produits de la boutique.
     Similaire à ProductSearchSerializer mais optimisé pour la boutique.
@@ -577,14 +529,6 @@ class BoutiqueProductSerializer(serializers.ModelSerializer):
     def get_image(self, obj):
         return obj.image_display_url
 
-    def get_price(self, obj):
-        final_price, _ = compute_product_pricing(obj)
-        return final_price
-
-    def get_compare_at_price(self, obj):
-        _, original_price = compute_product_pricing(obj)
-        return original_price
-
     def get_category(self, obj):
         return obj.category.name if obj.category else None
 
@@ -595,7 +539,7 @@ class BoutiqueProductSerializer(serializers.ModelSerializer):
 # Détail de produit
 # Détail de produit
 
-class ProductDetailSerializer(serializers.ModelSerializer):
+class ProductDetailSerializer(PricingFieldsMixin, serializers.ModelSerializer):
     """
     Serializer pour les détails complets d'un produit.
     """
@@ -631,14 +575,6 @@ class ProductDetailSerializer(serializers.ModelSerializer):
         """Retourne l'image principale du produit"""
         return obj.image_display_url
 
-    def get_price(self, obj):
-        final_price, _ = compute_product_pricing(obj)
-        return final_price
-
-    def get_compare_at_price(self, obj):
-        _, original_price = compute_product_pricing(obj)
-        return original_price
-
     def get_category(self, obj):
         """Retourne le nom de la catégorie"""
         return obj.category.name if obj.category else None
@@ -1,26 +1,151 @@
 """
 Service de suppression d'arrière-plan des images du carousel.
 Utilise rembg pour retirer le fond sans modifier l'image originale.
-Les images traitées sont mises en cache dans media/carousel_nobg/.
+Les images traitées sont mises en cache dans media/carousel_nobg/, via l'API de stockage
+de Django (STORAGES['default']) : avec un stockage partagé (S3...), plusieurs nœuds servent
+la même copie. Les écritures sont atomiques (api.services.media_files.write_file_atomic) et
+une image n'est traitée que par un processus à la fois, tous nœuds confondus (travail
+réservé en base, voir acquire_job).
 Configuration production : CAROUSEL_REMOVE_BACKGROUND=true (défaut).
+Modèle et réduction avant inférence : profil CAROUSEL_NOBG_PROFILE (REMOVAL_PROFILES),
+comparés par la commande bench_background_removal.
+
+rembg prend plusieurs secondes par image : il ne tourne pas dans les requêtes HTTP.
+Une image pas encore traitée est mise en file (BackgroundRemovalJob) et l'API renvoie
+l'image originale jusqu'à ce que la commande process_background_removal_jobs ait
+produit la version sans fond ; la version 'carousel' est alors incrémentée, ce qui
+invalide les réponses en cache du carousel et l'instantané de la page d'accueil.
+
+Les versions calculées sont enregistrées (ImageDerivative) : l'affichage lit une ligne,
+préchargée pour tout le carousel (prefetch_nobg_derivatives), sans accès au stockage.
+Une image mise en file ou abandonnée a aussi sa ligne (en file, échec) : le stockage n'est
+interrogé qu'une fois par version de l'image, pas à chaque affichage. Une source remplacée
+sous le même nom est détectée par la commande reconcile_image_derivatives.
 """
 import hashlib
 import io
 import logging
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import timedelta
+from functools import lru_cache
 from pathlib import Path
 
 from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured, SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.db import IntegrityError
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .media_files import write_file_atomic
+from .versions import bump
 
 logger = logging.getLogger(__name__)
 
+# Tentatives avant abandon d'une image, délai avant la 2e tentative (doublé ensuite) et délai maximal
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_DELAY = 60
+JOB_RETRY_MAX_DELAY = 3600
+
+# Travail « en cours » depuis plus longtemps : worker arrêté, le travail est repris
+JOB_STALE_AFTER = 600
+
+# Durée pendant laquelle une mise en file est mémorisée dans le cache (évite une requête SQL par affichage)
+ENQUEUE_MEMO_TIMEOUT = 60
+
+
+# Profils de suppression de fond
+# Profils de suppression de fond
+
+# model : modèle rembg ; max_side : plus grand côté de l'image passée au modèle (None : taille
+# d'origine), le masque obtenu est agrandi à la taille d'origine. Le réseau travaille de toute
+# façon en 320 px (u2net, u2netp) ou 1024 px (isnet) : réduire avant l'inférence économise
+# surtout la mémoire et les redimensionnements sur les grandes photos.
+REMOVAL_PROFILES = {
+    'fast': {'model': 'u2netp', 'max_side': 640},
+    'default': {'model': 'u2net', 'max_side': None},
+    'default-downscaled': {'model': 'u2net', 'max_side': 1024},
+    'quality': {'model': 'isnet-general-use', 'max_side': None},
+}
+DEFAULT_REMOVAL_PROFILE = 'default'
+
+
+def removal_profiles():
+    """Profils disponibles (REMOVAL_PROFILES complétés ou remplacés par settings.CAROUSEL_NOBG_PROFILES)."""
+    return {**REMOVAL_PROFILES, **getattr(settings, 'CAROUSEL_NOBG_PROFILES', {})}
+
+
+def get_removal_profile(name=None):
+    """(nom, paramètres) du profil `name`, par défaut settings.CAROUSEL_NOBG_PROFILE."""
+    name = name or getattr(settings, 'CAROUSEL_NOBG_PROFILE', DEFAULT_REMOVAL_PROFILE)
+    profiles = removal_profiles()
+    if name not in profiles:
+        raise ImproperlyConfigured(
+            f"Profil de suppression de fond inconnu : {name} (disponibles : {', '.join(profiles)})"
+        )
+    return name, profiles[name]
+
+
+# Format de sortie
+# Format de sortie
+
+# Dimensions maximales des images sans fond : affichage du carousel (450 x 320, HeroCarousel.jsx)
+# doublé pour les écrans haute densité
+NOBG_MAX_SIZE = (900, 640)
+
+# Qualité WebP (None : WebP sans perte) ; l'alpha est toujours encodé sans perte
+NOBG_WEBP_QUALITY = 85
+
 
-def get_carousel_image_no_background(image_field):
+@lru_cache(maxsize=None)
+def _webp_supported():
+    from PIL import features
+    return features.check('webp')
+
+
+def nobg_output_format():
+    """
+    Sortie des images sans fond : {'format', 'max_size', 'quality'}. WebP avec alpha
+    (settings.CAROUSEL_NOBG_FORMAT, défaut 'webp'), PNG si demandé ou si Pillow n'encode pas le WebP.
+    """
+    fmt = getattr(settings, 'CAROUSEL_NOBG_FORMAT', 'webp')
+    if fmt == 'webp' and not _webp_supported():
+        fmt = 'png'
+    return {
+        'format': fmt,
+        'max_size': tuple(getattr(settings, 'CAROUSEL_NOBG_MAX_SIZE', NOBG_MAX_SIZE)),
+        'quality': getattr(settings, 'CAROUSEL_NOBG_WEBP_QUALITY', NOBG_WEBP_QUALITY) if fmt == 'webp' else None,
+    }
+
+
+def nobg_target(source_name, profile=None):
+    """
+    (clé, nom dans le stockage) de la version sans fond : hash du nom et de la date de
+    modification de la source, du profil (nom et paramètres) et du format de sortie ;
+    changer l'un d'eux recalcule les images.
+    """
+    name, params = get_removal_profile(profile)
+    output = nobg_output_format()
+    mtime = default_storage.get_modified_time(source_name).timestamp()
+    raw = f"{source_name}{mtime}{name}{sorted(params.items())}{sorted(output.items())}"
+    cache_key = hashlib.sha256(raw.encode()).hexdigest()[:16]
+    return cache_key, f"carousel_nobg/{cache_key}.{output['format']}"
+
+
+def get_carousel_image_no_background(image_field, inline=False, derivatives=None):
     """
     Retourne l'URL de l'image sans arrière-plan pour le carousel.
     L'image originale n'est jamais modifiée.
     
     :param image_field: Django ImageField (ex: product.image, ProductImage.image)
-    :return: URL relative (ex: /media/carousel_nobg/xxx.png) ou None si échec
+    :param inline: traiter l'image immédiatement (pre-warm) au lieu de la mettre en file
+    :param derivatives: résultat de prefetch_nobg_derivatives (sinon une requête par image)
+    :return: URL relative (ex: /media/carousel_nobg/xxx.webp), URL de l'original
+             tant que la version sans fond n'est pas prête, ou None
     """
     if not image_field:
         return None
@@ -28,59 +153,471 @@ def get_carousel_image_no_background(image_field):
     # Option de désactivation (ex: CAROUSEL_REMOVE_BACKGROUND=False dans settings)
     if not getattr(settings, 'CAROUSEL_REMOVE_BACKGROUND', True):
         return image_field.url
-    
+
+    # Version déjà enregistrée : aucune lecture du système de fichiers
+    if derivatives is None:
+        derivatives = prefetch_nobg_derivatives([image_field])
+    derivative = derivatives.get(image_field.name)
+    if derivative is not None:
+        if derivative.status == derivative.STATUS_READY:
+            return default_storage.url(derivative.output_name)
+        if not inline:
+            # En file ou abandonnée : l'original, sans accès au stockage
+            return image_field.url
+
+    source_name = image_field.name
     try:
-        source_path = Path(image_field.path)
-    except (ValueError, OSError):
-        # image_url ou chemin invalide
-        return image_field.url if hasattr(image_field, 'url') else None
-    
-    if not source_path.exists():
+        if not default_storage.exists(source_name):
+            return image_field.url
+        cache_key, output_name = nobg_target(source_name)
+    except (ValueError, OSError, SuspiciousFileOperation):
+        # nom de fichier invalide
         return image_field.url
     
-    # Dossier de cache pour les images sans fond
-    cache_dir = Path(settings.MEDIA_ROOT) / 'carousel_nobg'
-    cache_dir.mkdir(parents=True, exist_ok=True)
-    
-    # Clé de cache : hash du chemin + mtime pour détecter les changements
-    mtime = source_path.stat().st_mtime
-    cache_key = hashlib.sha256(f"{source_path}{mtime}".encode()).hexdigest()[:16]
-    output_filename = f"{cache_key}.png"
-    output_path = cache_dir / output_filename
-    
-    # Si déjà traité, retourner l'URL
-    if output_path.exists():
-        return f"{settings.MEDIA_URL}carousel_nobg/{output_filename}"
-    
-    # Traiter et sauvegarder
+    # Si déjà traité (avant l'enregistrement des dérivées ou par un autre nœud), l'enregistrer
+    if default_storage.exists(output_name):
+        record_derivative(source_name, output_name)
+        return default_storage.url(output_name)
+
+    if not inline:
+        enqueue_background_removal(cache_key, source_name, output_name)
+        record_job_derivative(cache_key, source_name, output_name)
+        return image_field.url
+
+    # Traiter et sauvegarder, sauf si un autre processus traite déjà cette image
+    job = acquire_job(cache_key, source_name, output_name)
+    if job is None:
+        return image_field.url
     try:
-        _remove_background_and_save(source_path, output_path)
-        return f"{settings.MEDIA_URL}carousel_nobg/{output_filename}"
+        _remove_background_and_save(source_name, output_name)
+        record_derivative(source_name, output_name)
     except Exception as e:
         logger.warning(
             "Suppression de fond échouée pour %s: %s. Utilisation de l'image originale.",
-            source_path,
+            source_name,
             e,
         )
+        complete_job(job, f"{type(e).__name__}: {e}")
         return image_field.url
+    complete_job(job)
+    return default_storage.url(output_name)
 
 
-def _remove_background_and_save(input_path, output_path):
+# Images dérivées enregistrées
+# Images dérivées enregistrées
+
+def nobg_profile(profile=None):
     """
-# Import io pour BytesIO
-import io
-    Supprime l'arrière-plan de l'image source et sauvegarde en PNG.
+    Identifiant du profil et du format de sortie (ImageDerivative.profile), ex. 'default-3f2a9c1e' :
+    nom du profil et empreinte de ses paramètres et du format.
     """
-    from rembg import remove
+    name, params = get_removal_profile(profile)
+    raw = f"{sorted(params.items())}{sorted(nobg_output_format().items())}"
+    return f"{name}-{hashlib.sha256(raw.encode()).hexdigest()[:8]}"
+
+
+def prefetch_nobg_derivatives(image_fields):
+    """
+    Versions sans fond prêtes des images données, en une requête :
+    {nom du fichier source: ImageDerivative}, à passer à get_carousel_image_no_background.
+    """
+    from api.models import ImageDerivative  # import local pour éviter les cycles
+
+    names = {image_field.name for image_field in image_fields if image_field}
+    if not names or not getattr(settings, 'CAROUSEL_REMOVE_BACKGROUND', True):
+        return {}
+    rows = ImageDerivative.objects.filter(
+        kind=ImageDerivative.KIND_CAROUSEL_NOBG, profile=nobg_profile(), source_name__in=names,
+        status__in=[ImageDerivative.STATUS_READY, ImageDerivative.STATUS_PENDING, ImageDerivative.STATUS_FAILED],
+    ).only('source_name', 'output_name', 'status')
+    return {row.source_name: row for row in rows}
+
+
+def record_derivative(source_name, output_name, profile=None, status=None):
+    """
+    Enregistre (ou met à jour) la version sans fond `output_name` de la source : prête
+    (par défaut), ou en file / abandonnée (status, sortie pas encore écrite).
+    """
+    from api.models import ImageDerivative
+
+    status = status or ImageDerivative.STATUS_READY
+    ImageDerivative.objects.update_or_create(
+        kind=ImageDerivative.KIND_CAROUSEL_NOBG, profile=nobg_profile(profile), source_name=source_name,
+        defaults={
+            'source_mtime': default_storage.get_modified_time(source_name).timestamp(),
+            'source_size': default_storage.size(source_name),
+            'output_name': output_name,
+            'output_size': default_storage.size(output_name) if status == ImageDerivative.STATUS_READY else 0,
+            'status': status,
+        },
+    )
+
+
+def record_job_derivative(cache_key, source_name, output_name):
+    """Après la mise en file : ligne « en file », ou « échec » si le travail est abandonné (FAILED)."""
+    from api.models import BackgroundRemovalJob, ImageDerivative
+
+    failed = BackgroundRemovalJob.objects.filter(
+        cache_key=cache_key, status=BackgroundRemovalJob.STATUS_FAILED,
+    ).exists()
+    status = ImageDerivative.STATUS_FAILED if failed else ImageDerivative.STATUS_PENDING
+    record_derivative(source_name, output_name, status=status)
+
+
+# File de traitement
+# File de traitement
+
+def enqueue_background_removal(cache_key, source_name, output_name):
+    """
+    Met l'image en file, une seule fois par cache_key (demandes simultanées dédoublonnées
+    par le cache puis par la contrainte d'unicité). Appelée quand ni la version enregistrée
+    ni le fichier de sortie n'existent : un travail déjà terminé dont la sortie a été perdue
+    (supprimée, reconcile_image_derivatives) est remis en file. Retourne True si un travail
+    a été créé ou remis en file.
+    """
+    from api.models import BackgroundRemovalJob  # import local pour éviter les cycles
+
+    if not cache.add(f'nobg-job:{cache_key}', 1, ENQUEUE_MEMO_TIMEOUT):
+        return False
+    try:
+        job, created = BackgroundRemovalJob.objects.get_or_create(
+            cache_key=cache_key, defaults={'source_name': source_name, 'output_name': output_name},
+        )
+    except IntegrityError:
+        return False  # créé au même instant par un autre worker
+    if created:
+        return True
+    # Les travaux abandonnés (FAILED) ne sont relancés que depuis l'admin : pas de boucle sur une image qui échoue
+    return bool(BackgroundRemovalJob.objects.filter(pk=job.pk, status=BackgroundRemovalJob.STATUS_DONE).update(
+        status=BackgroundRemovalJob.STATUS_PENDING, attempts=0, next_attempt_at=timezone.now(), last_error='',
+    ))
+
+
+def retry_delay(attempts):
+    """Délai avant la tentative suivante, après `attempts` échecs (doublé à chaque échec, plafonné)."""
+    base = getattr(settings, 'CAROUSEL_NOBG_RETRY_DELAY', JOB_RETRY_DELAY)
+    maximum = getattr(settings, 'CAROUSEL_NOBG_RETRY_MAX_DELAY', JOB_RETRY_MAX_DELAY)
+    return timedelta(seconds=min(base * 2 ** max(attempts - 1, 0), maximum))
+
+
+def _stale_before():
+    return timezone.now() - timedelta(seconds=getattr(settings, 'CAROUSEL_NOBG_STALE_AFTER', JOB_STALE_AFTER))
+
+
+def acquire_job(cache_key, source_name, output_name):
+    """
+    Verrou partagé par tous les nœuds (la base) pour traiter une image hors worker (pre-warm,
+    traitement immédiat) : crée le travail si besoin puis le réserve par une mise à jour
+    conditionnelle. Retourne le travail réservé, ou None si un autre processus le traite déjà.
+    """
+    from api.models import BackgroundRemovalJob
+
+    try:
+        job, _ = BackgroundRemovalJob.objects.get_or_create(
+            cache_key=cache_key, defaults={'source_name': source_name, 'output_name': output_name},
+        )
+    except IntegrityError:
+        job = BackgroundRemovalJob.objects.get(cache_key=cache_key)
+    claimed = BackgroundRemovalJob.objects.filter(pk=job.pk).exclude(
+        Q(status=BackgroundRemovalJob.STATUS_RUNNING) & Q(started_at__gte=_stale_before())
+    ).update(status=BackgroundRemovalJob.STATUS_RUNNING, started_at=timezone.now(), attempts=F('attempts') + 1)
+    if not claimed:
+        return None
+    job.refresh_from_db()
+    return job
+
+
+def requeue_jobs(queryset):
+    """
+    Remet en file les travaux du queryset (compteur de tentatives remis à zéro), terminés compris :
+    le worker enregistre la sortie si elle existe encore, sinon la recalcule. Un travail en cours
+    n'est remis en file que si sa réservation est abandonnée (plus de JOB_STALE_AFTER s) : sinon
+    deux processus traiteraient la même image. Retourne (remis en file, ignorés car en cours).
+    """
+    from api.models import BackgroundRemovalJob, ImageDerivative
+
+    selected = list(queryset.values_list('pk', 'output_name'))
+    active = Q(status=BackgroundRemovalJob.STATUS_RUNNING) & Q(started_at__gte=_stale_before())
+    requeued = BackgroundRemovalJob.objects.filter(pk__in=[pk for pk, _ in selected]).exclude(active)
+    output_names = list(requeued.values_list('output_name', flat=True))
+    updated = requeued.update(
+        status=BackgroundRemovalJob.STATUS_PENDING, attempts=0, next_attempt_at=timezone.now(), last_error='',
+    )
+    ImageDerivative.objects.filter(
+        output_name__in=output_names, status=ImageDerivative.STATUS_FAILED,
+    ).update(status=ImageDerivative.STATUS_PENDING)
+    return updated, len(selected) - updated
+
+
+def _mark_derivative_failed(job):
+    """Travail abandonné : l'affichage sert l'original sans nouvel accès au stockage jusqu'à une relance."""
+    from api.models import ImageDerivative
+
+    ImageDerivative.objects.filter(
+        kind=ImageDerivative.KIND_CAROUSEL_NOBG, source_name=job.source_name, output_name=job.output_name,
+        status=ImageDerivative.STATUS_PENDING,
+    ).update(status=ImageDerivative.STATUS_FAILED)
+
+
+def release_stale_jobs():
+    """
+    Travaux « en cours » depuis plus de JOB_STALE_AFTER s : le processus s'est arrêté, souvent
+    tué par l'image elle-même (mémoire épuisée dans rembg). Comptés comme un échec : remis en
+    file après le délai croissant, ou abandonnés une fois les tentatives épuisées.
+    Retourne le nombre de travaux libérés.
+    """
+    from api.models import BackgroundRemovalJob
+
+    now = timezone.now()
+    max_attempts = getattr(settings, 'CAROUSEL_NOBG_MAX_ATTEMPTS', JOB_MAX_ATTEMPTS)
+    stale = BackgroundRemovalJob.objects.filter(
+        status=BackgroundRemovalJob.STATUS_RUNNING, started_at__lt=_stale_before(),
+    )
+    released = 0
+    for job in stale.order_by('id')[:100]:
+        if job.attempts >= max_attempts:
+            fields = {'status': BackgroundRemovalJob.STATUS_FAILED}
+        else:
+            fields = {'status': BackgroundRemovalJob.STATUS_PENDING, 'next_attempt_at': now + retry_delay(job.attempts)}
+        updated = BackgroundRemovalJob.objects.filter(
+            pk=job.pk, status=BackgroundRemovalJob.STATUS_RUNNING, started_at=job.started_at,
+        ).update(last_error="Traitement interrompu (processus arrêté)", updated_at=now, **fields)
+        if updated and fields['status'] == BackgroundRemovalJob.STATUS_FAILED:
+            _mark_derivative_failed(job)
+        released += updated
+    return released
+
+
+def claim_next_job():
+    """
+    Réserve le prochain travail en attente dû par une mise à jour conditionnelle : deux
+    workers ne traitent jamais le même travail. Les travaux interrompus sont d'abord
+    libérés (release_stale_jobs).
+    """
+    from api.models import BackgroundRemovalJob
+
+    release_stale_jobs()
+    now = timezone.now()
+    pending = BackgroundRemovalJob.objects.filter(
+        status=BackgroundRemovalJob.STATUS_PENDING, next_attempt_at__lte=now,
+    )
+    for job in pending.order_by('next_attempt_at', 'id')[:10]:
+        claimed = BackgroundRemovalJob.objects.filter(
+            pk=job.pk, status=job.status, attempts=job.attempts,
+        ).update(status=BackgroundRemovalJob.STATUS_RUNNING, started_at=now, attempts=job.attempts + 1)
+        if claimed:
+            job.refresh_from_db()
+            return job
+    return None
+
+
+def complete_job(job, error=None, permanent=False):
+    """
+    Enregistre l'issue d'un travail réservé : terminé (error=None), à retenter plus tard
+    (délai croissant) ou abandonné (permanent, ou tentatives épuisées). Retourne le statut.
+    """
+    from api.models import BackgroundRemovalJob
+
+    job.last_error = error or ''
+    if error is None:
+        job.status = BackgroundRemovalJob.STATUS_DONE
+        # Réponses du carousel et instantané de la page d'accueil à recalculer avec l'image sans fond
+        bump('carousel')
+    elif permanent or job.attempts >= getattr(settings, 'CAROUSEL_NOBG_MAX_ATTEMPTS', JOB_MAX_ATTEMPTS):
+        job.status = BackgroundRemovalJob.STATUS_FAILED
+        _mark_derivative_failed(job)
+    else:
+        job.status = BackgroundRemovalJob.STATUS_PENDING
+        job.next_attempt_at = timezone.now() + retry_delay(job.attempts)
+    job.save(update_fields=['status', 'last_error', 'next_attempt_at', 'updated_at'])
+    return job.status
+
+
+def run_job(job):
+    """Traite un travail réservé : terminé, à retenter plus tard ou abandonné. Retourne le statut."""
+    try:
+        if not default_storage.exists(job.output_name):
+            if not default_storage.exists(job.source_name) or nobg_target(job.source_name)[0] != job.cache_key:
+                raise FileNotFoundError(
+                    f"{job.source_name} supprimée ou modifiée (ou profil changé) depuis la mise en file"
+                )
+            _remove_background_and_save(job.source_name, job.output_name)
+        record_derivative(job.source_name, job.output_name)
+    except FileNotFoundError as e:
+        # Source disparue : une nouvelle version sera mise en file à son prochain affichage
+        return complete_job(job, str(e), permanent=True)
+    except Exception as e:
+        logger.warning("Suppression de fond échouée pour %s (tentative %d): %s", job.source_name, job.attempts, e)
+        return complete_job(job, f"{type(e).__name__}: {e}")
+    return complete_job(job)
+
+
+def process_pending_jobs(limit=None):
+    """Traite les travaux dus jusqu'à épuisement (ou `limit`). Retourne le nombre traité."""
+    processed = 0
+    while limit is None or processed < limit:
+        job = claim_next_job()
+        if job is None:
+            break
+        run_job(job)
+        processed += 1
+    return processed
+
+
+# Session rembg et traitement par lots
+# Session rembg et traitement par lots
+
+_sessions = {}  # modèle -> session rembg
+_session_lock = threading.Lock()
+
+
+def get_rembg_session(model=None):
+    """
+    Session rembg du processus pour `model` (par défaut celui du profil courant) : le modèle
+    ONNX est chargé une fois, puis réutilisé ; sans session, rembg.remove() le recharge à chaque image.
+    """
+    model = model or get_removal_profile()[1]['model']
+    session = _sessions.get(model)
+    if session is None:
+        with _session_lock:
+            session = _sessions.get(model)
+            if session is None:
+                from rembg import new_session
+                session = _sessions[model] = new_session(model)
+    return session
+
+
+def remove_backgrounds(items, profile=None, compare=False):
+    """
+    Traite un lot d'images avec la session du processus.
+
+    :param items: itérable de (nom de la source, nom de la sortie) dans le stockage
+    :param profile: nom du profil (par défaut settings.CAROUSEL_NOBG_PROFILE)
+    :param compare: mesurer aussi le PNG pleine taille de l'ancienne sortie (voir encode_cutout)
+    :return: liste de (nom de la source, durée en secondes, erreur ou None, statistiques
+             d'encodage ou None), dans l'ordre
+    """
+    results = []
+    for source_name, output_name in items:
+        start = time.perf_counter()
+        error = stats = None
+        try:
+            stats = _remove_background_and_save(source_name, output_name, profile, compare)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        results.append((source_name, time.perf_counter() - start, error, stats))
+    return results
+
+
+def _init_pool_worker(threads):
+    """Processus du pool : threads ONNX limités à sa part des cœurs, session propre au processus."""
+    os.environ['OMP_NUM_THREADS'] = str(threads)  # lu par rembg à la création de la session
+    _sessions.clear()
+
+
+def remove_backgrounds_parallel(items, workers=1, profile=None, compare=False):
+    """
+    Traite les images sur `workers` processus (une session rembg chacun, les cœurs
+    répartis entre eux). Générateur des résultats de remove_backgrounds, dans l'ordre
+    d'achèvement ; workers <= 1 : dans le processus courant.
+
+    `items` est consommé au fur et à mesure : au plus `workers` images en cours, la
+    suivante n'est lue qu'à la fin d'une autre. Une réservation faite en produisant
+    l'élément (acquire_job) commence donc aussitôt au lieu d'attendre son tour.
+    """
+    items = iter(items)
+    if workers <= 1:
+        for item in items:
+            yield from remove_backgrounds([item], profile, compare)
+        return
+
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_pool_worker, initargs=(threads,)) as pool:
+        # Une image par tâche : les processus libres prennent la suivante (durées très variables)
+        running = set()
+        for item in items:
+            running.add(pool.submit(remove_backgrounds, [item], profile, compare))
+            if len(running) >= workers:
+                break
+        while running:
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = next(items, None)
+                if item is not None:
+                    running.add(pool.submit(remove_backgrounds, [item], profile, compare))
+                yield from future.result()
+
+
+def compact_cutout(image, max_size):
+    """Image RGBA rognée à ses pixels non transparents et réduite pour tenir dans max_size."""
     from PIL import Image
-    
-    with open(input_path, 'rb') as f:
-        input_data = f.read()
-    
-    output_data = remove(input_data)
-    
-    # Sauvegarder en PNG pour la transparence
-    img = Image.open(io.BytesIO(output_data))
-    img.save(output_path, 'PNG')
 
+    bbox = image.getchannel('A').getbbox()
+    if bbox:
+        image = image.crop(bbox)
+    image.thumbnail(max_size, Image.LANCZOS)
+    return image
+
+
+def encode_cutout(image, fmt, quality=None):
+    """Octets de l'image en WebP avec alpha (quality=None : sans perte) ou en PNG."""
+    buffer = io.BytesIO()
+    if fmt == 'webp':
+        if quality is None:
+            image.save(buffer, 'WEBP', lossless=True, method=4)
+        else:
+            image.save(buffer, 'WEBP', quality=quality, alpha_quality=100, method=4)
+    else:
+        image.save(buffer, 'PNG', optimize=True)
+    return buffer.getvalue()
+
+
+def _remove_background(source_name, profile=None):
+    """Image RGBA de la source (nom dans le stockage) sans arrière-plan, selon le profil."""
+    from rembg import remove
+    from PIL import Image, ImageOps
+
+    _, params = get_removal_profile(profile)
+    session = get_rembg_session(params['model'])
+
+    with default_storage.open(source_name, 'rb') as f, Image.open(f) as source:
+        img = ImageOps.exif_transpose(source).convert('RGBA')
+
+    max_side = params.get('max_side')
+    if max_side and max(img.size) > max_side:
+        # Masque calculé sur une copie réduite puis agrandi à la taille d'origine
+        small = img.convert('RGB')
+        small.thumbnail((max_side, max_side), Image.LANCZOS)
+        mask = remove(small, session=session, only_mask=True).resize(img.size, Image.BILINEAR)
+        return Image.composite(img, Image.new('RGBA', img.size, 0), mask)
+    return remove(img, session=session)
+
+
+def _remove_background_and_save(source_name, output_name, profile=None, compare=False):
+    """
+    Supprime l'arrière-plan de l'image source selon le profil, rogne les bords transparents,
+    réduit à la taille d'affichage et écrit (atomiquement) au format de l'extension de
+    output_name (.webp : WebP avec alpha, sinon PNG).
+
+    :return: {'bytes', 'encode_seconds'} et, avec compare, {'png_bytes', 'png_encode_seconds'} :
+             PNG pleine taille non rogné (ancienne sortie)
+    """
+    cutout = _remove_background(source_name, profile)
+
+    stats = {}
+    if compare:
+        start = time.perf_counter()
+        buffer = io.BytesIO()
+        cutout.save(buffer, 'PNG')
+        stats['png_bytes'] = buffer.tell()
+        stats['png_encode_seconds'] = time.perf_counter() - start
+
+    output = nobg_output_format()
+    fmt = 'webp' if Path(output_name).suffix == '.webp' else 'png'
+    start = time.perf_counter()
+    data = encode_cutout(compact_cutout(cutout, output['max_size']), fmt, output['quality'])
+    stats['encode_seconds'] = time.perf_counter() - start
+    stats['bytes'] = len(data)
 
+    write_file_atomic(output_name, data)
+    return stats
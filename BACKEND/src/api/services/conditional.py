@@ -0,0 +1,84 @@
+"""
+Requêtes conditionnelles (ETag / Last-Modified) des endpoints publics du catalogue.
+
+Les validateurs sont calculés sans toucher l'ORM, à partir des versions
+(api.services.versions) des modèles dont la réponse dépend :
+- ETag : empreinte de la vue, de l'action, des paramètres d'URL et de requête,
+  du format de rendu et des versions ;
+- Last-Modified : date de la version la plus récente (la date de modification
+  du fichier témoin est celle de la dernière écriture sur le modèle).
+
+Si le client renvoie un validateur encore valide (If-None-Match / If-Modified-Since),
+la vue répond 304 Not Modified sans requête SQL ni sérialisation.
+
+Les réponses qui dépendent aussi de l'heure (prix résolus sur les fenêtres de
+promotion et de flash, mélange par période) passent `period` : les validateurs
+changent au début de chaque période.
+
+Usage sur une vue (à placer au-dessus de @cached_response) :
+    @conditional_response('product', 'category', period=60)
+    def list(self, request): ...
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from .metrics import record_cache
+from .versions import get_versions
+
+# Codes de réponse qui reçoivent des validateurs
+VALIDATED_STATUS = (200,)
+
+
+def conditional_validators(view, request, version_names, kwargs, period=None):
+    """Retourne (etag, last_modified) ; last_modified est un timestamp en secondes ou None."""
+    versions = get_versions(*version_names)
+    params = sorted((key, request.query_params.getlist(key)) for key in request.query_params)
+    renderer = getattr(request, 'accepted_media_type', None)
+    window = int(time.time() // period) if period else None
+    raw = repr((
+        type(view).__name__, getattr(view, 'action', None), sorted(kwargs.items()), params,
+        renderer, versions, window,
+    ))
+    etag = '"%s"' % hashlib.md5(raw.encode()).hexdigest()
+
+    # Version 0 : modèle jamais modifié depuis la création du répertoire des versions, date inconnue
+    if not versions or 0 in versions:
+        return etag, None
+    last_modified = max(versions) // 1_000_000_000
+    if window is not None:
+        last_modified = max(last_modified, window * period)
+    return etag, last_modified
+
+
+def conditional_response(*version_names, period=None):
+    """
+    Décorateur de méthode de vue (list / retrieve) : ajoute ETag et Last-Modified
+    et répond 304 quand le client a déjà la réponse courante.
+
+    version_names : versions dont dépend la réponse ('product', 'category', ...)
+    period : durée (secondes) au-delà de laquelle la réponse peut changer sans écriture
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return method(self, request, *args, **kwargs)
+
+            etag, last_modified = conditional_validators(self, request, version_names, kwargs, period)
+            not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            record_cache('conditional', not_modified is not None)
+            if not_modified is not None:
+                return not_modified
+
+            response = method(self, request, *args, **kwargs)
+            if response.status_code in VALIDATED_STATUS:
+                response['ETag'] = etag
+                if last_modified is not None:
+                    response['Last-Modified'] = http_date(last_modified)
+            return response
+        return wrapper
+    return decorator
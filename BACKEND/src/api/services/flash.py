@@ -0,0 +1,58 @@
+"""
+Instantané du flash promotion actif.
+
+Le flash actif, son produit principal et ses produits secondaires actifs sont
+chargés en 3 requêtes (flash + items principaux + produits secondaires), puis
+partagés via le contexte des serializers (clé 'flash') au lieu d'être relus
+pour chaque produit.
+"""
+from django.db.models import Prefetch
+
+# Nombre maximum de produits secondaires affichés
+SECONDARY_PRODUCTS_LIMIT = 8
+
+
+class FlashSnapshot:
+    """Flash actif + produit principal + produits secondaires actifs (préchargés)."""
+
+    def __init__(self, flash):
+        self.flash = flash
+        main_items = getattr(flash, 'prefetched_main_items', [])
+        self.main_item = main_items[0] if main_items else None
+        self.secondary_products = getattr(flash, 'prefetched_secondary_products', [])[:SECONDARY_PRODUCTS_LIMIT]
+
+    @property
+    def secondary_start_date(self):
+        return self.flash.secondary_start_date
+
+    @property
+    def secondary_end_date(self):
+        return self.flash.secondary_end_date
+
+
+def load_active_flash_snapshot():
+    """
+    Retourne le FlashSnapshot du flash actif, ou None s'il n'y en a pas.
+    """
+    from api.models import ProductFlash, FlashProductItem, Product  # import local pour éviter les cycles
+
+    flash = (
+        ProductFlash.objects
+        .filter(is_active=True)
+        .prefetch_related(
+            Prefetch(
+                'items',
+                queryset=FlashProductItem.objects.filter(is_main=True).select_related('product'),
+                to_attr='prefetched_main_items',
+            ),
+            Prefetch(
+                'secondary_products',
+                queryset=Product.objects.filter(is_active=True),
+                to_attr='prefetched_secondary_products',
+            ),
+        )
+        .first()
+    )
+    if flash is None:
+        return None
+    return FlashSnapshot(flash)
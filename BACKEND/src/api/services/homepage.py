@@ -0,0 +1,395 @@
+"""
+Page d'accueil : construction des sections et instantané pré-rendu.
+
+build_homepage_data() assemble les sections de /api/homepage/ avec les serializers
+des endpoints dédiés, à partir de requêtes partagées (images, flash).
+
+L'instantané (/api/homepage/snapshot/) est le JSON complet de toutes les sections,
+déjà rendu en octets, écrit tel quel dans un fichier partagé par les workers
+(HOMEPAGE_SNAPSHOT_DIR), avec un fichier JSON de métadonnées (etag, dates, versions).
+Chaque worker le relit et le compresse en gzip une fois par version. Il est reconstruit :
+- en arrière-plan, après la validation de toute écriture sur un modèle affiché
+  (signaux, voir api/signals.py) ;
+- à la lecture, si les versions des modèles ont changé depuis sa construction
+  (écriture dont la reconstruction n'est pas encore terminée) ;
+- à la lecture, s'il a plus de SNAPSHOT_MAX_AGE secondes.
+
+Champs dépendant de l'heure : remaining_time des flashs est calculé à la construction,
+donc exact à SNAPSHOT_MAX_AGE près ; generated_at donne l'instant du calcul
+(temps restant réel = remaining_time - (maintenant - generated_at)). Les sections
+filtrées par date (promotions, flash) suivent la même limite.
+"""
+import gzip
+import hashlib
+import logging
+import json
+import os
+import tempfile
+import threading
+from collections import namedtuple
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Exists, F, OuterRef, Window, prefetch_related_objects
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from api.models import (
+    Category, MaSelection, ParametrePage, Product, ProductCarousel, ProductPromotion, SiteSettings,
+)
+from api.renderers import FastJSONRenderer
+from api.serializers import (
+    CategoryNewProductsSerializer, MainFlashProductSerializer,
+    ProductCarouselSerializer, ProductPromotionSerializer, SecondaryFlashProductSerializer,
+    SiteSettingsSerializer, refresh_remaining_time,
+)
+from .flash import load_active_flash_snapshot
+from .images import display_images_prefetch
+from .metrics import record_cache
+from .projections import MA_SELECTION_PRODUCT_FIELDS, NEW_PRODUCT_FIELDS, ma_selection_product_data
+from .versions import get_versions
+
+logger = logging.getLogger(__name__)
+
+HOMEPAGE_SECTIONS = (
+    'site_settings',
+    'product_carousel',
+    'featured_promotions',
+    'flash_main_product',
+    'flash_secondary_products',
+    'new_products',
+    'ma_selection',
+)
+
+# Versions des modèles affichés sur la page d'accueil (api.services.versions)
+HOMEPAGE_VERSION_NAMES = (
+    'site_settings', 'parametre_page', 'ma_selection', 'carousel', 'product', 'product_image',
+    'promotion', 'flash', 'category',
+)
+
+# Nombre de promotions mises en avant (même défaut que featured-promotions)
+HOMEPAGE_FEATURED_LIMIT = 10
+
+# Âge maximum de l'instantané (précision de remaining_time et des filtres par date)
+SNAPSHOT_MAX_AGE = timedelta(seconds=60)
+
+# Délai avant reconstruction en arrière-plan (regroupe les écritures successives de l'admin)
+SNAPSHOT_REBUILD_DELAY = 0.5
+
+
+# Sections
+# Sections
+
+def featured_promotions_queryset():
+    """Promotions mises en avant, actives et en cours (plus récentes d'abord)."""
+    today = timezone.now()
+    return ProductPromotion.objects.filter(
+        is_active=True,
+        is_featured=True,
+        start_date__lte=today,
+        end_date__gte=today,
+    ).select_related("product").order_by("-created_at")
+
+
+def _newest_products_by_category(category_ids, limit=None):
+    """
+    Retourne {category_id: [produits]} : les `limit` produits actifs les plus récents
+    de chaque catégorie, en une seule requête
+    (ROW_NUMBER() OVER (PARTITION BY category ORDER BY created_at DESC)).
+    """
+    queryset = (
+        Product.objects
+        .filter(is_active=True, category_id__in=category_ids)
+        .select_related('category')
+        .only(*NEW_PRODUCT_FIELDS)
+        .annotate(rank=Window(
+            expression=RowNumber(),
+            partition_by=[F('category_id')],
+            order_by=[F('created_at').desc(), F('id').desc()],
+        ))
+        .order_by('category_id', 'rank')
+    )
+    if limit:
+        queryset = queryset.filter(rank__lte=limit)
+
+    products_by_category = {category_id: [] for category_id in category_ids}
+    for product in queryset:
+        products_by_category[product.category_id].append(product)
+    return products_by_category
+
+
+def new_products_payload(parametres):
+    """Données de la section Nouveaux produits (3 requêtes : voir _newest_products_by_category)."""
+    category_limit = parametres.new_products_category_limit if parametres else 3
+    products_limit = parametres.new_products_per_category_limit if parametres else 12
+
+    # Filtrer uniquement les catégories qui ont au moins un produit actif
+    # (EXISTS plutôt qu'une jointure + distinct)
+    categories = list(
+        Category.objects
+        .filter(Exists(Product.objects.filter(category=OuterRef('pk'), is_active=True)))
+        .order_by('name')[:category_limit]
+    )
+
+    # Produits récents de toutes les catégories en une requête, quel que soit le nombre de catégories
+    serializer = CategoryNewProductsSerializer(
+        categories,
+        many=True,
+        context={
+            'products_limit': products_limit,
+            'products_by_category': _newest_products_by_category(
+                [category.id for category in categories], products_limit
+            ),
+        }
+    )
+    
+    # Filtrer les résultats pour ne garder que les catégories avec des produits
+    filtered_results = [
+        category_data for category_data in serializer.data
+        if category_data.get('products') and len(category_data.get('products', [])) > 0
+    ]
+    
+    return {
+        "category_limit": category_limit,
+        "products_limit": products_limit,
+        "results": filtered_results
+    }
+
+
+def ma_selection_payload(ma_selection):
+    """Données de la section Ma Selection (une requête pour les produits actifs)."""
+    if not ma_selection:
+        return {
+            'title': 'Ma Selection',
+            'is_active': False,
+            'products': []
+        }
+
+    # Vérifier si la section est active
+    if not ma_selection.is_active:
+        return {
+            'title': ma_selection.title,
+            'is_active': False,
+            'products': []
+        }
+
+    # Récupérer les produits actifs seulement (une requête, le total est la longueur de la liste)
+    products = list(ma_selection.products.filter(is_active=True).only(*MA_SELECTION_PRODUCT_FIELDS))
+
+    return {
+        'title': ma_selection.title,
+        'is_active': ma_selection.is_active,
+        'count': len(products),
+        'results': ma_selection_product_data(products)
+    }
+
+
+def build_homepage_data(sections=HOMEPAGE_SECTIONS):
+    """Construit les sections demandées (dict section -> données sérialisées)."""
+    data = {}
+
+    if 'site_settings' in sections:
+        site_settings = SiteSettings.load()
+        data['site_settings'] = SiteSettingsSerializer(site_settings).data if site_settings else {}
+
+    # Carousel et promotions : une seule requête d'images pour tous leurs produits
+    carousel = promotions = []
+    if 'product_carousel' in sections:
+        # Diapositives actives seulement, comme le storefront (/api/product-carousel/?active=true)
+        carousel = list(ProductCarousel.objects.filter(is_active=True).select_related('product').order_by('position'))
+    if 'featured_promotions' in sections:
+        promotions = list(featured_promotions_queryset()[:HOMEPAGE_FEATURED_LIMIT])
+    products = [row.product for row in carousel + promotions if row.product_id]
+    if products:
+        prefetch_related_objects(products, display_images_prefetch())
+    if 'product_carousel' in sections:
+        data['product_carousel'] = ProductCarouselSerializer(carousel, many=True).data
+    if 'featured_promotions' in sections:
+        data['featured_promotions'] = ProductPromotionSerializer(promotions, many=True).data
+
+    # Flash : chargé une fois pour le produit principal et les produits secondaires
+    if 'flash_main_product' in sections or 'flash_secondary_products' in sections:
+        snapshot = load_active_flash_snapshot()
+        if 'flash_main_product' in sections:
+            main_item = snapshot.main_item if snapshot else None
+            data['flash_main_product'] = MainFlashProductSerializer(
+                main_item, context={'flash': snapshot.flash}
+            ).data if main_item else None
+        if 'flash_secondary_products' in sections:
+            data['flash_secondary_products'] = SecondaryFlashProductSerializer(
+                snapshot.secondary_products, many=True, context={'flash': snapshot.flash}
+            ).data if snapshot else []
+
+    if 'new_products' in sections:
+        data['new_products'] = new_products_payload(ParametrePage.load())
+
+    if 'ma_selection' in sections:
+        data['ma_selection'] = ma_selection_payload(MaSelection.load())
+
+    return data
+
+
+def refresh_homepage(data):
+    """Recalcule le temps restant des sections flash d'une réponse servie depuis le cache."""
+    for section in ('flash_main_product', 'flash_secondary_products'):
+        if data.get(section):
+            refresh_remaining_time(data[section])
+    return data
+
+
+# Instantané pré-rendu
+# Instantané pré-rendu
+
+HomepageSnapshot = namedtuple(
+    'HomepageSnapshot', ['body', 'gzip_body', 'etag', 'generated_at', 'expires_at', 'versions']
+)
+
+_build_lock = threading.Lock()
+_timer_lock = threading.Lock()
+_timer = None
+_loaded = None  # (chemin, mtime_ns des métadonnées, HomepageSnapshot) : copie du processus
+
+
+def _snapshot_paths():
+    """Chemins du corps rendu et de ses métadonnées."""
+    directory = Path(getattr(settings, 'HOMEPAGE_SNAPSHOT_DIR', Path(settings.BASE_DIR) / '.homepage_snapshot'))
+    return directory / 'homepage.json', directory / 'homepage.meta.json'
+
+
+def _write_atomic(path, content):
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix='.homepage-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def build_snapshot(now=None):
+    """Construit, rend et enregistre l'instantané (écritures atomiques). Retourne le HomepageSnapshot."""
+    global _loaded
+
+    now = now or timezone.now()
+    # Versions lues avant la construction : une écriture concurrente forcera une reconstruction
+    versions = get_versions(*HOMEPAGE_VERSION_NAMES)
+    data = build_homepage_data()
+    data['generated_at'] = now
+    body = FastJSONRenderer().render(data)
+    snapshot = HomepageSnapshot(
+        body=body,
+        gzip_body=gzip.compress(body, compresslevel=6),
+        etag=hashlib.sha256(body).hexdigest()[:32],
+        generated_at=now,
+        expires_at=now + SNAPSHOT_MAX_AGE,
+        versions=versions,
+    )
+
+    body_path, meta_path = _snapshot_paths()
+    body_path.parent.mkdir(parents=True, exist_ok=True)
+    meta = {
+        'etag': snapshot.etag,
+        'generated_at': now.isoformat(),
+        'expires_at': snapshot.expires_at.isoformat(),
+        'versions': list(versions),
+    }
+    # Corps d'abord, métadonnées ensuite : l'etag des métadonnées valide le corps relu
+    _write_atomic(body_path, body)
+    _write_atomic(meta_path, json.dumps(meta).encode())
+    _loaded = (meta_path, os.stat(meta_path).st_mtime_ns, snapshot)
+    return snapshot
+
+
+def _read_snapshot():
+    """Instantané enregistré (relu seulement si les métadonnées ont changé), ou None."""
+    global _loaded
+
+    body_path, meta_path = _snapshot_paths()
+    try:
+        mtime = os.stat(meta_path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    if _loaded is not None and _loaded[:2] == (meta_path, mtime):
+        return _loaded[2]
+    try:
+        meta = json.loads(meta_path.read_bytes())
+        body = body_path.read_bytes()
+        etag = meta['etag']
+        generated_at = datetime.fromisoformat(meta['generated_at'])
+        expires_at = datetime.fromisoformat(meta['expires_at'])
+        versions = tuple(meta['versions'])
+    except (OSError, ValueError, KeyError, TypeError):
+        logger.warning("Instantané de la page d'accueil illisible, reconstruction", exc_info=True)
+        return None
+    if hashlib.sha256(body).hexdigest()[:32] != etag:
+        # Corps remplacé par une construction concurrente : métadonnées pas encore écrites
+        return None
+    snapshot = HomepageSnapshot(
+        body=body,
+        gzip_body=gzip.compress(body, compresslevel=6),
+        etag=etag,
+        generated_at=generated_at,
+        expires_at=expires_at,
+        versions=versions,
+    )
+    _loaded = (meta_path, mtime, snapshot)
+    return snapshot
+
+
+def _is_current(snapshot, now):
+    return (
+        snapshot is not None
+        and now < snapshot.expires_at
+        and snapshot.versions == get_versions(*HOMEPAGE_VERSION_NAMES)
+    )
+
+
+def get_homepage_snapshot():
+    """Retourne l'instantané à jour, en le reconstruisant si nécessaire."""
+    now = timezone.now()
+    snapshot = _read_snapshot()
+    if _is_current(snapshot, now):
+        record_cache('homepage_snapshot', True)
+        return snapshot
+    record_cache('homepage_snapshot', False)
+    with _build_lock:
+        # Un autre thread a pu reconstruire pendant l'attente du verrou
+        snapshot = _read_snapshot()
+        if _is_current(snapshot, timezone.now()):
+            return snapshot
+        return build_snapshot()
+
+
+def _rebuild_in_background():
+    global _timer
+
+    with _timer_lock:
+        _timer = None
+    try:
+        with _build_lock:
+            build_snapshot()
+    except Exception:
+        logger.exception("Échec de la reconstruction de l'instantané de la page d'accueil")
+    finally:
+        connection.close()
+
+
+def _start_rebuild_timer():
+    global _timer
+
+    with _timer_lock:
+        if _timer is not None:
+            return
+        _timer = threading.Timer(SNAPSHOT_REBUILD_DELAY, _rebuild_in_background)
+        _timer.daemon = True
+        _timer.start()
+
+
+def schedule_snapshot_rebuild():
+    """Planifie une reconstruction en arrière-plan après la validation de la transaction en cours."""
+    if getattr(settings, 'HOMEPAGE_SNAPSHOT_BACKGROUND', True):
+        transaction.on_commit(_start_rebuild_timer)
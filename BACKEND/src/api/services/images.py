@@ -0,0 +1,55 @@
+"""
+Résolution de l'image d'affichage d'un produit.
+
+Règle commune (carousel, promotions, admin, pre-warm) :
+image principale (ProductImage.is_primary), sinon première image (ordre id),
+sinon Product.image, sinon Product.image_url.
+
+Les fonctions lisent product.images.all() : avec display_images_prefetch()
+dans le queryset, la résolution ne coûte aucune requête par ligne.
+"""
+from django.db.models import Prefetch
+
+
+def display_images_prefetch(prefix=''):
+    """
+    Prefetch des ProductImage triées par id, à passer à prefetch_related().
+    prefix: chemin vers le produit, ex. 'product__' depuis ProductCarousel.
+    """
+    from api.models import ProductImage  # import local pour éviter les cycles
+
+    return Prefetch(f'{prefix}images', queryset=ProductImage.objects.order_by('id'))
+
+
+def get_display_product_image(product):
+    """Retourne la ProductImage à afficher (principale, sinon première), ou None."""
+    images = [img for img in product.images.all() if img.image]
+    if not images:
+        return None
+    images.sort(key=lambda img: img.pk)
+    for img in images:
+        if img.is_primary:
+            return img
+    return images[0]
+
+
+def get_display_image_field(product):
+    """
+    Retourne le fichier image local à afficher (ProductImage.image ou Product.image),
+    ou None si le produit n'a qu'une image externe (image_url) ou aucune image.
+    """
+    product_image = get_display_product_image(product)
+    if product_image:
+        return product_image.image
+    if product.image:
+        return product.image
+    return None
+
+
+def get_display_image_url(product):
+    """Retourne l'URL de l'image à afficher (locale ou image_url externe), ou None."""
+    image_field = get_display_image_field(product)
+    if image_field:
+        return image_field.url
+    # Utilise image_display_url qui gère image ET image_url
+    return product.image_display_url
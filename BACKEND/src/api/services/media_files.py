@@ -0,0 +1,105 @@
+"""
+Fichiers de media/ via l'API de stockage de Django (settings.STORAGES['default']).
+
+Les mêmes fonctions servent un stockage local (FileSystemStorage) ou un stockage
+partagé entre plusieurs nœuds (S3...) : aucune ne suppose que les fichiers sont
+sur le disque de la machine.
+"""
+import os
+import tempfile
+from datetime import datetime
+from pathlib import Path, PurePosixPath
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.utils import timezone
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp', '.svg'}
+
+
+def local_path(name, storage=None):
+    """Chemin local du fichier, ou None si le stockage n'est pas un système de fichiers local."""
+    storage = storage or default_storage
+    # Pas de test sur path() : certains stockages (InMemoryStorage) en donnent un sans fichier derrière
+    if not isinstance(storage, FileSystemStorage):
+        return None
+    return Path(storage.path(name))
+
+
+def write_file_atomic(name, data, storage=None):
+    """
+    Écrit `data` sous `name` (remplace le fichier existant) sans qu'un lecteur voie jamais
+    un fichier partiel :
+    - stockage local : fichier temporaire du même répertoire, puis os.replace ;
+    - stockage objet (S3...) : un envoi est déjà atomique. Si le stockage a choisi un
+      autre nom parce que `name` existe déjà, la copie est supprimée : les noms écrits
+      ici dépendent du contenu, le fichier existant est identique.
+    Retourne le nom écrit.
+    """
+    storage = storage or default_storage
+    path = local_path(name, storage)
+    if path is None:
+        saved = storage.save(name, ContentFile(data))
+        if saved != name:
+            storage.delete(saved)
+        return name
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        # mkstemp crée le fichier en 0600 : mêmes droits qu'un fichier envoyé (lisible par le serveur web)
+        os.chmod(tmp_path, getattr(storage, 'file_permissions_mode', None) or 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return name
+
+
+def _created_time(storage, name, default):
+    try:
+        return storage.get_created_time(name)
+    except (NotImplementedError, OSError):
+        return default  # non fourni par tous les stockages (S3...)
+
+
+def list_images(directory, storage=None):
+    """
+    Images de `directory` (ex. 'products'), pour les listes de fichiers de l'admin :
+    [{name, url, full_url, size_bytes, size_mb, modified_date, created_date}], non triées.
+    """
+    storage = storage or default_storage
+    try:
+        _, files = storage.listdir(directory)
+    except FileNotFoundError:
+        return []  # répertoire pas encore créé (aucun fichier envoyé)
+
+    current_timezone = timezone.get_current_timezone()
+    images = []
+    for filename in files:
+        if PurePosixPath(filename).suffix.lower() not in IMAGE_EXTENSIONS:
+            continue
+        name = f'{directory}/{filename}'
+        size_bytes = storage.size(name)
+        modified = storage.get_modified_time(name)
+        created = _created_time(storage, name, modified)
+        url = storage.url(name)  # encodée par le stockage (espaces, accents)
+        images.append({
+            'name': filename,
+            'url': url,
+            'full_url': url,
+            'size_bytes': size_bytes,
+            'size_mb': round(size_bytes / (1024 * 1024), 2),
+            'modified_date': _localtime(modified, current_timezone),
+            'created_date': _localtime(created, current_timezone),
+        })
+    return images
+
+
+def _localtime(value, current_timezone):
+    if isinstance(value, datetime) and timezone.is_aware(value):
+        return timezone.localtime(value, current_timezone)
+    return value
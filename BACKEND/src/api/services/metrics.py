@@ -0,0 +1,314 @@
+"""
+Métriques au format Prometheus, agrégées entre les workers sans service externe.
+
+Chaque processus tient ses compteurs et histogrammes en mémoire et les écrit
+(au plus une fois par METRICS_FLUSH_INTERVAL secondes, et à la sortie) dans
+un fichier JSON qui lui est propre, dans settings.METRICS_DIR (par défaut
+src/.metrics/, partagé par les workers de la machine). /metrics additionne les
+fichiers de tous les processus : les compteurs des workers redémarrés restent
+comptés, comme avec le mode multiprocess de prometheus_client. Les fichiers des
+processus terminés sont fusionnés à la lecture dans aggregate.json puis supprimés
+(comme mark_process_dead de prometheus_client) : le répertoire ne grossit pas avec
+les redémarrages de workers (gunicorn max_requests). Vider le répertoire au
+redémarrage du service remet les compteurs à zéro.
+
+Métriques :
+- http_requests_total{route, method, status}
+- http_request_duration_seconds{route, method} (histogramme)
+- http_request_db_duration_seconds{route} (histogramme, temps SQL par requête)
+- cache_requests_total{cache, result} (hit / miss : réponses, singletons, instantané)
+- outbound_request_duration_seconds{provider, operation, outcome} (histogramme, PayPal / MTN / Orange)
+
+route : nom de la route Django (api/urls.py), 'unmatched' pour une URL inconnue.
+"""
+import atexit
+import hmac
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+
+# Bornes des histogrammes (secondes)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+OUTBOUND_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+METRICS = {
+    'http_requests_total': ('counter', "Requêtes HTTP par route, méthode et code de réponse", ()),
+    'http_request_duration_seconds': ('histogram', "Durée des requêtes HTTP", LATENCY_BUCKETS),
+    'http_request_db_duration_seconds': ('histogram', "Temps SQL par requête HTTP", LATENCY_BUCKETS),
+    'cache_requests_total': ('counter', "Lectures de cache (hit / miss)", ()),
+    'outbound_request_duration_seconds': (
+        'histogram', "Durée des appels aux fournisseurs de paiement", OUTBOUND_BUCKETS,
+    ),
+}
+
+# Intervalle minimum entre deux écritures du fichier du processus (secondes)
+DEFAULT_FLUSH_INTERVAL = 1.0
+
+# Fichier des métriques cumulées des processus terminés
+AGGREGATE_FILE = 'aggregate.json'
+
+_lock = threading.Lock()
+_samples = {}  # (nom, labels) -> valeur (compteur) ou [compteurs par borne..., somme, nombre]
+_state = {'pid': None, 'path': None, 'flushed_at': 0.0}
+
+
+def metrics_enabled():
+    return getattr(settings, 'METRICS_ENABLED', False)
+
+
+def _metrics_dir():
+    return Path(getattr(settings, 'METRICS_DIR', Path(settings.BASE_DIR) / '.metrics'))
+
+
+def _process_path():
+    """Fichier du processus courant (nouveau fichier après un fork : pid + date de démarrage)."""
+    pid = os.getpid()
+    if _state['pid'] != pid:
+        _samples.clear()
+        _state.update(pid=pid, path=_metrics_dir() / f'{pid}-{time.time_ns()}.json', flushed_at=0.0)
+    return _state['path']
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items()))
+
+
+def inc(name, amount=1, **labels):
+    """Incrémente un compteur."""
+    if not metrics_enabled():
+        return
+    with _lock:
+        _process_path()
+        key = (name, _labels(labels))
+        _samples[key] = _samples.get(key, 0) + amount
+    _maybe_flush()
+
+
+def observe(name, value, **labels):
+    """Ajoute une observation à un histogramme."""
+    if not metrics_enabled():
+        return
+    buckets = METRICS[name][2]
+    with _lock:
+        _process_path()
+        key = (name, _labels(labels))
+        sample = _samples.get(key)
+        if sample is None:
+            sample = _samples[key] = [0] * len(buckets) + [0.0, 0]
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                sample[i] += 1
+        sample[-2] += value
+        sample[-1] += 1
+    _maybe_flush()
+
+
+def record_cache(cache_name, hit):
+    inc('cache_requests_total', cache=cache_name, result='hit' if hit else 'miss')
+
+
+@contextmanager
+def observe_outbound(provider, operation):
+    """
+    Mesure un appel à un fournisseur externe :
+        with observe_outbound('paypal', 'create_order') as call:
+            response = requests.post(...)
+            call['status'] = response.status_code
+    outcome : classe du code HTTP ('2xx', '4xx'...), sinon 'error' (exception) ou 'ok'.
+    """
+    call = {}
+    start = time.perf_counter()
+    outcome = 'error'
+    try:
+        yield call
+        status = call.get('status')
+        outcome = f'{status // 100}xx' if status else 'ok'
+    finally:
+        observe(
+            'outbound_request_duration_seconds', time.perf_counter() - start,
+            provider=provider, operation=operation, outcome=outcome,
+        )
+
+
+# Fichiers partagés
+# Fichiers partagés
+
+def _write_json_atomic(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix='.metrics-')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None  # fichier supprimé ou en cours de remplacement
+
+
+def flush():
+    """Écrit les métriques du processus dans son fichier (écriture atomique)."""
+    with _lock:
+        if not _samples:
+            return
+        path = _process_path()
+        data = [[name, list(labels), value] for (name, labels), value in _samples.items()]
+        _state['flushed_at'] = time.monotonic()
+    _write_json_atomic(path, data)
+
+
+def _maybe_flush():
+    interval = getattr(settings, 'METRICS_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL)
+    if time.monotonic() - _state['flushed_at'] >= interval:
+        flush()
+
+
+def _add_samples(totals, data):
+    for name, labels, value in data:
+        if name not in METRICS:
+            continue
+        key = (name, tuple(tuple(pair) for pair in labels))
+        current = totals.get(key)
+        if current is None:
+            totals[key] = list(value) if isinstance(value, list) else value
+        elif isinstance(value, list):
+            totals[key] = [a + b for a, b in zip(current, value)]
+        else:
+            totals[key] = current + value
+
+
+def _process_alive(path):
+    """Le processus qui écrit `path` ({pid}-{date}.json) tourne-t-il encore ?"""
+    try:
+        pid = int(path.name.split('-', 1)[0])
+    except ValueError:
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # processus d'un autre utilisateur
+    return True
+
+
+def _fold_dead_processes(directory):
+    """
+    Fusionne les fichiers des processus terminés dans AGGREGATE_FILE puis les supprime,
+    sous un verrou fcntl (deux lectures simultanées ne fusionnent pas deux fois). Les fichiers
+    fusionnés sont notés dans l'agrégat : un arrêt avant leur suppression ne les compte pas deux fois.
+    """
+    try:
+        import fcntl
+    except ImportError:  # pas de verrou de fichier : fichiers conservés
+        return
+    if not directory.is_dir():
+        return
+    with open(directory / '.aggregate.lock', 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        aggregate = _read_json(directory / AGGREGATE_FILE) or {'samples': [], 'merged': []}
+        merged = {name for name in aggregate['merged'] if (directory / name).exists()}
+        dead = [
+            path for path in directory.glob('*-*.json')
+            if path.name not in merged and not _process_alive(path)
+        ]
+        if not dead:
+            return
+        totals = {}
+        _add_samples(totals, aggregate['samples'])
+        for path in dead:
+            data = _read_json(path)
+            if data is not None:
+                _add_samples(totals, data)
+                merged.add(path.name)
+        _write_json_atomic(directory / AGGREGATE_FILE, {
+            'samples': [[name, list(labels), value] for (name, labels), value in totals.items()],
+            'merged': sorted(merged),
+        })
+        for path in dead:
+            path.unlink(missing_ok=True)
+
+
+def collect():
+    """Additionne l'agrégat des processus terminés et les fichiers des processus actifs : {(nom, labels): valeur}."""
+    if metrics_enabled():
+        flush()
+    directory = _metrics_dir()
+    _fold_dead_processes(directory)
+    totals = {}
+    aggregate = _read_json(directory / AGGREGATE_FILE) or {'samples': [], 'merged': []}
+    _add_samples(totals, aggregate['samples'])
+    merged = set(aggregate['merged'])
+    for path in directory.glob('*-*.json'):
+        if path.name in merged:
+            continue  # déjà compté dans l'agrégat, pas encore supprimé
+        data = _read_json(path)
+        if data is not None:
+            _add_samples(totals, data)
+    return totals
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+
+def render_metrics():
+    """Texte au format d'exposition Prometheus (version 0.0.4)."""
+    totals = collect()
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for (sample_name, labels), value in sorted(totals.items()):
+            if sample_name != name:
+                continue
+            if kind == 'counter':
+                lines.append(f'{name}{_format_labels(labels)} {value}')
+                continue
+            counts, total, count = value[:-2], value[-2], value[-1]
+            for bound, bucket_count in zip(buckets, counts):
+                lines.append(f'{name}_bucket{_format_labels(labels, [("le", bound)])} {bucket_count}')
+            lines.append(f'{name}_bucket{_format_labels(labels, [("le", "+Inf")])} {count}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {total}')
+            lines.append(f'{name}_count{_format_labels(labels)} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_authorized(request):
+    """Accès à /metrics : libre, ou jeton Bearer si settings.METRICS_TOKEN est défini."""
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if not token:
+        return True
+    # Comparaison en temps constant : la durée ne révèle pas le préfixe correct du jeton
+    return hmac.compare_digest(request.headers.get('Authorization', '').encode(), f'Bearer {token}'.encode())
+
+
+def reset_metrics():
+    """Vide les métriques du processus et oublie son fichier (tests, changement de METRICS_DIR)."""
+    with _lock:
+        _samples.clear()
+        _state.update(pid=None, path=None, flushed_at=0.0)
+
+
+atexit.register(lambda: metrics_enabled() and flush())
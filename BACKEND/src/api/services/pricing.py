@@ -0,0 +1,191 @@
+"""
+Résolution des prix en lot (flash principal > promotion > prix de base).
+
+Au lieu d'exécuter une requête FlashProductItem et une requête ProductPromotion
+par produit, le PricingResolver charge toutes les sources de prix d'une liste
+de produits en un nombre fixe de requêtes (une par source).
+
+Usage dans une vue :
+    pricing = PricingResolver(products)
+    serializer = BoutiqueProductSerializer(products, many=True, context={'pricing': pricing})
+
+Le résultat est aussi matérialisé sur Product (effective_price, effective_compare_at_price,
+price_source, price_valid_until) pour permettre le tri et le filtrage par prix en SQL :
+voir refresh_effective_prices() et refresh_expired_prices().
+"""
+from collections import namedtuple
+from datetime import timedelta
+
+from django.utils import timezone
+
+
+PriceInfo = namedtuple('PriceInfo', ['final_price', 'original_price', 'source', 'valid_until'])
+
+PRICE_SOURCE_BASE = 'base'
+PRICE_SOURCE_PROMOTION = 'promotion'
+PRICE_SOURCE_FLASH = 'flash'
+
+EFFECTIVE_PRICE_FIELDS = [
+    'effective_price',
+    'effective_compare_at_price',
+    'price_source',
+    'price_valid_until',
+]
+
+
+def _is_in_window(start, end, now):
+    """Vrai si `now` est dans l'intervalle [start, end] (bornes optionnelles)."""
+    return (not start or start <= now) and (not end or end >= now)
+
+
+class PricingResolver:
+    """
+    Calcule (prix_final, prix_de_comparaison) pour un ensemble de produits.
+
+    - 1 requête pour les FlashProductItem principaux des flashs actifs
+    - 1 requête pour les ProductPromotion actives
+    Les produits absents du lot sont résolus à la demande (même coût qu'avant).
+    """
+
+    def __init__(self, products=(), now=None):
+        self.now = now or timezone.now()
+        self._flash_items = {}
+        self._promotions = {}
+        self._loaded_ids = set()
+        self.load(products)
+
+    def load(self, products):
+        """Charge les sources de prix des produits qui ne sont pas encore connus."""
+        from api.models import FlashProductItem, ProductPromotion  # import local pour éviter les cycles
+
+        ids = {p.pk for p in products if p.pk is not None} - self._loaded_ids
+        if not ids:
+            return self
+
+        # 1) Flash principal : seul le premier item (ordre id) compte, comme avant
+        flash_items = FlashProductItem.objects.filter(
+            product_id__in=ids,
+            is_main=True,
+            flash__is_active=True,
+        ).order_by('id')
+        for item in flash_items:
+            self._flash_items.setdefault(item.product_id, item)
+
+        # 2) Promotions (OneToOne : au plus une par produit)
+        promotions = ProductPromotion.objects.filter(
+            product_id__in=ids,
+            is_active=True,
+            promo_price__isnull=False,
+        )
+        for promo in promotions:
+            self._promotions[promo.product_id] = promo
+
+        self._loaded_ids |= ids
+        return self
+
+    def resolve(self, product):
+        """
+        Retourne un PriceInfo : prix final, prix de comparaison, source du prix
+        et date du prochain changement (début/fin d'un flash ou d'une promotion).
+        """
+        if product.pk not in self._loaded_ids:
+            self.load([product])
+
+        base_price = product.price or 0
+        flash_item = self._flash_items.get(product.pk)
+        promo = self._promotions.get(product.pk)
+
+        # Prochaine borne : le prix devra être recalculé à cette date
+        boundaries = []
+        for source in (flash_item, promo):
+            if source is None:
+                continue
+            if source.start_date and source.start_date > self.now:
+                boundaries.append(source.start_date)
+            if source.end_date and source.end_date >= self.now:
+                boundaries.append(source.end_date + timedelta(microseconds=1))
+        valid_until = min(boundaries) if boundaries else None
+
+        # 1) Flash principal (prioritaire)
+        if flash_item and _is_in_window(flash_item.start_date, flash_item.end_date, self.now):
+            # Dans MainFlashProductSerializer, compare_at_price est utilisé comme prix promo
+            if flash_item.compare_at_price:
+                return PriceInfo(flash_item.compare_at_price, base_price, PRICE_SOURCE_FLASH, valid_until)
+
+        # 2) Promotion standard
+        if promo and promo.promo_price and _is_in_window(promo.start_date, promo.end_date, self.now):
+            return PriceInfo(promo.promo_price, base_price, PRICE_SOURCE_PROMOTION, valid_until)
+
+        return PriceInfo(base_price, product.compare_at_price or base_price, PRICE_SOURCE_BASE, valid_until)
+
+    def get(self, product):
+        """Retourne (final_price, original_price) pour un produit."""
+        info = self.resolve(product)
+        return info.final_price, info.original_price
+
+    def final_price(self, product):
+        return self.get(product)[0]
+
+    def original_price(self, product):
+        return self.get(product)[1]
+
+
+def compute_product_pricing(product):
+    """
+    Calcule le prix final et le prix de comparaison d'un seul produit.
+    Pour une liste, utiliser directement PricingResolver.
+    """
+    return PricingResolver([product]).get(product)
+
+
+# Prix effectifs matérialisés sur Product
+# Prix effectifs matérialisés sur Product
+
+def refresh_effective_prices(products, now=None, batch_size=500):
+    """
+    Recalcule les colonnes effective_* des produits donnés (queryset ou liste).
+    N'écrit que les lignes modifiées, par lots (bulk_update : pas de signaux, pas d'auto_now).
+    Retourne le nombre de produits mis à jour.
+    """
+    from api.models import Product
+    from .versions import bump_on_commit
+
+    now = now or timezone.now()
+    products = list(products)
+    updated = 0
+
+    for i in range(0, len(products), batch_size):
+        batch = products[i:i + batch_size]
+        pricing = PricingResolver(batch, now=now)
+        changed = []
+        for product in batch:
+            info = pricing.resolve(product)
+            values = (info.final_price, info.original_price, info.source, info.valid_until)
+            current = tuple(getattr(product, field) for field in EFFECTIVE_PRICE_FIELDS)
+            if values != current:
+                for field, value in zip(EFFECTIVE_PRICE_FIELDS, values):
+                    setattr(product, field, value)
+                changed.append(product)
+        if changed:
+            Product.objects.bulk_update(changed, EFFECTIVE_PRICE_FIELDS)
+            updated += len(changed)
+
+    if updated:
+        # bulk_update n'envoie pas de signaux : les index de listing (filtres de prix) sont invalidés ici
+        bump_on_commit('product')
+    return updated
+
+
+def refresh_expired_prices(now=None):
+    """
+    Recalcule les prix dont une borne (début/fin flash ou promotion) est passée.
+    Une seule requête indexée quand il n'y a rien à faire : appelé avant chaque
+    listing trié/filtré par prix.
+    """
+    from api.models import Product
+
+    now = now or timezone.now()
+    expired = Product.objects.filter(price_valid_until__lte=now).only(
+        'id', 'price', 'compare_at_price', *EFFECTIVE_PRICE_FIELDS
+    )
+    return refresh_effective_prices(expired, now=now)
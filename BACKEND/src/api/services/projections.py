@@ -0,0 +1,89 @@
+"""
+Lecture allégée des produits pour les listings (boutique, recherche, nouveaux produits,
+Ma Selection).
+
+Les querysets chargent uniquement les colonnes affichées (.only()), et les réponses
+sont construites par des fonctions simples au lieu des ModelSerializer : pas de
+résolution de champ ni de SerializerMethodField par ligne. Le JSON produit est
+identique à celui des serializers correspondants (BoutiqueProductSerializer,
+ProductSearchSerializer, NewProductItemSerializer, MaSelectionProductSerializer),
+qui restent la référence du format.
+
+Usage dans une vue :
+    products = fetch_page(queryset.only(*PRODUCT_LIST_FIELDS), ids)
+    results = product_list_data(products, PricingResolver(products))
+"""
+from rest_framework import serializers
+
+# Colonnes lues par chaque représentation (created_at : pagination par curseur et tri)
+PRODUCT_LIST_FIELDS = (
+    'id', 'name', 'slug', 'price', 'compare_at_price', 'image', 'image_url',
+    'description', 'shot_description', 'created_at', 'category__name', 'category__slug',
+)
+NEW_PRODUCT_FIELDS = (
+    'id', 'name', 'slug', 'price', 'compare_at_price', 'image', 'image_url',
+    'created_at', 'category__name',
+)
+MA_SELECTION_PRODUCT_FIELDS = ('id', 'name', 'slug', 'image', 'image_url', 'shot_description', 'price')
+
+# Même rendu des dates que les ModelSerializer (fuseau courant, « Z » pour UTC)
+_datetime_field = serializers.DateTimeField()
+
+
+def product_list_data(products, pricing):
+    """
+    Représentation de BoutiqueProductSerializer / ProductSearchSerializer.
+    pricing : PricingResolver chargé pour `products`.
+    """
+    data = []
+    for product in products:
+        price, compare_at_price = pricing.get(product)
+        category = product.category
+        data.append({
+            'id': product.id,
+            'name': product.name,
+            'slug': product.slug,
+            'price': price,
+            'compare_at_price': compare_at_price,
+            'image': product.image_display_url,
+            'image_url': product.image_url,
+            'category': category.name if category else None,
+            'category_slug': category.slug if category else None,
+            'description': product.description,
+            'shot_description': product.shot_description,
+        })
+    return data
+
+
+def new_product_data(products):
+    """Représentation de NewProductItemSerializer (prix de base, sans résolution)."""
+    to_datetime = _datetime_field.to_representation
+    return [
+        {
+            'id': product.id,
+            'name': product.name,
+            'slug': product.slug,
+            'price': product.price,
+            'compare_at_price': product.compare_at_price,
+            'image': product.image_display_url,
+            'image_url': product.image_url,
+            'created_at': to_datetime(product.created_at),
+            'category': product.category.name,
+        }
+        for product in products
+    ]
+
+
+def ma_selection_product_data(products):
+    """Représentation de MaSelectionProductSerializer."""
+    return [
+        {
+            'id': product.id,
+            'name': product.name,
+            'slug': product.slug,
+            'image': product.image_display_url,
+            'shot_description': product.shot_description,
+            'price': product.price,
+        }
+        for product in products
+    ]
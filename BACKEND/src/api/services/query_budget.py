@@ -0,0 +1,118 @@
+"""
+Budgets de requêtes SQL par route et détection des requêtes répétées (N+1).
+
+QueryRecorder enregistre les requêtes exécutées pendant un bloc (toutes les
+connexions), avec leur durée et leur empreinte : le SQL dont les valeurs sont
+remplacées par « ? » et les listes IN (...) réduites. Une même empreinte
+exécutée QUERY_REPEAT_THRESHOLD fois ou plus dans une requête HTTP signale en
+général une requête par ligne (image, flash, note... lus dans une boucle).
+
+Les budgets sont indexés par nom de route (api/urls.py : '<basename>-list',
+'<basename>-detail', '<basename>-<action>'). Ils servent à l'avertissement du
+middleware (api.middleware.QueryBudgetMiddleware) et aux tests (api.testing).
+settings.QUERY_BUDGETS complète ou remplace ces valeurs.
+"""
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+# Budget des routes sans valeur explicite
+DEFAULT_QUERY_BUDGET = 10
+
+# Nombre maximal de requêtes SQL par route, caches vides (SAVEPOINT compris). Ces endpoints ont
+# un nombre de requêtes constant : le budget ne dépend pas du nombre de lignes affichées
+QUERY_BUDGETS = {
+    'api-root': 0,
+    'site-settings-list': 1,
+    'parametre-page-list': 1,
+    'product-carousel-list': 2,
+    'product-carousel-detail': 2,
+    'featured-promotion-list': 2,
+    'featured-promotion-detail': 2,
+    'promotion-list': 2,
+    'promotion-detail': 2,
+    'category-list': 1,
+    'category-detail': 1,
+    'new-products-list': 3,
+    'flash-main-product-list': 3,
+    'flash-secondary-products-list': 3,
+    'flash-secondary-products-detail': 3,
+    'product-search-list': 6,
+    'product-search-suggest': 2,
+    'boutique-list': 5,
+    'promotions-page-list': 4,
+    'category-products-list': 6,
+    'product-detail-detail': 4,
+    'commentaire-list': 2,
+    'commentaire-detail': 1,
+    'product-commentaires-detail': 2,
+    'ma-selection-list': 2,
+    'homepage-list': 12,
+    'homepage-snapshot': 12,
+}
+
+# Nombre d'exécutions d'une même empreinte à partir duquel elle est signalée
+QUERY_REPEAT_THRESHOLD = 3
+
+_IN_LIST = re.compile(r'\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\)')
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_SPACES = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """SQL normalisé : valeurs remplacées, listes IN (...) réduites, espaces compactés."""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = _IN_LIST.sub('(...)', sql)
+    return _SPACES.sub(' ', sql).strip()
+
+
+def get_query_budget(route_name):
+    """Budget de la route (settings.QUERY_BUDGETS, puis QUERY_BUDGETS, puis le défaut)."""
+    budgets = {**QUERY_BUDGETS, **getattr(settings, 'QUERY_BUDGETS', {})}
+    return budgets.get(route_name, getattr(settings, 'QUERY_BUDGET_DEFAULT', DEFAULT_QUERY_BUDGET))
+
+
+class QueryRecorder:
+    """
+    Enregistre les requêtes SQL exécutées dans le bloc `with recorder.record():`.
+    queries : liste de (empreinte, durée en secondes).
+    """
+
+    def __init__(self):
+        self.queries = []
+
+    def _wrapper(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((fingerprint(sql), time.perf_counter() - start))
+
+    @contextmanager
+    def record(self):
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self._wrapper))
+            yield self
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def duration(self):
+        """Durée totale des requêtes, en secondes."""
+        return sum(duration for _, duration in self.queries)
+
+    def repeated(self, threshold=None):
+        """Empreintes exécutées au moins `threshold` fois : [(empreinte, nombre)], plus fréquentes d'abord."""
+        threshold = threshold or getattr(settings, 'QUERY_REPEAT_THRESHOLD', QUERY_REPEAT_THRESHOLD)
+        counts = Counter(sql for sql, _ in self.queries)
+        return [(sql, count) for sql, count in counts.most_common() if count >= threshold]
@@ -0,0 +1,93 @@
+"""
+Résumé des notes par produit (ProductRatingSummary).
+
+Un commentaire compte dans le résumé s'il est approuvé. Les commentaires approuvés
+et non signalés (mêmes règles que l'affichage public) alimentent approved_count,
+rating_sum et la répartition par note ; les commentaires approuvés mais signalés
+sont comptés à part (flagged_count, flagged_rating_sum), pour Product.average_rating
+et Product.comment_count qui comptent tous les commentaires approuvés.
+Les signaux appliquent des deltas (+1 / -1 sur le compteur de la note) ; les mises
+à jour en masse (actions admin, commande) reconstruisent les produits concernés en une passe.
+"""
+from django.db.models import Count, F
+
+
+def rating_state(commentaire):
+    """Retourne (product_id, note, signalé) si le commentaire compte dans le résumé, sinon None."""
+    if commentaire.is_approved and commentaire.product_id:
+        return (commentaire.product_id, commentaire.note, bool(commentaire.is_flagged))
+    return None
+
+
+def apply_rating_delta(product_id, note, is_flagged, delta):
+    """
+    Ajoute `delta` (+1 / -1) commentaire de note `note` au résumé du produit.
+    Si le résumé n'existe pas encore, il est reconstruit depuis la base.
+    """
+    from api.models import ProductRatingSummary  # import local pour éviter les cycles
+
+    if note not in range(1, 6):
+        return
+    if is_flagged:
+        changes = {
+            'flagged_count': F('flagged_count') + delta,
+            'flagged_rating_sum': F('flagged_rating_sum') + delta * note,
+        }
+    else:
+        count_field = f'count_{note}'
+        changes = {
+            'approved_count': F('approved_count') + delta,
+            'rating_sum': F('rating_sum') + delta * note,
+            count_field: F(count_field) + delta,
+        }
+    updated = ProductRatingSummary.objects.filter(product_id=product_id).update(**changes)
+    if not updated and delta > 0:
+        rebuild_rating_summaries([product_id])
+
+
+def rebuild_rating_summaries(product_ids=None):
+    """
+    Reconstruit les résumés (tous les produits si product_ids est None)
+    avec une seule agrégation groupée par (produit, note), puis un upsert en lot.
+    Retourne le nombre de résumés écrits.
+    """
+    from api.models import Commentaire, Product, ProductRatingSummary  # import local pour éviter les cycles
+
+    if product_ids is None:
+        product_ids = list(Product.objects.values_list('id', flat=True))
+    product_ids = {pk for pk in product_ids if pk}
+    if not product_ids:
+        return 0
+
+    summaries = {pk: ProductRatingSummary(product_id=pk) for pk in product_ids}
+    rows = (
+        Commentaire.objects
+        .filter(product_id__in=product_ids, is_approved=True)
+        .order_by()
+        .values('product_id', 'note', 'is_flagged')
+        .annotate(total=Count('id'))
+    )
+    for row in rows:
+        summary = summaries[row['product_id']]
+        note, total = row['note'], row['total']
+        if note not in range(1, 6):
+            continue
+        if row['is_flagged']:
+            summary.flagged_count += total
+            summary.flagged_rating_sum += total * note
+        else:
+            setattr(summary, f'count_{note}', total)
+            summary.approved_count += total
+            summary.rating_sum += total * note
+
+    ProductRatingSummary.objects.bulk_create(
+        summaries.values(),
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=['product'],
+        update_fields=[
+            'approved_count', 'rating_sum', 'flagged_count', 'flagged_rating_sum',
+            'count_1', 'count_2', 'count_3', 'count_4', 'count_5',
+        ],
+    )
+    return len(summaries)
@@ -0,0 +1,66 @@
+"""
+Cache des réponses des endpoints publics de la page d'accueil.
+
+Les données sérialisées sont gardées dans le cache Django, sous une clé qui
+contient les versions (api.services.versions) des modèles dont elles dépendent.
+Les signaux bumpent ces versions à chaque modification (admin compris) : la clé
+change et la réponse suivante est recalculée. Une réponse servie depuis le cache
+ne touche pas l'ORM (lecture des versions : un os.stat() par modèle).
+
+Usage sur une vue :
+    @cached_response('site_settings')
+    def list(self, request): ...
+"""
+import hashlib
+from functools import wraps
+
+from django.core.cache import cache
+from rest_framework.response import Response
+
+from .metrics import record_cache
+from .versions import get_versions
+
+# Durée de vie par défaut (les versions invalident avant)
+DEFAULT_TIMEOUT = 60 * 15
+
+# Codes de réponse mis en cache (404 = « pas encore configuré » pour plusieurs endpoints)
+CACHEABLE_STATUS = (200, 404)
+
+
+def response_cache_key(view, request, version_names, kwargs):
+    """Clé : vue + action + paramètres d'URL et de requête + versions des modèles."""
+    params = sorted((key, request.query_params.getlist(key)) for key in request.query_params)
+    raw = repr((type(view).__name__, getattr(view, 'action', None), sorted(kwargs.items()), params))
+    digest = hashlib.md5(raw.encode()).hexdigest()
+    versions = '-'.join(str(v) for v in get_versions(*version_names))
+    return f"resp:{digest}:{versions}"
+
+
+def cached_response(*version_names, timeout=DEFAULT_TIMEOUT, refresh=None):
+    """
+    Décorateur de méthode de vue (list / retrieve) : met en cache response.data.
+
+    version_names : versions qui invalident la réponse ('product', 'flash', ...)
+    timeout : durée de vie maximale (courte pour les endpoints filtrés par date)
+    refresh : fonction optionnelle (data) -> data appliquée à chaque service depuis le cache
+              (ex. recalcul du temps restant d'un flash)
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            if request.method != 'GET':
+                return method(self, request, *args, **kwargs)
+
+            key = response_cache_key(self, request, version_names, kwargs)
+            cached = cache.get(key)
+            record_cache('response', cached is not None)
+            if cached is not None:
+                status_code, data = cached
+                return Response(refresh(data) if refresh else data, status=status_code)
+
+            response = method(self, request, *args, **kwargs)
+            if response.status_code in CACHEABLE_STATUS:
+                cache.set(key, (response.status_code, response.data), timeout)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,160 @@
+"""
+Recherche plein texte des produits (SQLite FTS5).
+
+Table virtuelle api_product_fts à contenu externe (content='api_product') :
+le texte n'est pas dupliqué, seul l'index l'est. Elle est tenue à jour par des
+triggers SQLite sur api_product (INSERT / DELETE / UPDATE des champs indexés),
+ce qui couvre aussi les update() et bulk_create() qui n'envoient pas de signaux.
+
+Le tokenizer « unicode61 remove_diacritics 2 » ignore la casse et les accents :
+« ecran » trouve « Écran ». Chaque mot de la recherche est un préfixe
+(« tele » trouve « télévision ») et tous les mots doivent être présents.
+Les résultats sont triés par pertinence (bm25, le nom pèse plus que les descriptions).
+
+Hors SQLite, ou si FTS5 n'est pas disponible, la recherche retombe sur les
+filtres icontains d'origine.
+"""
+import logging
+import re
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'api_product_fts'
+INDEXED_COLUMNS = ('name', 'description', 'shot_description')
+
+# Poids bm25 par colonne (même ordre que INDEXED_COLUMNS)
+BM25_WEIGHTS = (10.0, 1.0, 3.0)
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def search_index_statements(table='api_product', fts_table=FTS_TABLE):
+    """
+    Ordres SQL de création de la table FTS5 et des triggers de synchronisation.
+    Paramétrés par nom de table pour être réutilisés par le benchmark (bench_search).
+    """
+    columns = ', '.join(INDEXED_COLUMNS)
+    new_values = ', '.join(f'new.{c}' for c in INDEXED_COLUMNS)
+    old_values = ', '.join(f'old.{c}' for c in INDEXED_COLUMNS)
+    return [
+        f"""CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5(
+            {columns},
+            content='{table}', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )""",
+        f"""CREATE TRIGGER IF NOT EXISTS {fts_table}_ai AFTER INSERT ON {table} BEGIN
+            INSERT INTO {fts_table}(rowid, {columns}) VALUES (new.id, {new_values});
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {fts_table}_ad AFTER DELETE ON {table} BEGIN
+            INSERT INTO {fts_table}({fts_table}, rowid, {columns}) VALUES ('delete', old.id, {old_values});
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {fts_table}_au AFTER UPDATE OF {columns} ON {table} BEGIN
+            INSERT INTO {fts_table}({fts_table}, rowid, {columns}) VALUES ('delete', old.id, {old_values});
+            INSERT INTO {fts_table}(rowid, {columns}) VALUES (new.id, {new_values});
+        END""",
+    ]
+
+
+def drop_index_statements(fts_table=FTS_TABLE):
+    return [
+        f"DROP TRIGGER IF EXISTS {fts_table}_ai",
+        f"DROP TRIGGER IF EXISTS {fts_table}_ad",
+        f"DROP TRIGGER IF EXISTS {fts_table}_au",
+        f"DROP TABLE IF EXISTS {fts_table}",
+    ]
+
+
+def fts_enabled(using=None):
+    """Vrai si la recherche FTS5 doit être utilisée (SQLite et réglage PRODUCT_SEARCH_FTS)."""
+    conn = connection if using is None else using
+    return conn.vendor == 'sqlite' and getattr(settings, 'PRODUCT_SEARCH_FTS', True)
+
+
+def ensure_search_index(using=None, rebuild=False):
+    """
+    Crée la table FTS5 et ses triggers s'ils n'existent pas (idempotent).
+    rebuild=True réindexe tous les produits existants.
+    Retourne False si FTS5 n'est pas disponible sur cette base.
+    """
+    conn = connection if using is None else using
+    if not fts_enabled(conn):
+        return False
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE]
+            )
+            created = cursor.fetchone() is None
+            for statement in search_index_statements():
+                cursor.execute(statement)
+            if created or rebuild:
+                cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    except DatabaseError as e:
+        logger.warning("Index de recherche FTS5 indisponible: %s", e)
+        return False
+    return True
+
+
+def rebuild_search_index(using=None):
+    """Reconstruit l'index FTS5 depuis api_product. Retourne le nombre de produits indexés."""
+    conn = connection if using is None else using
+    if not ensure_search_index(conn, rebuild=True):
+        return 0
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT COUNT(*) FROM api_product")
+        return cursor.fetchone()[0]
+
+
+def build_match_query(query):
+    """
+    Transforme la saisie utilisateur en requête MATCH FTS5 :
+    chaque mot devient un préfixe entre guillemets (aucune syntaxe FTS5 interprétée).
+    Retourne '' si la saisie ne contient aucun mot.
+    """
+    tokens = _TOKEN_RE.findall(query)
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def icontains_filter(query):
+    """Filtre d'origine (scan complet) : utilisé hors SQLite ou sans FTS5."""
+    return Q(name__icontains=query) | Q(description__icontains=query) | Q(shot_description__icontains=query)
+
+
+def search_products(queryset, query):
+    """
+    Restreint `queryset` (Product) aux produits correspondant à `query`.
+    Retourne (queryset, ranked) : ranked=True si le queryset est déjà trié par pertinence.
+    """
+    match = build_match_query(query)
+    if not match:
+        return queryset.none(), False
+    if not fts_enabled():
+        return queryset.filter(icontains_filter(query)), False
+
+    # Jointure sur la table FTS5 (modèle non géré ProductSearchIndex) : bm25 y fait référence par son nom
+    weights = ', '.join(str(w) for w in BM25_WEIGHTS)
+    return queryset.filter(search_index__match=match).annotate(
+        search_rank=RawSQL(f'bm25({FTS_TABLE}, {weights})', ()),
+    ).order_by('search_rank', '-created_at'), True
+
+
+def fetch_search_ids(queryset, limit, fallback_queryset=None, query=''):
+    """
+    Évalue les ids (dans l'ordre du queryset) jusqu'à `limit`.
+    Si l'index FTS5 est absent (base non migrée), retombe sur `fallback_queryset`
+    filtré par icontains plutôt que de renvoyer une erreur.
+    """
+    try:
+        with transaction.atomic():
+            return list(queryset.values_list('id', flat=True)[:limit])
+    except DatabaseError as e:
+        if fallback_queryset is None:
+            raise
+        logger.warning("Recherche FTS5 indisponible, repli sur icontains: %s", e)
+        fallback = fallback_queryset.filter(icontains_filter(query))
+        return list(fallback.values_list('id', flat=True)[:limit])
@@ -0,0 +1,61 @@
+"""
+Index de mélange des listings (boutique, catégories, promotions).
+
+L'ordre des produits change toutes les 2 heures (protection anti-scraping) :
+la permutation des ids est calculée une seule fois par période de 2 heures et
+par périmètre (scope), puis mise en cache. Chaque requête ne charge ensuite
+que les lignes de sa page, par id.
+
+La permutation est identique à l'ancien random.seed(période) + random.shuffle(liste),
+mais utilise une instance random.Random locale (pas d'état global partagé entre threads).
+"""
+import random
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from .versions import get_versions
+
+# Durée d'une période de mélange (2 heures)
+SHUFFLE_PERIOD_SECONDS = 7200
+
+
+def current_shuffle_period(now=None):
+    """Numéro de la période de 2 heures depuis l'epoch (sert de seed)."""
+    now = now or timezone.now()
+    return int(now.timestamp() // SHUFFLE_PERIOD_SECONDS)
+
+
+def get_shuffled_ids(scope, queryset, version_names=(), now=None, valid_until=None):
+    """
+    Retourne la liste mélangée des ids du queryset pour la période courante.
+
+    scope: identifiant du périmètre (ex. 'boutique', 'category:3'), inclut les filtres
+    version_names: versions (api.services.versions) qui invalident l'index
+    valid_until: fonction optionnelle (now) -> datetime ou None ; au-delà, l'index
+                 est recalculé même dans la période (ex. début/fin de promotion)
+    """
+    now = now or timezone.now()
+    period = current_shuffle_period(now)
+    versions = '-'.join(str(v) for v in get_versions(*version_names))
+    key = f"shuffle:{scope}:{period}:{versions}"
+
+    cached = cache.get(key)
+    if cached is not None:
+        ids, expires_at = cached
+        if expires_at is None or now < expires_at:
+            return ids
+
+    # Même ordre de départ que le queryset (ordre par défaut), puis mélange déterministe
+    ids = list(queryset.values_list('pk', flat=True))
+    random.Random(period).shuffle(ids)
+
+    expires_at = valid_until(now) if valid_until else None
+    cache.set(key, (ids, expires_at), timeout=SHUFFLE_PERIOD_SECONDS)
+    return ids
+
+
+def fetch_page(queryset, ids):
+    """Charge les objets d'une page par id, dans l'ordre de `ids`."""
+    objects = {obj.pk: obj for obj in queryset.filter(pk__in=ids)}
+    return [objects[pk] for pk in ids if pk in objects]
@@ -0,0 +1,55 @@
+"""
+Cache de processus des modèles singletons (SiteSettings, ParametrePage, MaSelection).
+
+load() lisait la ligne en base à chaque appel (vues, context processor de l'admin).
+L'instance est maintenant gardée en mémoire dans chaque worker, avec la version
+(api.services.versions) lue au chargement. Un enregistrement dans l'admin bumpe la
+version (signaux) : tous les workers rechargent l'instance à l'appel suivant.
+
+Chaque appel retourne une copie : une modification locale de l'instance ne
+touche pas la copie partagée.
+"""
+import copy
+import threading
+
+from .metrics import record_cache
+from .versions import get_version
+
+_lock = threading.Lock()
+_instances = {}  # label du modèle -> (version, instance ou None)
+_stats = {'hits': 0, 'misses': 0}
+
+
+def load_singleton(model, version_name):
+    """Retourne l'instance unique de `model` (ou None), depuis le cache si la version n'a pas changé."""
+    label = model._meta.label
+    version = get_version(version_name)
+    cached = _instances.get(label)
+    if cached is not None and cached[0] == version:
+        with _lock:
+            _stats['hits'] += 1
+        record_cache('singleton', True)
+        return copy.copy(cached[1])
+
+    instance = model.objects.first()
+    with _lock:
+        _stats['misses'] += 1
+        # Version bumpée pendant le chargement (écriture validée entre-temps) : l'instance lue
+        # peut être l'ancienne, elle est servie mais pas gardée (sans expiration, elle le resterait)
+        if get_version(version_name) == version:
+            _instances[label] = (version, instance)
+    record_cache('singleton', False)
+    return copy.copy(instance)
+
+
+def singleton_cache_stats():
+    """Compteurs du processus : {'hits': ..., 'misses': ..., 'cached': [labels]}."""
+    with _lock:
+        return {**_stats, 'cached': sorted(_instances)}
+
+
+def clear_singleton_cache():
+    """Vide le cache du processus et remet les compteurs à zéro (tests)."""
+    with _lock:
+        _instances.clear()
+        _stats.update(hits=0, misses=0)
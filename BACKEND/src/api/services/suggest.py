@@ -0,0 +1,259 @@
+"""
+Index en mémoire pour l'autocomplétion (/api/search/suggest/).
+
+Les mots des noms de produits actifs et des noms de catégories sont normalisés
+(minuscules, sans accents). Le vocabulaire (mots distincts) est une liste triée :
+un préfixe correspond à une plage contiguë trouvée par bisection, et chaque mot
+pointe vers l'ensemble des entrées qui le contiennent. Aucune requête SQL.
+
+- construit au démarrage de chaque worker, dans un thread (warm_up_in_background(),
+  appelé par commerce/wsgi.py et commerce/asgi.py : jamais par les commandes de gestion),
+  puis gardé en mémoire ; un appel arrivé avant la fin attend la construction en cours
+- mis à jour incrémentalement par les signaux Product / Category du worker
+- reconstruit quand un autre worker modifie les noms indexés (versions 'product_names'
+  et 'category' de api.services.versions, bumpées par ces mêmes signaux). 'product_names'
+  ne bouge que si le nom, le slug, l'activation ou la catégorie d'un produit changent :
+  un changement de prix (bump de 'product') ne reconstruit pas l'index
+"""
+import heapq
+import logging
+import os
+import sys
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.db import connection
+
+from .versions import get_versions
+
+logger = logging.getLogger(__name__)
+
+SUGGEST_KINDS = ('category', 'product')  # ordre d'affichage à pertinence égale
+VERSION_NAMES = ('product_names', 'category')
+
+
+def normalize(text):
+    """Minuscules, sans accents : « Écran » -> « ecran »."""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def tokenize(text):
+    """Mots normalisés (séparateurs : tout caractère non alphanumérique)."""
+    return ''.join(c if c.isalnum() else ' ' for c in normalize(text)).split()
+
+
+class SuggestIndex:
+    """
+    Index préfixe des noms.
+    _vocabulary : mots distincts triés ; _postings : mot -> {clé} ;
+    _entries : clé (kind, id) -> (name, slug, nom normalisé, mots).
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._vocabulary = []
+        self._postings = {}
+        self._entries = {}
+        self.version = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    # Construction / mises à jour
+    # Construction / mises à jour
+
+    def build(self, products=(), categories=()):
+        """Remplace le contenu : products / categories sont des tuples (id, name, slug)."""
+        entries = {}
+        postings = {}
+        for kind, rows in (('product', products), ('category', categories)):
+            for pk, name, slug in rows:
+                key = (kind, pk)
+                entry = entries[key] = self._make_entry(name, slug)
+                for word in entry[3]:
+                    postings.setdefault(word, set()).add(key)
+        with self._lock:
+            self._entries = entries
+            self._postings = postings
+            self._vocabulary = sorted(postings)
+
+    def load(self):
+        """Construit l'index depuis la base (produits actifs et catégories)."""
+        from api.models import Category, Product
+
+        version = get_versions(*VERSION_NAMES)
+        self.build(
+            products=Product.objects.filter(is_active=True).values_list('id', 'name', 'slug').iterator(),
+            categories=Category.objects.values_list('id', 'name', 'slug').iterator(),
+        )
+        self.version = version
+        return self
+
+    def ensure_loaded(self):
+        """(Re)construit l'index s'il est vide ou si le catalogue a changé dans un autre worker."""
+        if self.version != get_versions(*VERSION_NAMES):
+            with self._lock:
+                if self.version != get_versions(*VERSION_NAMES):
+                    self.load()
+        return self
+
+    def mark_current(self):
+        """Après une mise à jour incrémentale locale : la version courante est déjà prise en compte."""
+        if self.version is not None:
+            self.version = get_versions(*VERSION_NAMES)
+
+    def upsert(self, kind, pk, name, slug):
+        with self._lock:
+            self._remove((kind, pk))
+            key = (kind, pk)
+            entry = self._entries[key] = self._make_entry(name, slug)
+            for word in entry[3]:
+                keys = self._postings.get(word)
+                if keys is None:
+                    keys = self._postings[word] = set()
+                    insort(self._vocabulary, word)
+                keys.add(key)
+
+    def remove(self, kind, pk):
+        with self._lock:
+            self._remove((kind, pk))
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for word in entry[3]:
+            keys = self._postings.get(word)
+            if keys is None:
+                continue
+            keys.discard(key)
+            if not keys:
+                del self._postings[word]
+                i = bisect_left(self._vocabulary, word)
+                if i < len(self._vocabulary) and self._vocabulary[i] == word:
+                    del self._vocabulary[i]
+
+    @staticmethod
+    def _make_entry(name, slug):
+        words = tuple(sys.intern(word) for word in dict.fromkeys(tokenize(name)))
+        return (name, slug, normalize(name), words)
+
+    # Recherche
+    # Recherche
+
+    def _words_with_prefix(self, prefix):
+        vocabulary = self._vocabulary
+        i = bisect_left(vocabulary, prefix)
+        while i < len(vocabulary) and vocabulary[i].startswith(prefix):
+            yield vocabulary[i]
+            i += 1
+
+    def search(self, query, limit=8):
+        """
+        Suggestions dont les mots commencent par chacun des mots de `query`
+        (le dernier mot peut être incomplet). Les noms qui commencent par la
+        saisie passent en premier, puis les catégories, puis les noms courts.
+        """
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens or limit < 1:
+            return []
+        normalized_query = ' '.join(tokenize(query))
+
+        with self._lock:
+            # Partir du mot le plus sélectif (le moins d'entrées), filtrer par les autres
+            postings_by_token = []
+            for token in tokens:
+                postings = [self._postings[word] for word in self._words_with_prefix(token)]
+                if not postings:
+                    return []
+                postings_by_token.append((sum(len(keys) for keys in postings), token, postings))
+            postings_by_token.sort(key=lambda item: item[0])
+            _, _, postings = postings_by_token[0]
+            others = [token for _, token, _ in postings_by_token[1:]]
+            # Une entrée dont plusieurs mots commencent par le préfixe n'est examinée qu'une fois
+            candidates = set().union(*postings)
+
+            def ranked():
+                for key in candidates:
+                    normalized_name, words = self._entries[key][2:]
+                    if all(any(word.startswith(token) for word in words) for token in others):
+                        yield (
+                            not normalized_name.startswith(normalized_query),
+                            SUGGEST_KINDS.index(key[0]),
+                            len(normalized_name),
+                            normalized_name,
+                            key,
+                        )
+
+            # Toutes les entrées sont classées avant de garder les `limit` premières :
+            # une coupe avant le tri écarterait des noms qui commencent par la saisie
+            matches = heapq.nsmallest(limit, ranked())
+
+            results = []
+            for *_, key in matches:
+                name, slug = self._entries[key][:2]
+                results.append({'type': key[0], 'id': key[1], 'name': name, 'slug': slug})
+        return results
+
+    def memory_usage(self):
+        """Estimation (octets) de la mémoire occupée par l'index (listes, tuples, chaînes)."""
+        seen = set()
+
+        def size(obj):
+            if id(obj) in seen:
+                return 0
+            seen.add(id(obj))
+            total = sys.getsizeof(obj)
+            if isinstance(obj, dict):
+                total += sum(size(k) + size(v) for k, v in obj.items())
+            elif isinstance(obj, (list, tuple, set, frozenset)):
+                total += sum(size(item) for item in obj)
+            return total
+
+        with self._lock:
+            return size(self._vocabulary) + size(self._postings) + size(self._entries)
+
+
+# Index du processus (un par worker)
+suggest_index = SuggestIndex()
+
+
+def _warm_up():
+    try:
+        suggest_index.ensure_loaded()
+    except Exception:
+        logger.exception("Échec de la construction de l'index d'autocomplétion au démarrage")
+    finally:
+        connection.close()
+
+
+_warm_up_requested = False
+
+
+def warm_up_in_background():
+    """Construit l'index du worker dans un thread (SUGGEST_WARM_UP, défaut True). Retourne le thread."""
+    global _warm_up_requested
+
+    if not getattr(settings, 'SUGGEST_WARM_UP', True):
+        return None
+    _warm_up_requested = True
+    thread = threading.Thread(target=_warm_up, name='suggest-warm-up', daemon=True)
+    thread.start()
+    return thread
+
+
+def _after_fork_in_child():
+    """
+    gunicorn --preload : le thread de construction lancé dans le maître n'existe pas
+    dans les workers (verrou éventuellement resté pris) ; verrou neuf et nouvelle
+    vérification (sans effet si l'index hérité est à jour).
+    """
+    suggest_index._lock = threading.RLock()
+    if _warm_up_requested:
+        warm_up_in_background()
+
+
+os.register_at_fork(after_in_child=_after_fork_in_child)
@@ -0,0 +1,57 @@
+"""
+Numéros de version partagés entre processus (workers gunicorn).
+
+Chaque nom ('product', 'promotion', ...) correspond à un fichier témoin dans
+settings.CACHE_VERSION_DIR ; sa date de modification (en nanosecondes) sert
+de version. Lire une version coûte un os.stat(), sans requête SQL ni service
+externe ; la « bumper » touche le fichier, ce qui invalide les caches de tous
+les workers de la machine. Avec plusieurs serveurs, CACHE_VERSION_DIR doit être
+un répertoire partagé (vérification api.W001, voir api/checks.py).
+"""
+import os
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+
+
+def _version_dir():
+    return Path(getattr(settings, 'CACHE_VERSION_DIR', Path(settings.BASE_DIR) / '.cache_versions'))
+
+
+def _version_path(name):
+    return _version_dir() / f'{name}.version'
+
+
+def get_version(name):
+    """Retourne la version courante de `name` (0 si jamais modifiée)."""
+    try:
+        return os.stat(_version_path(name)).st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+def get_versions(*names):
+    """Retourne un tuple des versions, utilisable dans une clé de cache."""
+    return tuple(get_version(name) for name in names)
+
+
+def bump(*names):
+    """Incrémente la version de chaque nom (nouvelle date de modification, strictement croissante)."""
+    directory = _version_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    for name in names:
+        path = _version_path(name)
+        stamp = max(time.time_ns(), get_version(name) + 1)
+        path.touch()
+        os.utime(path, ns=(stamp, stamp))
+
+
+def bump_on_commit(*names):
+    """
+    bump() après la validation de la transaction en cours (immédiat hors transaction) : bumpée
+    avant, une version laisserait un autre worker remettre en cache les données pas encore
+    validées sous la nouvelle version.
+    """
+    transaction.on_commit(lambda: bump(*names))
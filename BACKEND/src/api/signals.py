@@ -0,0 +1,247 @@
+"""
+Signaux de l'application api.
+Maintiennent à jour les données dénormalisées (prix effectifs des produits,
+résumés de notes) et les versions des caches. Branchés dans ApiConfig.ready().
+"""
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_init, post_save, post_delete, pre_save
+from django.dispatch import receiver
+
+from .models import (
+    Category, Product, ProductPromotion, ProductFlash, FlashProductItem, Commentaire,
+    SiteSettings, ParametrePage, MaSelection, ProductCarousel, ProductImage,
+)
+from .services.homepage import schedule_snapshot_rebuild
+from .services.pricing import refresh_effective_prices
+from .services.ratings import apply_rating_delta, rating_state
+from .services.suggest import suggest_index
+from .services.versions import bump_on_commit
+
+
+# Champs de Product qui entrent dans le calcul du prix effectif
+PRICE_INPUT_FIELDS = {'price', 'compare_at_price'}
+
+# Champs de Product dont dépend l'index d'autocomplétion (version 'product_names')
+SUGGEST_FIELDS = ('name', 'slug', 'is_active', 'category_id')
+
+
+def _refresh_prices(product_ids):
+    """Recalcule le prix effectif des produits donnés (ids)."""
+    ids = {pk for pk in product_ids if pk}
+    if ids:
+        refresh_effective_prices(Product.objects.filter(pk__in=ids))
+
+
+# Prix effectifs
+# Prix effectifs
+
+@receiver(post_save, sender=Product)
+def product_saved_refresh_price(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if update_fields is not None and not PRICE_INPUT_FIELDS.intersection(update_fields):
+        return
+    refresh_effective_prices([instance])
+
+
+@receiver(post_save, sender=ProductPromotion)
+@receiver(post_delete, sender=ProductPromotion)
+def promotion_changed_refresh_price(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    _refresh_prices([instance.product_id])
+
+
+@receiver(pre_save, sender=FlashProductItem)
+def flash_item_remember_product(sender, instance, raw=False, **kwargs):
+    """Mémorise l'ancien produit si l'item change de produit (son prix doit aussi être recalculé)."""
+    instance._previous_product_id = None
+    if instance.pk and not raw:
+        instance._previous_product_id = (
+            FlashProductItem.objects.filter(pk=instance.pk).values_list('product_id', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=FlashProductItem)
+@receiver(post_delete, sender=FlashProductItem)
+def flash_item_changed_refresh_price(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    _refresh_prices([instance.product_id, getattr(instance, '_previous_product_id', None)])
+
+
+@receiver(post_save, sender=ProductFlash)
+def flash_saved_refresh_price(sender, instance, raw=False, **kwargs):
+    """Activation/désactivation d'un flash : recalcul des produits de ses items."""
+    if raw:
+        return
+    _refresh_prices(instance.items.values_list('product_id', flat=True))
+
+
+# Versions des caches (index de listing mélangés, ...), bumpées après validation de la transaction
+# Versions des caches (index de listing mélangés, ...), bumpées après validation de la transaction
+
+@receiver(pre_save, sender=Product)
+def product_remember_suggest_change(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Mémorise si un champ indexé par l'autocomplétion change (nom, slug, activation, catégorie)."""
+    instance._suggest_changed = False
+    if raw or (update_fields is not None and not {'name', 'slug', 'is_active', 'category'}.intersection(update_fields)):
+        return
+    previous = Product.objects.filter(pk=instance.pk).values_list(*SUGGEST_FIELDS).first() if instance.pk else None
+    instance._suggest_changed = previous != tuple(getattr(instance, field) for field in SUGGEST_FIELDS)
+
+
+@receiver(post_save, sender=Product)
+def product_saved_bump_version(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    if getattr(instance, '_suggest_changed', True):
+        bump_on_commit('product', 'product_names')
+    else:
+        bump_on_commit('product')
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted_bump_version(sender, **kwargs):
+    bump_on_commit('product', 'product_names')
+
+
+@receiver(post_save, sender=ProductPromotion)
+@receiver(post_delete, sender=ProductPromotion)
+def promotion_changed_bump_version(sender, raw=False, **kwargs):
+    if not raw:
+        bump_on_commit('promotion')
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed_bump_version(sender, raw=False, **kwargs):
+    if not raw:
+        bump_on_commit('category')
+
+
+# Versions des réponses en cache de la page d'accueil (api.services.response_cache)
+CACHED_MODEL_VERSIONS = {
+    SiteSettings: 'site_settings',
+    ParametrePage: 'parametre_page',
+    MaSelection: 'ma_selection',
+    ProductCarousel: 'carousel',
+    ProductImage: 'product_image',
+    ProductFlash: 'flash',
+    FlashProductItem: 'flash',
+}
+
+
+def model_changed_bump_version(sender, raw=False, **kwargs):
+    if not raw:
+        bump_on_commit(CACHED_MODEL_VERSIONS[sender])
+
+
+def m2m_changed_bump_version(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_on_commit(M2M_VERSIONS[sender])
+
+
+for _model in CACHED_MODEL_VERSIONS:
+    post_save.connect(model_changed_bump_version, sender=_model, dispatch_uid=f'bump_version_save_{_model.__name__}')
+    post_delete.connect(model_changed_bump_version, sender=_model, dispatch_uid=f'bump_version_delete_{_model.__name__}')
+
+M2M_VERSIONS = {
+    MaSelection.products.through: 'ma_selection',
+    ProductFlash.secondary_products.through: 'flash',
+}
+for _through in M2M_VERSIONS:
+    m2m_changed.connect(m2m_changed_bump_version, sender=_through, dispatch_uid=f'bump_version_m2m_{_through.__name__}')
+
+
+# Instantané de la page d'accueil : reconstruit en arrière-plan après chaque écriture validée
+# Instantané de la page d'accueil : reconstruit en arrière-plan après chaque écriture validée
+
+HOMEPAGE_MODELS = (Product, ProductPromotion, Category, *CACHED_MODEL_VERSIONS)
+
+
+def homepage_model_changed(sender, raw=False, **kwargs):
+    if not raw:
+        schedule_snapshot_rebuild()
+
+
+def homepage_m2m_changed(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        schedule_snapshot_rebuild()
+
+
+for _model in HOMEPAGE_MODELS:
+    post_save.connect(homepage_model_changed, sender=_model, dispatch_uid=f'homepage_snapshot_save_{_model.__name__}')
+    post_delete.connect(homepage_model_changed, sender=_model, dispatch_uid=f'homepage_snapshot_delete_{_model.__name__}')
+for _through in M2M_VERSIONS:
+    m2m_changed.connect(homepage_m2m_changed, sender=_through, dispatch_uid=f'homepage_snapshot_m2m_{_through.__name__}')
+
+
+# Index d'autocomplétion : mis à jour après validation, à la suite du bump des versions
+# (branché après elles) : l'index local reste à jour sans reconstruction
+# Index d'autocomplétion : mis à jour après validation, à la suite du bump des versions
+# (branché après elles) : l'index local reste à jour sans reconstruction
+
+def _update_suggest_on_commit(update):
+    def apply():
+        if suggest_index.version is None:
+            return
+        update()
+        suggest_index.mark_current()
+    transaction.on_commit(apply)
+
+
+@receiver(post_save, sender=Product)
+def product_saved_update_suggest(sender, instance, raw=False, **kwargs):
+    if raw or suggest_index.version is None:
+        return
+    if instance.is_active:
+        entry = ('product', instance.pk, instance.name, instance.slug)
+        _update_suggest_on_commit(lambda: suggest_index.upsert(*entry))
+    else:
+        _update_suggest_on_commit(lambda: suggest_index.remove('product', instance.pk))
+
+
+@receiver(post_save, sender=Category)
+def category_saved_update_suggest(sender, instance, raw=False, **kwargs):
+    if raw or suggest_index.version is None:
+        return
+    entry = ('category', instance.pk, instance.name, instance.slug)
+    _update_suggest_on_commit(lambda: suggest_index.upsert(*entry))
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Category)
+def catalog_deleted_update_suggest(sender, instance, **kwargs):
+    if suggest_index.version is None:
+        return
+    key = ('product' if sender is Product else 'category', instance.pk)
+    _update_suggest_on_commit(lambda: suggest_index.remove(*key))
+
+
+# Résumés de notes
+# Résumés de notes
+
+@receiver(post_init, sender=Commentaire)
+def commentaire_remember_rating(sender, instance, **kwargs):
+    """Mémorise l'état chargé (compté ou non, note, signalé) pour calculer le delta à la sauvegarde."""
+    instance._rating_state = rating_state(instance) if instance.pk else None
+
+
+@receiver(post_save, sender=Commentaire)
+def commentaire_saved_update_rating(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous, current = instance._rating_state, rating_state(instance)
+    if previous != current:
+        if previous:
+            apply_rating_delta(*previous, -1)
+        if current:
+            apply_rating_delta(*current, +1)
+    instance._rating_state = current
+
+
+@receiver(post_delete, sender=Commentaire)
+def commentaire_deleted_update_rating(sender, instance, **kwargs):
+    if instance._rating_state:
+        apply_rating_delta(*instance._rating_state, -1)
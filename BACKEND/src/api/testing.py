@@ -0,0 +1,63 @@
+"""
+Outils de test : budgets de requêtes SQL des routes de l'API.
+
+Usage dans un TestCase (self.client = APIClient()) :
+
+    class QueryBudgetTests(QueryBudgetAssertionsMixin, TestCase):
+        def test_budgets(self):
+            self.assertRouteBudgets(
+                {'boutique-list': {}, 'product-detail-detail': {'kwargs': {'pk': 'mon-produit'}}},
+                skip=['paypal-create-order'],
+            )
+
+Chaque route de api/urls.py doit figurer dans les requêtes ou dans `skip` : une
+nouvelle route sans budget testé fait échouer le test.
+"""
+from django.core.cache import cache
+from django.urls import URLPattern, URLResolver, reverse
+
+from .services.query_budget import QueryRecorder, get_query_budget
+from .services.singletons import clear_singleton_cache
+
+
+def api_routes(patterns=None):
+    """Noms des routes de api/urls.py (une fois chacun, variantes de format du routeur comprises)."""
+    if patterns is None:
+        from api.urls import urlpatterns as patterns
+
+    names = []
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            names.extend(name for name in api_routes(pattern.url_patterns) if name not in names)
+        elif isinstance(pattern, URLPattern) and pattern.name and pattern.name not in names:
+            names.append(pattern.name)
+    return names
+
+
+class QueryBudgetAssertionsMixin:
+    """Assertions de budget de requêtes pour un TestCase disposant de self.client."""
+
+    def assertRouteBudgets(self, requests, skip=()):
+        """
+        requests : {nom de route: {'kwargs': {...}, 'params': {...}}} (GET, caches vidés avant chaque appel)
+        skip : routes non testées (POST uniquement, services externes...)
+        """
+        missing = [name for name in api_routes() if name not in requests and name not in skip]
+        self.assertEqual(missing, [], "Routes sans budget de requêtes testé")
+
+        for name, spec in requests.items():
+            with self.subTest(route=name):
+                cache.clear()
+                clear_singleton_cache()
+                url = reverse(name, kwargs=spec.get('kwargs'))
+                recorder = QueryRecorder()
+                with recorder.record():
+                    response = self.client.get(url, spec.get('params'))
+                self.assertEqual(response.status_code, spec.get('status', 200), f"GET {url}")
+
+                budget = get_query_budget(name)
+                queries = '\n'.join(sql for sql, _ in recorder.queries)
+                self.assertLessEqual(
+                    recorder.count, budget, f"GET {url} : {recorder.count} requêtes pour un budget de {budget}\n{queries}"
+                )
+                self.assertEqual(recorder.repeated(), [], f"GET {url} : requêtes répétées (N+1)")
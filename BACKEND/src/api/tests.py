@@ -1,3 +1,1250 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+import gzip
+import io
+import json
+import os
+import random
+import tempfile
+import warnings
+from pathlib import Path
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.cache.backends.base import CacheKeyWarning
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase as DjangoTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from PIL import Image
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from .models import (
+    Category,
+    Product,
+    ProductPromotion,
+    ProductFlash,
+    FlashProductItem,
+    ParametrePage,
+    ProductCarousel,
+    ProductImage,
+    Commentaire,
+    SiteSettings,
+    MaSelection,
+    BackgroundRemovalJob,
+    ImageDerivative,
+)
+from .renderers import FastJSONParser, FastJSONRenderer
+from .testing import QueryBudgetAssertionsMixin
+from .serializers import BoutiqueProductSerializer, NewProductItemSerializer
+from .services.background_removal import (
+    acquire_job, claim_next_job, compact_cutout, encode_cutout, get_carousel_image_no_background, nobg_target,
+    prefetch_nobg_derivatives, process_pending_jobs, remove_backgrounds, remove_backgrounds_parallel, requeue_jobs,
+    retry_delay,
+)
+from .services import homepage as homepage_service
+from .services.media_files import list_images
+from .services.metrics import observe_outbound, record_cache, render_metrics, reset_metrics
+from .services.pricing import PricingResolver, compute_product_pricing
+from .services.projections import NEW_PRODUCT_FIELDS, PRODUCT_LIST_FIELDS, new_product_data, product_list_data
+from .services.ratings import rebuild_rating_summaries
+from .services.singletons import clear_singleton_cache, singleton_cache_stats
+from .services.versions import bump, get_versions
+from .views import PRICED_PRODUCT_VERSIONS
+
+
+class TestCase(DjangoTestCase):
+    """
+    Vide les caches du processus avant chaque test : le rollback de la base
+    ne bumpe pas les versions, une donnée d'un test précédent resterait servie.
+    Les versions sont bumpées à la validation (transaction.on_commit) : les tests
+    qui en dépendent écrivent dans self.captureOnCommitCallbacks(execute=True).
+    Versions et instantané de la page d'accueil sont écrits dans un répertoire
+    temporaire par classe, jamais dans ceux de src/ (servis par le serveur de dev).
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        directory = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(directory.cleanup)
+        override = override_settings(
+            CACHE_VERSION_DIR=Path(directory.name) / "versions",
+            HOMEPAGE_SNAPSHOT_DIR=Path(directory.name) / "homepage_snapshot",
+        )
+        override.enable()
+        cls.addClassCleanup(override.disable)
+        super().setUpClass()
+
+    def setUp(self):
+        # Pas de reconstruction de l'instantané en arrière-plan pendant les tests
+        override = override_settings(HOMEPAGE_SNAPSHOT_BACKGROUND=False)
+        override.enable()
+        self.addCleanup(override.disable)
+        cache.clear()
+        clear_singleton_cache()
+
+
+def create_products(count, category=None, prefix="Produit"):
+    """Crée `count` produits actifs (prix 1000, 2000, ...)."""
+    return [
+        Product.objects.create(
+            name=f"{prefix} {i}",
+            slug=f"{prefix.lower()}-{i}",
+            category=category,
+            price=1000 * (i + 1),
+            stock=5,
+        )
+        for i in range(count)
+    ]
+
+
+# Prix (PricingResolver)
+# Prix (PricingResolver)
+
+class PricingResolverTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        now = timezone.now()
+        self.category = Category.objects.create(name="Réseau", slug="reseau")
+        self.products = create_products(3, self.category)
+        self.plain, self.promo, self.flash = self.products
+        ProductPromotion.objects.create(
+            product=self.promo, promo_price=1500,
+            start_date=now - timedelta(days=1), end_date=now + timedelta(days=1),
+        )
+        # Le flash est prioritaire sur la promotion
+        ProductPromotion.objects.create(product=self.flash, promo_price=2900)
+        flash = ProductFlash.objects.create(title="Flash")
+        FlashProductItem.objects.create(
+            flash=flash, product=self.flash, is_main=True, compare_at_price=2500,
+            start_date=now - timedelta(hours=1), end_date=now + timedelta(hours=1),
+        )
+
+    def test_resolves_each_source(self):
+        pricing = PricingResolver(self.products)
+        self.assertEqual(pricing.get(self.plain), (1000, 1000))
+        self.assertEqual(pricing.get(self.promo), (1500, 2000))
+        self.assertEqual(pricing.get(self.flash), (2500, 3000))
+        self.assertEqual(compute_product_pricing(self.flash), (2500, 3000))
+
+    def test_fixed_number_of_queries(self):
+        with self.assertNumQueries(2):
+            pricing = PricingResolver(self.products)
+            for product in self.products:
+                pricing.get(product)
+
+    def test_boutique_query_count_is_constant(self):
+        create_products(30, self.category, prefix="Extra")
+        parametres = ParametrePage.objects.create(boutique_products_per_page=5)
+        client = APIClient()
+
+        def count_queries():
+            cache.clear()
+            with CaptureQueriesContext(connection) as ctx:
+                response = client.get("/api/boutique/")
+            self.assertEqual(response.status_code, 200)
+            return len(ctx.captured_queries), len(response.data["results"])
+
+        small_queries, small_rows = count_queries()
+        parametres.boutique_products_per_page = 30
+        with self.captureOnCommitCallbacks(execute=True):
+            parametres.save()
+        large_queries, large_rows = count_queries()
+
+        self.assertEqual((small_rows, large_rows), (5, 30))
+        self.assertEqual(small_queries, large_queries)
+
+    def test_cart_uses_server_side_price(self):
+        from .views import _validate_cart
+
+        cart = [
+            {"id": self.promo.id, "name": self.promo.name, "price": 1, "quantity": 2},
+            {"id": str(self.flash.id), "name": self.flash.name, "price": 1, "quantity": 1},
+        ]
+        with self.assertNumQueries(3):
+            total_cfa, snapshot = _validate_cart(cart)
+        self.assertEqual(total_cfa, 1500 * 2 + 2500)
+        self.assertEqual([item["price"] for item in snapshot], [1500, 2500])
+
+
+class EffectivePriceTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.products = create_products(4)
+        self.client = APIClient()
+
+    def test_signals_keep_effective_price_in_sync(self):
+        product = self.products[1]
+        product.refresh_from_db()
+        self.assertEqual((product.effective_price, product.price_source), (2000, "base"))
+
+        promo = ProductPromotion.objects.create(product=product, promo_price=500)
+        product.refresh_from_db()
+        self.assertEqual((product.effective_price, product.effective_compare_at_price), (500, 2000))
+        self.assertEqual(product.price_source, "promotion")
+
+        promo.delete()
+        product.refresh_from_db()
+        self.assertEqual((product.effective_price, product.price_source), (2000, "base"))
+
+    def test_boundary_is_applied_by_listing(self):
+        product = self.products[0]
+        start = timezone.now() + timedelta(hours=1)
+        ProductPromotion.objects.create(product=product, promo_price=10, start_date=start)
+        product.refresh_from_db()
+        self.assertEqual((product.effective_price, product.price_valid_until), (1000, start))
+
+        # La promotion commence : le listing recalcule le prix avant de filtrer
+        Product.objects.filter(pk=product.pk).update(price_valid_until=timezone.now() - timedelta(seconds=1))
+        ProductPromotion.objects.filter(product=product).update(start_date=timezone.now() - timedelta(seconds=1))
+        response = self.client.get("/api/boutique/", {"max_price": 100})
+        self.assertEqual([row["id"] for row in response.data["results"]], [product.id])
+
+    def test_boutique_ordering_and_filters(self):
+        response = self.client.get("/api/boutique/", {"ordering": "-price", "min_price": 2000})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row["price"] for row in response.data["results"]], [4000, 3000, 2000])
+        self.assertEqual(response.data["count"], 3)
+
+        response = self.client.get("/api/boutique/", {"ordering": "name"})
+        self.assertEqual(response.status_code, 400)
+
+
+# Index mélangé des listings
+# Index mélangé des listings
+
+class ShuffleIndexTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.products = create_products(30)
+        ParametrePage.objects.create(boutique_products_per_page=8)
+
+    def test_order_matches_legacy_seeded_shuffle(self):
+        response = self.client.get("/api/boutique/", {"page": 2})
+        legacy = list(Product.objects.filter(is_active=True))
+        random.Random(response.data["shuffle_seed"]).shuffle(legacy)
+        self.assertEqual([row["id"] for row in response.data["results"]], [p.id for p in legacy[8:16]])
+        self.assertEqual(response.data["count"], 30)
+
+    def test_page_fetch_uses_cached_index(self):
+        self.client.get("/api/boutique/")
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get("/api/boutique/", {"page": 3})
+        self.assertEqual(len(response.data["results"]), 8)
+        product_queries = [q["sql"] for q in ctx.captured_queries if 'FROM "api_product"' in q["sql"]]
+        self.assertEqual(len(product_queries), 1)
+        self.assertIn(" IN (", product_queries[0])
+
+    def test_index_invalidated_when_product_changes(self):
+        self.client.get("/api/boutique/")
+        self.products[0].is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.products[0].save()
+        response = self.client.get("/api/boutique/")
+        self.assertEqual(response.data["count"], 29)
+
+    def test_cache_key_is_memcached_safe(self):
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", CacheKeyWarning)
+            self.client.get("/api/promotions-page/")
+            self.client.get("/api/boutique/")
+
+
+# Recherche plein texte
+# Recherche plein texte
+
+class ProductSearchTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.category = Category.objects.create(name="Écrans", slug="ecrans")
+        self.in_description = Product.objects.create(
+            name="Moniteur 24 pouces", slug="moniteur", price=1000, category=self.category,
+            description="Un écran lumineux",
+        )
+        self.in_name = Product.objects.create(name="Écran HP 27", slug="ecran-hp", price=2000)
+
+    def search(self, **params):
+        response = self.client.get("/api/search/", params)
+        self.assertEqual(response.status_code, 200)
+        return [row["slug"] for row in response.data["results"]]
+
+    def test_folds_accents_and_ranks_name_first(self):
+        self.assertEqual(self.search(q="ECRAN"), ["ecran-hp", "moniteur"])
+        self.assertEqual(self.search(q="ecr lumin"), ["moniteur"])
+        self.assertEqual(self.search(q="ecran", category="ecrans"), ["moniteur"])
+
+    def test_cursor_pagination(self):
+        first = self.client.get("/api/search/", {"q": "ecran", "pagination": "cursor", "page_size": 1}).data
+        second = self.client.get("/api/search/", {"q": "ecran", "cursor": first["next"], "page_size": 1}).data
+        self.assertEqual([first["results"][0]["slug"], second["results"][0]["slug"]], ["ecran-hp", "moniteur"])
+        self.assertIsNone(second["next"])
+        self.assertNotIn("count", second)
+
+    def test_tampered_cursor_rejected(self):
+        from django.core import signing
+        from .pagination import CURSOR_SALT
+
+        first = self.client.get("/api/search/", {"q": "ecran", "pagination": "cursor", "page_size": 1}).data
+        signature = first["next"].rsplit(":", 1)[1]
+        # Position remise à 0 pour contourner MAX_TOTAL_RESULTS
+        payload = {**signing.loads(first["next"], salt=CURSOR_SALT), "n": 0}
+        forged = signing.b64_encode(json.dumps(payload, separators=(",", ":")).encode()).decode()
+        for cursor in (f"{forged}:{signature}", forged):
+            response = self.client.get("/api/search/", {"q": "ecran", "cursor": cursor, "page_size": 1})
+            self.assertEqual(response.status_code, 400)
+
+    def test_index_follows_product_changes(self):
+        self.in_name.name = "Clavier sans fil"
+        self.in_name.save()
+        Product.objects.filter(pk=self.in_description.pk).update(description="Dalle mate")
+        self.assertEqual(self.search(q="ecran"), [])
+        self.assertEqual(self.search(q="clavier"), ["ecran-hp"])
+
+
+class SuggestTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        from .services.suggest import suggest_index
+
+        self.index = suggest_index
+        self.index.version = None
+        self.client = APIClient()
+        self.category = Category.objects.create(name="Écrans", slug="ecrans")
+        Product.objects.create(name="Écran Dell 24 pouces", slug="ecran-dell", price=1000)
+        Product.objects.create(name="Câble HDMI écran", slug="cable-hdmi", price=100)
+
+    def suggest(self, q):
+        return [(row["type"], row["slug"]) for row in self.client.get("/api/search/suggest/", {"q": q}).data["results"]]
+
+    def test_prefix_suggestions_without_queries(self):
+        self.suggest("a")  # construction de l'index
+        with self.assertNumQueries(0):
+            results = self.suggest("ECR")
+        self.assertEqual(results, [("category", "ecrans"), ("product", "ecran-dell"), ("product", "cable-hdmi")])
+        self.assertEqual(self.suggest("cab ecr"), [("product", "cable-hdmi")])
+
+    def test_rebuilt_only_when_indexed_fields_change(self):
+        from .services.suggest import VERSION_NAMES
+
+        product = Product.objects.get(slug="ecran-dell")
+        before = get_versions(*VERSION_NAMES)
+        with self.captureOnCommitCallbacks(execute=True):
+            product.price = 900
+            product.save()
+        self.assertEqual(get_versions(*VERSION_NAMES), before)
+        with self.captureOnCommitCallbacks(execute=True):
+            product.name = "Écran Dell 27 pouces"
+            product.save()
+        self.assertNotEqual(get_versions(*VERSION_NAMES), before)
+
+    def test_repeated_prefix_suggested_once(self):
+        Product.objects.create(name="Câble écran pour écrans 4K", slug="cable-ecrans", price=10)
+        self.assertEqual(self.suggest("ecr").count(("product", "cable-ecrans")), 1)
+        self.assertEqual(self.suggest("e").count(("product", "cable-ecrans")), 1)
+
+    def test_prefix_matches_ranked_first_among_many_candidates(self):
+        from .services.suggest import SuggestIndex
+
+        index = SuggestIndex()
+        index.build(
+            products=[(i, f"Support ecran mural {i}", f"support-{i}") for i in range(1, 1001)]
+            + [(1001, "Ecran 24 pouces", "ecran-24")],
+            categories=[(1, "Écrans", "ecrans")],
+        )
+        results = [row["slug"] for row in index.search("ecran", 5)]
+        self.assertEqual(results[:2], ["ecrans", "ecran-24"])
+        self.assertEqual(len(results), 5)
+
+    def test_warm_up_builds_index_outside_requests(self):
+        from .services import suggest
+
+        with override_settings(SUGGEST_WARM_UP=False):
+            self.assertIsNone(suggest.warm_up_in_background())
+        # Corps du thread de démarrage (la base de test en mémoire est verrouillée par la transaction du test)
+        with mock.patch.object(suggest.connection, "close"):
+            suggest._warm_up()
+        self.assertIsNotNone(self.index.version)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.suggest("cab"), [("product", "cable-hdmi")])
+
+    def test_index_updated_incrementally(self):
+        self.suggest("a")
+        with self.captureOnCommitCallbacks(execute=True):  # index mis à jour à la validation
+            product = Product.objects.create(name="Écran Samsung", slug="ecran-samsung", price=10)
+            Product.objects.filter(slug="ecran-dell").get().delete()
+            product.is_active = False
+            product.save()
+            self.category.name = "Moniteurs"
+            self.category.save()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.suggest("ecran"), [("product", "cable-hdmi")])
+            self.assertEqual(self.suggest("moni"), [("category", "ecrans")])
+
+
+# Nouveaux produits
+# Nouveaux produits
+
+class NewProductsTests(TestCase):
+    def test_constant_queries_and_newest_first(self):
+        parametres = ParametrePage.objects.create(new_products_category_limit=2, new_products_per_category_limit=2)
+        categories = [Category.objects.create(name=f"Cat {i}", slug=f"cat-{i}") for i in range(4)]
+        for category in categories:
+            create_products(5, category, prefix=category.slug)
+        Category.objects.create(name="Cat vide", slug="cat-vide")
+        client = APIClient()
+
+        with self.assertNumQueries(3):
+            response = client.get("/api/new-products/")
+        self.assertEqual([row["slug"] for row in response.data["results"]], ["cat-0", "cat-1"])
+        self.assertEqual([p["slug"] for p in response.data["results"][0]["products"]], ["cat-0-4", "cat-0-3"])
+
+        parametres.new_products_category_limit = 10
+        parametres.new_products_per_category_limit = 10
+        with self.captureOnCommitCallbacks(execute=True):
+            parametres.save()
+        with self.assertNumQueries(3):
+            response = client.get("/api/new-products/")
+        self.assertEqual([len(row["products"]) for row in response.data["results"]], [5, 5, 5, 5])
+
+
+# Lecture allégée des listings (projections)
+# Lecture allégée des listings (projections)
+
+class ProjectionTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        category = Category.objects.create(name="Réseau", slug="reseau")
+        self.products = create_products(3, category)
+        ProductPromotion.objects.create(
+            product=self.products[0], promo_price=500,
+            start_date=timezone.now() - timedelta(days=1), end_date=timezone.now() + timedelta(days=1),
+        )
+
+    def test_same_representation_as_serializers(self):
+        full = list(Product.objects.select_related("category").order_by("id"))
+        light = list(Product.objects.select_related("category").only(*PRODUCT_LIST_FIELDS).order_by("id"))
+        with self.assertNumQueries(2):  # prix : flash + promotions, aucune colonne différée relue
+            data = product_list_data(light, PricingResolver(light))
+        self.assertEqual(data, BoutiqueProductSerializer(full, many=True).data)
+        self.assertEqual(data[0]["price"], 500)
+
+        light = list(Product.objects.select_related("category").only(*NEW_PRODUCT_FIELDS).order_by("id"))
+        with self.assertNumQueries(0):
+            data = new_product_data(light)
+        self.assertEqual(data, NewProductItemSerializer(full, many=True).data)
+
+    def test_boutique_results_unchanged(self):
+        response = APIClient().get("/api/boutique/", {"ordering": "price"})
+        expected = BoutiqueProductSerializer(
+            Product.objects.select_related("category").order_by("effective_price", "id"), many=True
+        ).data
+        self.assertEqual(response.data["results"], expected)
+
+
+# Flash promotion
+# Flash promotion
+
+class FlashEndpointsTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        now = timezone.now()
+        self.client = APIClient()
+        products = create_products(9)
+        self.flash = ProductFlash.objects.create(
+            title="Flash",
+            secondary_start_date=now - timedelta(hours=1),
+            secondary_end_date=now + timedelta(days=1),
+        )
+        FlashProductItem.objects.create(
+            flash=self.flash, product=products[0], is_main=True, compare_at_price=500,
+            end_date=now + timedelta(hours=2),
+        )
+        self.flash.secondary_products.set(products[1:])
+
+    def test_secondary_products_query_count_is_pinned(self):
+        # flash + items principaux + produits secondaires, quel que soit le nombre de produits
+        with self.assertNumQueries(3):
+            response = self.client.get("/api/flash-secondary-products/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 8)
+        self.assertTrue(all(row["remaining_time"] for row in response.data))
+        self.assertEqual(response.data[0]["end_date"], response.data[-1]["end_date"])
+
+    def test_main_product_query_count_is_pinned(self):
+        with self.assertNumQueries(3):
+            response = self.client.get("/api/flash-main-product/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["compare_at_price"], 500)
+        self.assertTrue(response.data["remaining_time"].startswith("00-01-"))
+
+
+# Caches de la page d'accueil (réponses, singletons)
+# Caches de la page d'accueil (réponses, singletons)
+
+class SingletonCacheTests(TestCase):
+    def test_load_is_memoized_until_saved(self):
+        parametres = ParametrePage.objects.create(boutique_products_per_page=12)
+        ParametrePage.load()
+        with self.assertNumQueries(0):
+            self.assertEqual(ParametrePage.load().boutique_products_per_page, 12)
+        parametres.boutique_products_per_page = 6
+        with self.captureOnCommitCallbacks(execute=True):
+            parametres.save()
+        self.assertEqual(ParametrePage.load().boutique_products_per_page, 6)
+        self.assertEqual(singleton_cache_stats()["hits"], 1)
+        self.assertEqual(singleton_cache_stats()["misses"], 2)
+
+    def test_not_kept_when_version_bumped_during_load(self):
+        ParametrePage.objects.create(boutique_products_per_page=12)
+        with mock.patch("api.services.singletons.get_version", side_effect=[1, 2]):
+            ParametrePage.load()
+        self.assertEqual(singleton_cache_stats()["cached"], [])
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+
+    def test_cached_until_model_changes(self):
+        settings = SiteSettings.objects.create(company_name="Boutique")
+        self.client.get("/api/site-settings/")
+        with self.assertNumQueries(0):
+            response = self.client.get("/api/site-settings/")
+        self.assertEqual(response.data["company_name"], "Boutique")
+
+        settings.company_name = "Nouvelle boutique"
+        with self.captureOnCommitCallbacks(execute=True):  # versions bumpées à la validation
+            settings.save()
+        self.assertEqual(self.client.get("/api/site-settings/").data["company_name"], "Nouvelle boutique")
+
+    def test_m2m_change_invalidates_ma_selection(self):
+        selection = MaSelection.objects.create(title="Sélection", is_active=True)
+        product = create_products(1)[0]
+        self.assertEqual(self.client.get("/api/ma-selection/").data["count"], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            selection.products.add(product)
+        self.assertEqual(self.client.get("/api/ma-selection/").data["count"], 1)
+
+    def test_flash_remaining_time_recomputed_from_cache(self):
+        flash = ProductFlash.objects.create(title="Flash")
+        FlashProductItem.objects.create(
+            flash=flash, product=create_products(1)[0], is_main=True,
+            end_date=timezone.now() + timedelta(hours=2),
+        )
+        first = self.client.get("/api/flash-main-product/").data["remaining_time"]
+        later = timezone.now() + timedelta(minutes=30)
+        with mock.patch("django.utils.timezone.now", return_value=later), self.assertNumQueries(0):
+            second = self.client.get("/api/flash-main-product/").data["remaining_time"]
+        self.assertTrue(first.startswith("00-01-59"))
+        self.assertTrue(second.startswith("00-01-29"))
+
+
+# Rendu JSON (orjson)
+# Rendu JSON (orjson)
+
+class FastJSONRendererTests(TestCase):
+    def test_same_output_as_drf_renderer(self):
+        data = {
+            "price": Decimal("1500.50"),
+            "label": gettext_lazy("Boutique"),
+            "created_at": timezone.now(),
+            "ratings": {5: 2, 4: 1},
+            "separator": "a\u2028b",
+            "big": 2 ** 70,
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_parser_round_trip(self):
+        body = FastJSONRenderer().render({"nom": "Émile", "note": 5})
+        self.assertEqual(FastJSONParser().parse(io.BytesIO(body)), {"nom": "Émile", "note": 5})
+        with self.assertRaises(ParseError):
+            FastJSONParser().parse(io.BytesIO(b"{nom"))
+
+
+# Requêtes conditionnelles (ETag / Last-Modified)
+# Requêtes conditionnelles (ETag / Last-Modified)
+
+@mock.patch("api.services.conditional.time.time", return_value=1_800_000_000.0)
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.category = Category.objects.create(name="Réseau", slug="reseau")
+        self.product = create_products(1, self.category)[0]
+        # Répertoire des versions neuf : une version jamais bumpée n'a pas de date (pas de Last-Modified)
+        bump(*PRICED_PRODUCT_VERSIONS)
+
+    def test_not_modified_without_queries_until_product_changes(self, _time):
+        url = f"/api/products/{self.product.slug}/"
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+        self.assertIn("Last-Modified", response)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.product.price = 1500
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_validators_per_parameter_set(self, _time):
+        first = self.client.get("/api/categories/")
+        second = self.client.get("/api/categories/reseau/")
+        self.assertNotEqual(first["ETag"], second["ETag"])
+        response = self.client.get("/api/categories/", HTTP_IF_MODIFIED_SINCE=first["Last-Modified"])
+        self.assertEqual(response.status_code, 304)
+
+
+# Page d'accueil agrégée
+# Page d'accueil agrégée
+
+HOMEPAGE_ENDPOINTS = {
+    "site_settings": "/api/site-settings/",
+    "product_carousel": "/api/product-carousel/?active=true",  # requête du storefront
+    "featured_promotions": "/api/featured-promotions/",
+    "flash_main_product": "/api/flash-main-product/",
+    "flash_secondary_products": "/api/flash-secondary-products/",
+    "new_products": "/api/new-products/",
+    "ma_selection": "/api/ma-selection/",
+}
+
+
+def without_remaining_time(data):
+    rows = data if isinstance(data, list) else [data]
+    return [{k: v for k, v in row.items() if k != "remaining_time"} for row in rows]
+
+
+@override_settings(CAROUSEL_REMOVE_BACKGROUND=False)
+class HomepageTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        now = timezone.now()
+        self.client = APIClient()
+        category = Category.objects.create(name="Réseau", slug="reseau")
+        products = create_products(6, category)
+        SiteSettings.objects.create(company_name="Boutique")
+        ParametrePage.objects.create()
+        for i, product in enumerate(products[:2]):
+            ProductImage.objects.create(product=product, image=f"products/{product.slug}.jpg", is_primary=True)
+            ProductCarousel.objects.create(product=product, position=i)
+            ProductPromotion.objects.create(
+                product=product, promo_price=10, is_featured=True,
+                start_date=now - timedelta(days=1), end_date=now + timedelta(days=1),
+            )
+        ProductCarousel.objects.create(product=products[5], position=2, is_active=False)
+        flash = ProductFlash.objects.create(title="Flash", secondary_end_date=now + timedelta(days=1))
+        FlashProductItem.objects.create(flash=flash, product=products[2], is_main=True, end_date=now + timedelta(days=1))
+        flash.secondary_products.set(products[3:])
+        MaSelection.objects.create(title="Sélection", is_active=True).products.set(products[:3])
+
+    def get_uncached(self, url, params=None):
+        cache.clear()
+        clear_singleton_cache()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.data, len(ctx.captured_queries)
+
+    def test_sections_match_individual_endpoints_with_fewer_queries(self):
+        homepage, homepage_queries = self.get_uncached("/api/homepage/")
+        separate_queries = 0
+        for section, url in HOMEPAGE_ENDPOINTS.items():
+            data, queries = self.get_uncached(url)
+            separate_queries += queries
+            # remaining_time dépend de l'instant de la requête
+            self.assertEqual(without_remaining_time(homepage[section]), without_remaining_time(data), section)
+        self.assertLess(homepage_queries, separate_queries)
+        self.assertEqual(len(homepage["product_carousel"]), 2)  # diapositive inactive exclue
+
+    def test_sections_subset(self):
+        data, _ = self.get_uncached("/api/homepage/", {"sections": "site_settings,ma_selection"})
+        self.assertEqual(sorted(data), ["ma_selection", "site_settings"])
+        self.assertEqual(self.client.get("/api/homepage/", {"sections": "inconnue"}).status_code, 400)
+
+    def test_snapshot_served_as_bytes_and_rebuilt_after_change(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(HOMEPAGE_SNAPSHOT_DIR=directory):
+            response = self.client.get("/api/homepage/snapshot/")
+            self.assertEqual(response.status_code, 200)
+            data = json.loads(response.content)
+            self.assertEqual(data["site_settings"]["company_name"], "Boutique")
+            self.assertEqual(len(data["product_carousel"]), 2)
+            etag = response["ETag"]
+
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get("/api/homepage/snapshot/", HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(len(ctx.captured_queries), 0)
+
+            response = self.client.get("/api/homepage/snapshot/", HTTP_ACCEPT_ENCODING="gzip")
+            self.assertEqual(response["Content-Encoding"], "gzip")
+            self.assertEqual(json.loads(gzip.decompress(response.content)), data)
+
+            settings = SiteSettings.load()
+            settings.company_name = "Nouvelle boutique"
+            with self.captureOnCommitCallbacks(execute=True):
+                settings.save()
+            response = self.client.get("/api/homepage/snapshot/", HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response["ETag"], etag)
+            self.assertEqual(json.loads(response.content)["site_settings"]["company_name"], "Nouvelle boutique")
+
+    def test_snapshot_negotiates_encoding_and_weak_etags(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(HOMEPAGE_SNAPSHOT_DIR=directory):
+            for accept, gzipped in (("gzip;q=0, deflate", False), ("br, gzip;q=0.5", True),
+                                    ("*;q=0.1", True), ("gzip;q=0, *", False), ("identity", False)):
+                response = self.client.get("/api/homepage/snapshot/", HTTP_ACCEPT_ENCODING=accept)
+                self.assertEqual(response.get("Content-Encoding") == "gzip", gzipped, accept)
+
+            etag = self.client.get("/api/homepage/snapshot/", HTTP_ACCEPT_ENCODING="gzip")["ETag"]
+            response = self.client.get(
+                "/api/homepage/snapshot/", HTTP_ACCEPT_ENCODING="gzip", HTTP_IF_NONE_MATCH=f'"autre", W/{etag}',
+            )
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response["ETag"], etag)
+
+    def test_snapshot_files_read_by_another_worker(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(HOMEPAGE_SNAPSHOT_DIR=directory):
+            built = homepage_service.build_snapshot()
+            self.assertEqual(sorted(os.listdir(directory)), ["homepage.json", "homepage.meta.json"])
+            self.assertEqual((Path(directory) / "homepage.json").read_bytes(), built.body)
+
+            # Autre worker : pas de copie en mémoire, relecture des fichiers
+            with mock.patch.object(homepage_service, "_loaded", None):
+                read = homepage_service._read_snapshot()
+            self.assertEqual(read, built)
+
+            # Corps ne correspondant pas à l'etag des métadonnées : ignoré
+            (Path(directory) / "homepage.json").write_bytes(b"{}")
+            with mock.patch.object(homepage_service, "_loaded", None):
+                self.assertIsNone(homepage_service._read_snapshot())
+
+
+# Budgets de requêtes SQL des routes
+# Budgets de requêtes SQL des routes
+
+@override_settings(CAROUSEL_REMOVE_BACKGROUND=False)
+class QueryBudgetTests(QueryBudgetAssertionsMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        now = timezone.now()
+        self.client = APIClient()
+        category = Category.objects.create(name="Réseau", slug="reseau")
+        self.products = create_products(6, category)
+        SiteSettings.objects.create(company_name="Boutique")
+        ParametrePage.objects.create()
+        for i, product in enumerate(self.products):
+            ProductImage.objects.create(product=product, image=f"products/{product.slug}.jpg", is_primary=True)
+            Commentaire.objects.create(product=product, nom="Client", email="client@example.com",
+                                       commentaire="Très bon produit, livré rapidement.", note=5 - i % 5,
+                                       is_approved=True)
+        for i, product in enumerate(self.products[:3]):
+            ProductCarousel.objects.create(product=product, position=i)
+            ProductPromotion.objects.create(
+                product=product, promo_price=10, is_featured=True,
+                start_date=now - timedelta(days=1), end_date=now + timedelta(days=1),
+            )
+        flash = ProductFlash.objects.create(title="Flash", secondary_end_date=now + timedelta(days=1))
+        FlashProductItem.objects.create(flash=flash, product=self.products[3], is_main=True,
+                                        end_date=now + timedelta(days=1))
+        flash.secondary_products.set(self.products[3:])
+        MaSelection.objects.create(title="Sélection", is_active=True).products.set(self.products[:4])
+
+    def test_every_route_within_budget(self):
+        product = self.products[0]
+        promotion = ProductPromotion.objects.get(product=product)
+        self.assertRouteBudgets(
+            {
+                'api-root': {},
+                'site-settings-list': {},
+                'parametre-page-list': {},
+                'product-carousel-list': {},
+                'product-carousel-detail': {'kwargs': {'pk': ProductCarousel.objects.first().pk}},
+                'featured-promotion-list': {},
+                'promotion-list': {},
+                'promotion-detail': {'kwargs': {'pk': promotion.pk}},
+                'category-list': {},
+                'category-detail': {'kwargs': {'slug': 'reseau'}},
+                'new-products-list': {},
+                'flash-main-product-list': {},
+                'flash-secondary-products-list': {},
+                'flash-secondary-products-detail': {'kwargs': {'pk': self.products[4].pk}},
+                'product-search-list': {'params': {'q': 'produit'}},
+                'product-search-suggest': {'params': {'q': 'pro'}},
+                'boutique-list': {},
+                'promotions-page-list': {},
+                'category-products-list': {'params': {'category_slug': 'reseau'}},
+                'product-detail-detail': {'kwargs': {'pk': product.slug}},
+                'commentaire-list': {},
+                'commentaire-detail': {'kwargs': {'pk': Commentaire.objects.first().pk}},
+                'product-commentaires-detail': {'kwargs': {'pk': product.slug}},
+                'ma-selection-list': {},
+                'homepage-list': {},
+                'homepage-snapshot': {},
+            },
+            skip=[
+                # Queryset tranché ([:limit]) : le détail n'est pas servi
+                'featured-promotion-detail',
+                # POST uniquement ou appels aux services de paiement externes
+                'paypal-create-order', 'paypal-capture-order', 'mtn-momo-request-payment',
+                'mtn-momo-payment-status', 'orange-money-request-payment', 'orange-money-payment-status',
+            ],
+        )
+
+    @override_settings(QUERY_BUDGET_ENABLED=True, QUERY_BUDGET_HEADERS=True, QUERY_BUDGETS={'site-settings-list': 0})
+    def test_middleware_headers_and_over_budget_warning(self):
+        with self.assertLogs("api.query_budget", "WARNING") as logs:
+            response = APIClient().get("/api/site-settings/")
+        self.assertEqual(response["X-DB-Queries"], "1")
+        self.assertTrue(response["Server-Timing"].startswith("db;dur="))
+        self.assertIn("site-settings-list", logs.output[0])
+
+
+# Métriques Prometheus
+# Métriques Prometheus
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.metrics_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.metrics_dir.cleanup)
+        reset_metrics()
+        self.addCleanup(reset_metrics)
+
+    def test_metrics_aggregate_route_latency_and_cache_hits(self):
+        with override_settings(METRICS_ENABLED=True, METRICS_DIR=self.metrics_dir.name, METRICS_TOKEN="secret"):
+            client = APIClient()
+            client.get("/api/site-settings/")
+            client.get("/api/site-settings/")
+            self.assertEqual(client.get("/metrics").status_code, 403)
+            response = client.get("/metrics", HTTP_AUTHORIZATION="Bearer secret")
+
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn('http_requests_total{method="GET",route="site-settings-list",status="200"} 2', body)
+        self.assertIn('http_request_duration_seconds_count{method="GET",route="site-settings-list"} 2', body)
+        self.assertIn('cache_requests_total{cache="response",result="hit"} 1', body)
+        self.assertIn('cache_requests_total{cache="response",result="miss"} 1', body)
+
+    def test_dead_process_files_folded_into_aggregate(self):
+        import subprocess
+        import sys
+
+        finished = subprocess.run([sys.executable, "-c", "import os; print(os.getpid())"], capture_output=True, text=True)
+        dead_file = Path(self.metrics_dir.name) / f"{finished.stdout.strip()}-1.json"
+        dead_file.write_text(json.dumps([["cache_requests_total", [["cache", "response"], ["result", "hit"]], 3]]))
+        with override_settings(METRICS_ENABLED=True, METRICS_DIR=self.metrics_dir.name):
+            record_cache("response", True)
+            for _ in range(2):
+                self.assertIn('cache_requests_total{cache="response",result="hit"} 4', render_metrics())
+        self.assertFalse(dead_file.exists())
+        self.assertTrue((Path(self.metrics_dir.name) / "aggregate.json").exists())
+
+    def test_outbound_calls_and_disabled_endpoint(self):
+        with override_settings(METRICS_ENABLED=True, METRICS_DIR=self.metrics_dir.name):
+            with observe_outbound("paypal", "token") as call:
+                call["status"] = 201
+            body = render_metrics()
+        self.assertIn(
+            'outbound_request_duration_seconds_count{operation="token",outcome="2xx",provider="paypal"} 1', body
+        )
+        self.assertEqual(APIClient().get("/metrics").status_code, 404)
+
+
+# Images d'affichage (carousel / promotions)
+# Images d'affichage (carousel / promotions)
+
+@override_settings(CAROUSEL_REMOVE_BACKGROUND=False)
+class DisplayImageTests(TestCase):
+    def add_carousel_items(self, count, offset=0):
+        for i, product in enumerate(create_products(count, prefix=f"Carousel{offset}")):
+            ProductImage.objects.create(product=product, image=f"products/{product.slug}-a.jpg")
+            ProductImage.objects.create(product=product, image=f"products/{product.slug}-b.jpg", is_primary=True)
+            ProductPromotion.objects.create(
+                product=product, promo_price=10, is_featured=True,
+                start_date=timezone.now() - timedelta(days=1), end_date=timezone.now() + timedelta(days=1),
+            )
+            ProductCarousel.objects.create(product=product, position=offset + i)
+
+    def test_carousel_images_cost_no_query_per_row(self):
+        client = APIClient()
+        self.add_carousel_items(2)
+        with CaptureQueriesContext(connection) as small:
+            response = client.get("/api/product-carousel/")
+        self.assertTrue(response.data[0]["product_image"].endswith("-b.jpg"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.add_carousel_items(6, offset=10)
+        with CaptureQueriesContext(connection) as large:
+            response = client.get("/api/product-carousel/")
+        self.assertEqual(len(response.data), 8)
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+
+    def test_promotion_and_model_use_primary_image(self):
+        self.add_carousel_items(1)
+        carousel = ProductCarousel.objects.get()
+        self.assertTrue(carousel.image.endswith("-b.jpg"))
+        response = APIClient().get("/api/promotions/")
+        self.assertTrue(response.data[0]["product_image"].endswith("-b.jpg"))
+
+
+# File de suppression d'arrière-plan
+# File de suppression d'arrière-plan
+
+def _fake_remove_background(source_name, profile=None):
+    cutout = Image.new("RGBA", (1200, 800), (0, 0, 0, 0))
+    cutout.paste((200, 30, 30, 255), (300, 200, 900, 600))
+    return cutout
+
+
+class BackgroundRemovalJobTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        override = override_settings(MEDIA_ROOT=media.name, CAROUSEL_REMOVE_BACKGROUND=True)
+        override.enable()
+        self.addCleanup(override.disable)
+        (Path(media.name) / "products").mkdir()
+        (Path(media.name) / "products" / "photo.jpg").write_bytes(b"jpg")
+        product = create_products(1)[0]
+        self.image = ProductImage.objects.create(product=product, image="products/photo.jpg", is_primary=True).image
+
+    def test_miss_serves_original_and_enqueues_once(self):
+        self.assertEqual(get_carousel_image_no_background(self.image), self.image.url)
+        cache.clear()
+        self.assertEqual(get_carousel_image_no_background(self.image), self.image.url)
+        self.assertEqual(BackgroundRemovalJob.objects.count(), 1)
+
+        with mock.patch("api.services.background_removal._remove_background", _fake_remove_background):
+            self.assertEqual(process_pending_jobs(), 1)
+        job = BackgroundRemovalJob.objects.get()
+        self.assertEqual(job.status, BackgroundRemovalJob.STATUS_DONE)
+        self.assertEqual(get_carousel_image_no_background(self.image), f"/media/{job.output_name}")
+        # Écriture atomique : ni fichier temporaire restant, ni droits restreints de mkstemp
+        _, files = default_storage.listdir("carousel_nobg")
+        self.assertEqual(files, [Path(job.output_name).name])
+        self.assertEqual(os.stat(default_storage.path(job.output_name)).st_mode & 0o777, 0o644)
+
+        # Version enregistrée : une ligne préchargée, sans requête ni accès au stockage par image
+        derivatives = prefetch_nobg_derivatives([self.image])
+        with self.assertNumQueries(0), mock.patch.object(default_storage, "exists", side_effect=AssertionError):
+            url = get_carousel_image_no_background(self.image, derivatives=derivatives)
+        self.assertEqual(url, f"/media/{job.output_name}")
+
+    def test_shared_storage_holds_one_copy(self):
+        storages = {
+            "default": {"BACKEND": "django.core.files.storage.InMemoryStorage"},
+            "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+        }
+        with override_settings(STORAGES=storages):
+            # Stockage sans chemin local (comme S3) : tout passe par l'API de stockage
+            default_storage.save("products/photo.jpg", ContentFile(b"jpg"))
+            self.assertEqual(get_carousel_image_no_background(self.image), self.image.url)
+            with mock.patch("api.services.background_removal._remove_background", _fake_remove_background):
+                self.assertEqual(process_pending_jobs(), 1)
+            job = BackgroundRemovalJob.objects.get()
+            self.assertEqual(job.status, BackgroundRemovalJob.STATUS_DONE, job.last_error)
+            self.assertEqual(default_storage.listdir("carousel_nobg")[1], [Path(job.output_name).name])
+            self.assertEqual(ImageDerivative.objects.get().output_size, default_storage.size(job.output_name))
+            self.assertEqual([image["name"] for image in list_images("products")], ["photo.jpg"])
+
+    def test_an_image_is_processed_by_one_node_at_a_time(self):
+        cache_key, output_name = nobg_target(self.image.name)
+        self.assertIsNotNone(acquire_job(cache_key, self.image.name, output_name))
+        # Déjà réservée : ni un autre pre-warm, ni le worker, ni le traitement immédiat ne la reprennent
+        self.assertIsNone(acquire_job(cache_key, self.image.name, output_name))
+        self.assertIsNone(claim_next_job())
+        self.assertEqual(get_carousel_image_no_background(self.image, inline=True), self.image.url)
+
+        # Réservation abandonnée (nœud arrêté en cours de traitement) : reprise
+        BackgroundRemovalJob.objects.update(started_at=timezone.now() - timedelta(hours=1))
+        job = acquire_job(cache_key, self.image.name, output_name)
+        self.assertEqual((job.status, job.attempts), (BackgroundRemovalJob.STATUS_RUNNING, 2))
+
+    def test_prewarm_reserves_each_image_when_processed(self):
+        media = Path(self.image.path).parents[1]
+        products = [self.image.instance.product] + create_products(2, prefix="Carousel")
+        for i, product in enumerate(products):
+            if i:
+                (media / "products" / f"photo{i}.jpg").write_bytes(b"jpg")
+                ProductImage.objects.create(product=product, image=f"products/photo{i}.jpg", is_primary=True)
+            ProductCarousel.objects.create(product=product, position=i)
+
+        def broken_pool(items, workers=1, compare=False):
+            items = iter(items)
+            # Aucune image n'est réservée avant que le traitement ne la demande
+            self.assertEqual(BackgroundRemovalJob.objects.count(), 0)
+            with mock.patch("api.services.background_removal._remove_background", _fake_remove_background):
+                yield from remove_backgrounds([next(items)], compare=compare)
+            next(items)  # réservée, puis le pool s'arrête (processus tué)
+            raise RuntimeError("pool cassé")
+
+        with mock.patch("api.management.commands.prewarm_carousel_nobg.remove_backgrounds_parallel", broken_pool), \
+                self.assertRaises(RuntimeError):
+            call_command("prewarm_carousel_nobg", "--no-compare", stdout=io.StringIO())
+        jobs = list(BackgroundRemovalJob.objects.order_by("id"))
+        self.assertEqual([job.status for job in jobs], [BackgroundRemovalJob.STATUS_DONE, BackgroundRemovalJob.STATUS_PENDING])
+        self.assertIn("pool cassé", jobs[1].last_error)
+
+    def test_shared_storage_requires_shared_version_dir(self):
+        from .checks import shared_version_dir_check
+
+        storages = {
+            "default": {"BACKEND": "django.core.files.storage.InMemoryStorage"},
+            "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+        }
+        self.assertEqual(shared_version_dir_check(None), [])
+        with override_settings(STORAGES=storages, CACHE_VERSION_DIR=None):
+            self.assertEqual([w.id for w in shared_version_dir_check(None)], ["api.W001"])
+        with override_settings(STORAGES=storages):
+            self.assertEqual(shared_version_dir_check(None), [])
+
+    def test_reconcile_marks_stale_and_removes_orphans(self):
+        get_carousel_image_no_background(self.image)
+        with mock.patch("api.services.background_removal._remove_background", _fake_remove_background):
+            process_pending_jobs()
+        media = Path(self.image.path).parents[1]
+        orphan = media / "carousel_nobg" / "orphelin.webp"
+        orphan.write_bytes(b"x")
+        os.utime(orphan, (0, 0))
+        Path(self.image.path).write_bytes(b"nouvelle photo")  # remplacée sous le même nom
+
+        call_command("reconcile_image_derivatives", "--fix", stdout=io.StringIO())
+        derivative = ImageDerivative.objects.get()
+        self.assertEqual(derivative.status, ImageDerivative.STATUS_STALE)
+        self.assertFalse(orphan.exists())
+        self.assertFalse((media / derivative.output_name).exists())
+        self.assertEqual(get_carousel_image_no_background(self.image), self.image.url)
+
+    def test_pending_image_resolved_from_derivative_row(self):
+        self.assertEqual(get_carousel_image_no_background(self.image), self.image.url)
+        self.assertEqual(ImageDerivative.objects.get().status, ImageDerivative.STATUS_PENDING)
+        derivatives = prefetch_nobg_derivatives([self.image])
+        with self.assertNumQueries(0), mock.patch.object(default_storage, "exists", side_effect=AssertionError):
+            self.assertEqual(get_carousel_image_no_background(self.image, derivatives=derivatives), self.image.url)
+
+        # Travail supprimé : la ligne en file est périmée, l'image sera remise en file au prochain affichage
+        BackgroundRemovalJob.objects.all().delete()
+        call_command("reconcile_image_derivatives", "--fix", stdout=io.StringIO())
+        self.assertEqual(ImageDerivative.objects.get().status, ImageDerivative.STATUS_STALE)
+        cache.clear()
+        get_carousel_image_no_background(self.image)
+        self.assertEqual(BackgroundRemovalJob.objects.count(), 1)
+        self.assertEqual(ImageDerivative.objects.get().status, ImageDerivative.STATUS_PENDING)
+
+    def test_lost_output_is_processed_again(self):
+        get_carousel_image_no_background(self.image)
+        with mock.patch("api.services.background_removal._remove_background", _fake_remove_background):
+            process_pending_jobs()
+        job = BackgroundRemovalJob.objects.get()
+        default_storage.delete(job.output_name)
+        call_command("reconcile_image_derivatives", "--fix", stdout=io.StringIO())
+        self.assertFalse(ImageDerivative.objects.exists())
+
+        cache.clear()
+        self.assertEqual(get_carousel_image_no_background(self.image), self.image.url)
+        with mock.patch("api.services.background_removal._remove_background", _fake_remove_background):
+            self.assertEqual(process_pending_jobs(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (BackgroundRemovalJob.STATUS_DONE, 1))
+        self.assertEqual(get_carousel_image_no_background(self.image), f"/media/{job.output_name}")
+
+    @override_settings(CAROUSEL_NOBG_MAX_ATTEMPTS=2)
+    def test_failures_retry_with_backoff_then_give_up(self):
+        get_carousel_image_no_background(self.image)
+        failing = mock.patch("api.services.background_removal._remove_background_and_save", side_effect=MemoryError)
+        with failing, self.assertLogs("api.services.background_removal", "WARNING"):
+            process_pending_jobs()
+            job = BackgroundRemovalJob.objects.get()
+            self.assertEqual((job.status, job.attempts), (BackgroundRemovalJob.STATUS_PENDING, 1))
+            self.assertGreater(job.next_attempt_at, timezone.now() + timedelta(seconds=50))
+            self.assertEqual(process_pending_jobs(), 0)  # pas encore dû
+
+            BackgroundRemovalJob.objects.update(next_attempt_at=timezone.now())
+            process_pending_jobs()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (BackgroundRemovalJob.STATUS_FAILED, 2))
+        self.assertEqual(retry_delay(3), timedelta(seconds=240))
+
+        # Abandonnée : servie en original depuis la ligne préchargée, sans accès au stockage
+        self.assertEqual(ImageDerivative.objects.get().status, ImageDerivative.STATUS_FAILED)
+        derivatives = prefetch_nobg_derivatives([self.image])
+        with self.assertNumQueries(0), mock.patch.object(default_storage, "exists", side_effect=AssertionError), \
+                mock.patch.object(default_storage, "get_modified_time", side_effect=AssertionError):
+            self.assertEqual(get_carousel_image_no_background(self.image, derivatives=derivatives), self.image.url)
+
+    def test_retry_leaves_running_jobs_to_their_process(self):
+        get_carousel_image_no_background(self.image)
+        job = claim_next_job()
+        self.assertEqual(requeue_jobs(BackgroundRemovalJob.objects.all()), (0, 1))
+        job.refresh_from_db()
+        self.assertEqual(job.status, BackgroundRemovalJob.STATUS_RUNNING)
+
+        # Réservation abandonnée : remise en file
+        BackgroundRemovalJob.objects.update(started_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(requeue_jobs(BackgroundRemovalJob.objects.all()), (1, 0))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (BackgroundRemovalJob.STATUS_PENDING, 0))
+
+    @override_settings(CAROUSEL_NOBG_MAX_ATTEMPTS=2)
+    def test_interrupted_job_backs_off_then_gives_up(self):
+        get_carousel_image_no_background(self.image)
+        claim_next_job()  # le worker s'arrête pendant le traitement (image qui le fait planter)
+        BackgroundRemovalJob.objects.update(started_at=timezone.now() - timedelta(hours=1))
+        self.assertIsNone(claim_next_job())
+        job = BackgroundRemovalJob.objects.get()
+        self.assertEqual((job.status, job.attempts), (BackgroundRemovalJob.STATUS_PENDING, 1))
+        self.assertGreater(job.next_attempt_at, timezone.now())
+
+        BackgroundRemovalJob.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(claim_next_job().attempts, 2)
+        BackgroundRemovalJob.objects.update(started_at=timezone.now() - timedelta(hours=1))
+        self.assertIsNone(claim_next_job())
+        job.refresh_from_db()
+        self.assertEqual(job.status, BackgroundRemovalJob.STATUS_FAILED)
+
+    def test_profile_is_part_of_cache_key(self):
+        source = self.image.name
+        keys = {nobg_target(source, profile)[0] for profile in ("fast", "default", "quality")}
+        self.assertEqual(len(keys), 3)
+        with override_settings(CAROUSEL_NOBG_PROFILE="fast"):
+            self.assertEqual(nobg_target(source), nobg_target(source, "fast"))
+        with self.assertRaises(ImproperlyConfigured):
+            nobg_target(source, "inconnu")
+
+    def test_cutout_is_trimmed_capped_and_encoded_as_webp(self):
+        image = Image.new("RGBA", (2000, 1000), (0, 0, 0, 0))
+        image.paste((200, 30, 30, 255), (500, 250, 1000, 750))
+        image.paste((30, 30, 200, 255), (1200, 250, 1500, 500))  # zone transparente entre les deux
+        compact = compact_cutout(image, (900, 640))
+        self.assertEqual(compact.size, (900, 450))
+
+        data = encode_cutout(compact, "webp", 85)
+        self.assertEqual(data[8:12], b"WEBP")
+        with Image.open(io.BytesIO(data)) as decoded:
+            self.assertEqual(decoded.getpixel((800, 400))[3], 0)
+
+        self.assertTrue(nobg_target(self.image.name)[1].endswith(".webp"))
+        with override_settings(CAROUSEL_NOBG_FORMAT="png"):
+            self.assertTrue(nobg_target(self.image.name)[1].endswith(".png"))
+
+    def test_batch_reports_each_image(self):
+        items = [(self.image.name, "carousel_nobg/a.webp"), ("products/absente.jpg", "carousel_nobg/b.webp")]
+        with mock.patch("api.services.background_removal._remove_background",
+                        side_effect=[_fake_remove_background(self.image.name), FileNotFoundError("absente")]):
+            results = list(remove_backgrounds_parallel(items, workers=1))
+        self.assertEqual([(source, error) for source, _, error, _ in results], [
+            (self.image.name, None), ("products/absente.jpg", "FileNotFoundError: absente"),
+        ])
+        self.assertTrue(default_storage.exists("carousel_nobg/a.webp"))
+
+
+# Résumés de notes
+# Résumés de notes
+
+class RatingSummaryTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.product = create_products(1)[0]
+
+    def comment(self, note, **kwargs):
+        return Commentaire.objects.create(
+            product=self.product, nom="Client", email="client@example.com",
+            commentaire="Très bon produit, je recommande.", note=note, **kwargs
+        )
+
+    def summary(self):
+        self.product.refresh_from_db()
+        return self.product.get_rating_summary()
+
+    def test_incremental_updates(self):
+        five = self.comment(5, is_approved=True)
+        self.comment(3, is_approved=True)
+        pending = self.comment(1)
+        self.assertEqual((self.summary().approved_count, self.product.average_rating), (2, 4.0))
+
+        pending.is_approved = True
+        pending.save()
+        five.delete()
+        summary = self.summary()
+        self.assertEqual((summary.approved_count, summary.rating_sum), (2, 4))
+        self.assertEqual((summary.count_1, summary.count_3, summary.count_5), (1, 1, 0))
+
+    def test_flagged_approved_comments_count_for_product_only(self):
+        self.comment(4, is_approved=True)
+        flagged = self.comment(1, is_approved=True, is_flagged=True)
+        # Product.comment_count / average_rating : tous les commentaires approuvés (comme avant le résumé)
+        self.summary()
+        self.assertEqual((self.product.comment_count, self.product.average_rating), (2, 2.5))
+        # Affichage public : approuvés et non signalés
+        response = APIClient().get(f"/api/product-commentaires/{self.product.id}/")
+        self.assertEqual((response.data["total_count"], response.data["average_rating"]), (1, 4.0))
+
+        flagged.is_flagged = False
+        flagged.save()
+        summary = self.summary()
+        self.assertEqual((summary.approved_count, summary.flagged_count, summary.count_1), (2, 0, 1))
+        rebuild_rating_summaries([self.product.id])
+        self.assertEqual((self.summary().approved_count, self.product.average_rating), (2, 2.5))
+
+    def test_admin_bulk_actions_rebuild_summary(self):
+        from django.contrib.admin.sites import site
+        from .admin import CommentaireAdmin
+
+        for note in (2, 4, 4):
+            self.comment(note)
+        admin = CommentaireAdmin(Commentaire, site)
+        admin._moderate(Commentaire.objects.all(), is_approved=True, is_flagged=False)
+        self.assertEqual(self.summary().count_4, 2)
+        admin._moderate(Commentaire.objects.filter(note=4), is_flagged=True, is_approved=False)
+        self.assertEqual((self.summary().approved_count, self.product.comment_count), (1, 1))
+
+    def test_cursor_pagination_walks_both_ways(self):
+        comments = [self.comment(1 + i % 5, is_approved=True) for i in range(25)]
+        expected = [c.id for c in sorted(comments, key=lambda c: (c.created_at, c.id), reverse=True)]
+        client = APIClient()
+        url = f"/api/product-commentaires/{self.product.id}/"
+
+        pages, params = [], {"pagination": "cursor"}
+        while True:
+            with self.assertNumQueries(2):
+                data = client.get(url, params).data
+            pages.append([row["id"] for row in data["commentaires"]])
+            if not data["next"]:
+                break
+            params = {"cursor": data["next"]}
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        self.assertEqual(sum(pages, []), expected)
+
+        data = client.get(url, {"cursor": data["previous"]}).data
+        self.assertEqual([row["id"] for row in data["commentaires"]], pages[1])
+        self.assertTrue(data["has_next"] and data["has_previous"])
+
+        data = client.get("/api/commentaires/", {"pagination": "cursor", "count": "1", "page_size": 20}).data
+        self.assertEqual((data["count"], len(data["results"])), (25, 20))
+        self.assertEqual(client.get(url, {"cursor": "pas-un-curseur"}).status_code, 400)
+
+    def test_product_commentaires_endpoint_reads_summary(self):
+        for note in (5, 4, 4, 1):
+            self.comment(note, is_approved=True)
+        with self.assertNumQueries(2):
+            response = APIClient().get(f"/api/product-commentaires/{self.product.id}/")
+        self.assertEqual(response.data["total_count"], 4)
+        self.assertEqual(response.data["average_rating"], 3.5)
+        self.assertEqual(response.data["rating_distribution"][4], {"count": 2, "percent": 50.0})
@@ -24,6 +24,7 @@ from .views import (
     RequestOrangePaymentView,
     CheckOrangePaymentStatusView,
     MaSelectionViewSet,
+    HomepageViewSet,
 )
 
 router = DefaultRouter()
@@ -44,6 +45,7 @@ router.register(r'products', ProductDetailViewSet, basename='product-detail')
 router.register(r'commentaires', CommentaireViewSet, basename='commentaire')
 router.register(r'product-commentaires', ProductCommentairesViewSet, basename='product-commentaires')
 router.register(r'ma-selection', MaSelectionViewSet, basename='ma-selection')
+router.register(r'homepage', HomepageViewSet, basename='homepage')
 
 urlpatterns = [
     path("", include(router.urls)),
@@ -1,30 +1,54 @@
+from django.http import Http404, HttpResponse
 from django.shortcuts import render
+from django.utils.cache import get_conditional_response
 from django.utils.timezone import now
 from rest_framework import viewsets, status, permissions, filters
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
-import random
 from datetime import timedelta
 from .models import SiteSettings, ProductCarousel, ProductPromotion, Category, Product, ParametrePage
 from .serializers import SiteSettingsSerializer, ProductCarouselSerializer, ProductPromotionSerializer, \
-    CategorySerializer, CategoryNewProductsSerializer, ParametrePageSerializer
-from .models import SiteSettings, ProductCarousel, ProductPromotion, Category, Product, ParametrePage, ProductFlash, FlashProductItem, Commentaire, PendingPayPalOrder, PendingMTNMoMoOrder, PendingOrangeMoneyOrder, Order, OrderItem, MaSelection
+    CategorySerializer, ParametrePageSerializer
+from .models import SiteSettings, ProductCarousel, ProductPromotion, Category, Product, ParametrePage, FlashProductItem, Commentaire, PendingPayPalOrder, PendingMTNMoMoOrder, PendingOrangeMoneyOrder, Order, OrderItem, MaSelection, ProductRatingSummary
 from .serializers import SiteSettingsSerializer, ProductCarouselSerializer, ProductPromotionSerializer, \
-    CategorySerializer, CategoryNewProductsSerializer, ParametrePageSerializer, MainFlashProductSerializer, SecondaryFlashProductSerializer, ProductSearchSerializer, ProductDetailSerializer, CommentaireSerializer, CommentaireCreateSerializer, ProductCommentairesSummarySerializer, BoutiqueProductSerializer, MaSelectionSerializer, MaSelectionProductSerializer
-from django.db.models import Q, Count, Avg
-from rest_framework.throttling import UserRateThrottle, AnonRateThrottle
+    CategorySerializer, ParametrePageSerializer, refresh_remaining_time, MainFlashProductSerializer, SecondaryFlashProductSerializer, ProductSearchSerializer, ProductDetailSerializer, CommentaireSerializer, CommentaireCreateSerializer, ProductCommentairesSummarySerializer, BoutiqueProductSerializer
+from django.db.models import Q, Count, prefetch_related_objects
+from rest_framework.decorators import action
+from rest_framework.throttling import UserRateThrottle, AnonRateThrottle, ScopedRateThrottle
 from rest_framework.views import APIView
+from .pagination import KeysetPaginator, wants_count, wants_cursor
 from decimal import Decimal
 import os
 import re
 import requests
 import uuid
 import logging
+from .services.conditional import conditional_response
+from .services.flash import load_active_flash_snapshot
+from .services.homepage import (
+    HOMEPAGE_SECTIONS, HOMEPAGE_VERSION_NAMES, build_homepage_data, featured_promotions_queryset,
+    get_homepage_snapshot, ma_selection_payload, new_products_payload, refresh_homepage,
+)
+from .services.images import display_images_prefetch
+from .services.metrics import metrics_authorized, metrics_enabled, render_metrics
+from .services.pricing import PricingResolver, refresh_expired_prices
+from .services.projections import PRODUCT_LIST_FIELDS, product_list_data
+from .services.response_cache import cached_response
+from .services.search import fetch_search_ids, search_products
+from .services.suggest import suggest_index
+from .services.shuffle import current_shuffle_period, fetch_page, get_shuffled_ids
 
 # Create your views here.
 
 logger = logging.getLogger(__name__)
 
+# Versions dont dépendent les produits sérialisés avec leur prix (requêtes conditionnelles)
+PRICED_PRODUCT_VERSIONS = ('product', 'product_image', 'category', 'promotion', 'flash')
+
+# Les prix sont résolus à l'heure de la requête (fenêtres de promotion et de flash) :
+# les validateurs des réponses qui en contiennent changent au moins toutes les 60 s
+PRICE_VALIDATION_PERIOD = 60
+
 
 # Informations générales sur l'entreprise
 # Informations générales sur l'entreprise
@@ -34,6 +58,8 @@ class SiteSettingsViewSet(viewsets.ViewSet):
     permission_classes = [AllowAny]
     throttle_classes = []  # Désactiver le rate limiting pour les endpoints publics essentiels
 
+    @conditional_response('site_settings')
+    @cached_response('site_settings')
     def list(self, request):
         settings = SiteSettings.load()
         if not settings:
@@ -59,7 +85,9 @@ class ProductCarouselViewSet(viewsets.ReadOnlyModelViewSet):
     """
     API endpoint lecture seule pour les produits du carousel.
     """
-    queryset = ProductCarousel.objects.all().order_by('position')
+    queryset = ProductCarousel.objects.select_related('product').prefetch_related(
+        display_images_prefetch('product__')
+    ).order_by('position')
     serializer_class = ProductCarouselSerializer
     permission_classes = [permissions.AllowAny]  # lecture ouverte à tous
     throttle_classes = []  # Désactiver le rate limiting pour les endpoints publics essentiels
@@ -81,6 +109,17 @@ class ProductCarouselViewSet(viewsets.ReadOnlyModelViewSet):
                 queryset = queryset.filter(is_active=False)
         return queryset
 
+    # Réponses en cache, invalidées par les versions des modèles affichés
+    @conditional_response('carousel', 'product', 'product_image')
+    @cached_response('carousel', 'product', 'product_image')
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional_response('carousel', 'product', 'product_image')
+    @cached_response('carousel', 'product', 'product_image')
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
 
 # Fin Produit du carousel
 # Fin Produit du carousel
@@ -101,15 +140,11 @@ class FeaturedPromotionViewSet(viewsets.ReadOnlyModelViewSet):
     throttle_classes = []  # Désactiver le rate limiting pour les endpoints publics essentiels
 
     def get_queryset(self):
-        today = now()
         limit = self.request.query_params.get("limit")
 
-        qs = ProductPromotion.objects.filter(
-            is_active=True,
-            is_featured=True,
-            start_date__lte=today,
-            end_date__gte=today,
-        ).select_related("product").order_by("-created_at")
+        qs = featured_promotions_queryset().prefetch_related(
+            display_images_prefetch("product__")
+        )
 
         # Limite par défaut à 10, ou valeur passée en query param (?limit=5)
         try:
@@ -122,6 +157,17 @@ class FeaturedPromotionViewSet(viewsets.ReadOnlyModelViewSet):
 
         return qs[:limit]
 
+    # Filtré par dates de début/fin : durée de vie courte en plus des versions
+    @conditional_response('promotion', 'product', 'product_image', period=60)
+    @cached_response('promotion', 'product', 'product_image', timeout=60)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional_response('promotion', 'product', 'product_image', period=60)
+    @cached_response('promotion', 'product', 'product_image', timeout=60)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
 
 class ProductPromotionViewSet(viewsets.ReadOnlyModelViewSet):
     """
@@ -146,7 +192,9 @@ class ProductPromotionViewSet(viewsets.ReadOnlyModelViewSet):
             start_date__lte=today
         ).filter(
             end_date__gte=today
-        ).select_related('product').order_by('-created_at')
+        ).select_related('product').prefetch_related(
+            display_images_prefetch('product__')
+        ).order_by('-created_at')
 
 
 
@@ -161,6 +209,14 @@ class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
     throttle_classes = []  # Désactiver le rate limiting pour les endpoints publics essentiels
     lookup_field = 'slug'
 
+    @conditional_response('category')
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional_response('category')
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
 
 
 # Nouveaux produits (catégories + produits récents)
@@ -168,36 +224,9 @@ class NewProductsViewSet(viewsets.ViewSet):
     permission_classes = [AllowAny]
     throttle_classes = []  # Désactiver le rate limiting pour les endpoints publics essentiels
 
+    @conditional_response('parametre_page', *PRICED_PRODUCT_VERSIONS, period=PRICE_VALIDATION_PERIOD)
     def list(self, request):
-        parametres = ParametrePage.load()
-        category_limit = parametres.new_products_category_limit if parametres else 3
-        products_limit = parametres.new_products_per_category_limit if parametres else 12
-
-        # Filtrer uniquement les catégories qui ont au moins un produit actif
-        categories = (
-            Category.objects
-            .filter(products__is_active=True)
-            .distinct()
-            .order_by('name')
-        )[:category_limit]
-
-        serializer = CategoryNewProductsSerializer(
-            categories,
-            many=True,
-            context={'products_limit': products_limit}
-        )
-        
-        # Filtrer les résultats pour ne garder que les catégories avec des produits
-        filtered_results = [
-            category_data for category_data in serializer.data
-            if category_data.get('products') and len(category_data.get('products', [])) > 0
-        ]
-        
-        return Response({
-            "category_limit": category_limit,
-            "products_limit": products_limit,
-            "results": filtered_results
-        })
+        return Response(new_products_payload(ParametrePage.load()))
 
 
 # Paramètres de page
@@ -205,6 +234,8 @@ class ParametrePageViewSet(viewsets.ViewSet):
     permission_classes = [AllowAny]
     throttle_classes = []  # Désactiver le rate limiting pour les endpoints publics essentiels
 
+    @conditional_response('parametre_page')
+    @cached_response('parametre_page')
     def list(self, request):
         parametres = ParametrePage.load()
         if not parametres:
@@ -223,7 +254,7 @@ class ParametrePageViewSet(viewsets.ViewSet):
 # Flash promotion produit principal
 # Flash promotion produit principal
 
-from .models import ProductFlash, FlashProductItem
+from .models import FlashProductItem
 from .serializers import MainFlashProductSerializer, SecondaryFlashProductSerializer
 
 class MainFlashProductViewSet(viewsets.ViewSet):
@@ -234,21 +265,23 @@ class MainFlashProductViewSet(viewsets.ViewSet):
     permission_classes = [AllowAny]
     throttle_classes = []  # Désactiver le rate limiting pour les endpoints publics essentiels
 
+    @cached_response('flash', 'product', 'product_image', timeout=60, refresh=refresh_remaining_time)
     def list(self, request):
         """
         Retourne le produit principal du flash actif.
+        Servi depuis le cache, le temps restant est recalculé à chaque requête.
         """
-        # Récupérer le flash actif
-        flash = ProductFlash.objects.filter(is_active=True).first()
+        # Récupérer le flash actif (flash + produit principal + secondaires préchargés)
+        snapshot = load_active_flash_snapshot()
         
-        if not flash:
+        if not snapshot:
             return Response(
                 {"detail": "Aucun flash promotion actif trouvé."},
                 status=status.HTTP_404_NOT_FOUND
             )
         
         # Récupérer le produit principal
-        main_item = flash.main_item
+        main_item = snapshot.main_item
         
         if not main_item:
             return Response(
@@ -256,7 +289,7 @@ class MainFlashProductViewSet(viewsets.ViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        serializer = MainFlashProductSerializer(main_item)
+        serializer = MainFlashProductSerializer(main_item, context={'flash': snapshot.flash})
         return Response(serializer.data)
 
 
@@ -267,22 +300,114 @@ class SecondaryFlashProductViewSet(viewsets.ReadOnlyModelViewSet):
     """
     API endpoint pour les produits secondaires du flash promotion.
     Retourne tous les produits secondaires du flash actif.
+    Le flash est chargé une seule fois et partagé avec le serializer (contexte 'flash').
     """
     serializer_class = SecondaryFlashProductSerializer
     permission_classes = [AllowAny]
     throttle_classes = []  # Désactiver le rate limiting pour les endpoints publics essentiels
 
+    def get_flash_snapshot(self):
+        if not hasattr(self, '_flash_snapshot'):
+            self._flash_snapshot = load_active_flash_snapshot()
+        return self._flash_snapshot
+
     def get_queryset(self):
         """
         Retourne les produits secondaires du flash actif (limité à 8).
         """
-        flash = ProductFlash.objects.filter(is_active=True).first()
+        snapshot = self.get_flash_snapshot()
         
-        if not flash:
+        if not snapshot:
             return Product.objects.none()
         
-        # Retourner les produits secondaires du flash actif (limité à 8)
-        return flash.secondary_products.filter(is_active=True)[:8]
+        # Produits secondaires actifs déjà préchargés (limités à 8)
+        return snapshot.secondary_products
+
+    def get_object(self):
+        """Recherche le produit dans l'instantané (liste préchargée, pas de requête)."""
+        lookup = str(self.kwargs.get(self.lookup_url_kwarg or self.lookup_field))
+        for product in self.get_queryset():
+            if str(product.pk) == lookup:
+                return product
+        raise Http404
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        snapshot = self.get_flash_snapshot()
+        context['flash'] = snapshot.flash if snapshot else None
+        return context
+
+    # Réponses en cache : le temps restant est recalculé à chaque requête
+    @cached_response('flash', 'product', 'product_image', timeout=60, refresh=refresh_remaining_time)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @cached_response('flash', 'product', 'product_image', timeout=60, refresh=refresh_remaining_time)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+
+# Tri / filtrage par prix effectif (colonnes Product.effective_*)
+# Tri / filtrage par prix effectif (colonnes Product.effective_*)
+
+PRICE_ORDERINGS = {
+    'price': ('effective_price', 'id'),
+    '-price': ('-effective_price', '-id'),
+}
+
+
+def _get_price_params(request):
+    """
+    Lit les paramètres min_price, max_price et ordering (price / -price).
+    Lève ValueError si un paramètre est invalide.
+    """
+    params = {}
+    for name in ('min_price', 'max_price'):
+        value = request.query_params.get(name, '').strip()
+        try:
+            params[name] = int(value) if value else None
+        except ValueError:
+            raise ValueError(f"Le paramètre {name} doit être un entier.")
+
+    ordering = request.query_params.get('ordering', '').strip()
+    if ordering and ordering not in PRICE_ORDERINGS:
+        raise ValueError("Le paramètre ordering accepte uniquement 'price' ou '-price'.")
+    params['ordering'] = ordering or None
+
+    # Les prix effectifs dont une borne de flash/promotion est passée sont recalculés avant lecture
+    if any(value is not None for value in params.values()):
+        refresh_expired_prices()
+    return params
+
+
+def _filter_by_price(queryset, params):
+    """Applique min_price / max_price sur le prix effectif (SQL, index is_active + effective_price)."""
+    if params['min_price'] is not None:
+        queryset = queryset.filter(effective_price__gte=params['min_price'])
+    if params['max_price'] is not None:
+        queryset = queryset.filter(effective_price__lte=params['max_price'])
+    return queryset
+
+
+def _shuffle_scope(name, params):
+    """Clé de périmètre de l'index mélangé : les bornes de prix donnent un index distinct."""
+    if params['min_price'] is None and params['max_price'] is None:
+        return name
+    return f"{name}:{params['min_price']}-{params['max_price']}"
+
+
+def _next_promotion_boundary(today):
+    """Prochain début ou fin de promotion active : l'index des promotions expire à cette date."""
+    upcoming = ProductPromotion.objects.filter(is_active=True).filter(
+        Q(start_date__gt=today) | Q(end_date__gte=today)
+    ).values_list('start_date', 'end_date')
+    boundaries = []
+    for start_date, end_date in upcoming:
+        if start_date and start_date > today:
+            boundaries.append(start_date)
+        if end_date and end_date >= today:
+            boundaries.append(end_date + timedelta(microseconds=1))
+    return min(boundaries) if boundaries else None
 
 
 # Recherche de produits
@@ -292,10 +417,15 @@ class ProductSearchViewSet(viewsets.ViewSet):
     """
     API endpoint pour la recherche de produits.
     Accepte les paramètres:
-    - q: terme de recherche (recherche dans name, description, shot_description)
+    - q: terme de recherche (recherche plein texte dans name, description, shot_description,
+      insensible à la casse et aux accents, résultats triés par pertinence)
     - category: slug de la catégorie pour filtrer (optionnel)
     - page: numéro de page (défaut: 1)
     - page_size: nombre de résultats par page (défaut: 50, max: 50)
+    - min_price / max_price: bornes sur le prix effectif (optionnel)
+    - ordering: 'price' ou '-price' pour trier par prix effectif (défaut: plus récents)
+    - pagination=cursor puis cursor=<next|previous>: pagination par curseur (plus récents d'abord,
+      sans total sauf count=1), voir api/pagination.py
     
     Protections anti-scraping:
     - Rate limiting (100 req/heure pour anonymes, 1000 pour utilisateurs)
@@ -306,7 +436,9 @@ class ProductSearchViewSet(viewsets.ViewSet):
     permission_classes = [AllowAny]
     serializer_class = ProductSearchSerializer
     throttle_classes = [AnonRateThrottle, UserRateThrottle]
+    throttle_scope = 'suggest'  # ScopedRateThrottle de l'action suggest uniquement
 
+    @conditional_response(*PRICED_PRODUCT_VERSIONS, period=PRICE_VALIDATION_PERIOD)
     def list(self, request):
         """
         Recherche de produits par terme et/ou catégorie.
@@ -348,6 +480,11 @@ class ProductSearchViewSet(viewsets.ViewSet):
                 'message': f'Le terme de recherche doit contenir au moins {MIN_QUERY_LENGTH} caractères'
             }, status=status.HTTP_400_BAD_REQUEST)
 
+        try:
+            price_params = _get_price_params(request)
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
         # Protection : Limiter la taille de page
         if page_size > MAX_PAGE_SIZE:
             page_size = MAX_PAGE_SIZE
@@ -361,43 +498,113 @@ class ProductSearchViewSet(viewsets.ViewSet):
         if category_slug:
             queryset = queryset.filter(category__slug=category_slug)
 
-        # Recherche par terme si fourni
+        queryset = _filter_by_price(queryset, price_params).select_related('category')
+
+        # Trier par prix effectif si demandé, sinon par pertinence (recherche plein texte)
+        # ou par date de création (plus récents en premier)
+        if price_params['ordering']:
+            ordering = PRICE_ORDERINGS[price_params['ordering']]
+        else:
+            ordering = ('-created_at',)
+        fallback_queryset = queryset.order_by(*ordering)
+
+        # Recherche par terme si fourni (index FTS5, voir api/services/search.py)
+        ranked = False
         if query:
-            queryset = queryset.filter(
-                Q(name__icontains=query) |
-                Q(description__icontains=query) |
-                Q(shot_description__icontains=query)
+            queryset, ranked = search_products(queryset, query)
+        if price_params['ordering'] or not ranked:
+            queryset = queryset.order_by(*ordering)
+
+        if wants_cursor(request):
+            return self._list_with_cursor(
+                request, queryset, fallback_queryset, query, category_slug, page_size, price_params,
+                MAX_TOTAL_RESULTS,
             )
 
-        # Trier par date de création (plus récents en premier)
-        queryset = queryset.select_related('category').order_by('-created_at')
-
         # Protection : Limiter le nombre total de résultats
-        total_count = queryset.count()
-        if total_count > MAX_TOTAL_RESULTS:
-            queryset = queryset[:MAX_TOTAL_RESULTS]
-            total_count = MAX_TOTAL_RESULTS
+        # (les ids sont lus dans la limite, sans count() séparé sur toute la recherche)
+        result_ids = fetch_search_ids(
+            queryset, MAX_TOTAL_RESULTS,
+            fallback_queryset=fallback_queryset if query else None, query=query,
+        )
+        total_count = len(result_ids)
 
-        # Pagination
+        # Pagination : seules les lignes de la page sont chargées
         start = (page - 1) * page_size
         end = start + page_size
-        paginated_queryset = queryset[start:end]
+        paginated_products = fetch_page(fallback_queryset.only(*PRODUCT_LIST_FIELDS), result_ids[start:end])
 
-        # Sérialiser les résultats
-        serializer = ProductSearchSerializer(paginated_queryset, many=True)
+        # Représentation de ProductSearchSerializer (prix résolus en lot : 1 requête par source)
+        results = product_list_data(paginated_products, PricingResolver(paginated_products))
         
         return Response({
             'count': total_count,
             'page': page,
             'page_size': page_size,
             'total_pages': (total_count + page_size - 1) // page_size if total_count > 0 else 0,
-            'results': serializer.data,
+            'results': results,
             'query': query,
             'category': category_slug,
             'has_next': end < total_count,
             'has_previous': page > 1
         })
 
+    def _list_with_cursor(self, request, queryset, fallback_queryset, query, category_slug, page_size,
+                          price_params, max_results):
+        """
+        Pagination par curseur (?pagination=cursor puis ?cursor=...) : plus récents d'abord,
+        sans count() sauf si ?count=1. La limite totale de résultats est conservée dans le curseur.
+        """
+        if price_params['ordering']:
+            return Response(
+                {'detail': "Le paramètre ordering n'est pas disponible avec la pagination par curseur."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            paginator = KeysetPaginator(request, page_size, max_results=max_results)
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        fallback = fallback_queryset if query else None
+        page_ids = fetch_search_ids(
+            paginator.filter(queryset), paginator.limit + 1,
+            fallback_queryset=paginator.filter(fallback_queryset) if fallback is not None else None, query=query,
+        )
+        paginated_products = paginator.page(fetch_page(fallback_queryset.only(*PRODUCT_LIST_FIELDS), page_ids))
+
+        data = {
+            'results': product_list_data(paginated_products, PricingResolver(paginated_products)),
+            'query': query,
+            'category': category_slug,
+            **paginator.get_links(),
+        }
+        if wants_count(request):
+            data['count'] = len(fetch_search_ids(queryset, max_results, fallback_queryset=fallback, query=query))
+        return Response(data)
+
+    @action(detail=False, methods=['get'], throttle_classes=[ScopedRateThrottle])
+    def suggest(self, request):
+        """
+        Autocomplétion de la barre de recherche (/api/search/suggest/?q=ecr).
+        Noms de produits actifs et de catégories, servis depuis un index en mémoire
+        (api/services/suggest.py), sans requête SQL.
+        Paramètres:
+        - q: début de saisie (au moins 1 caractère)
+        - limit: nombre de suggestions (défaut: 8, max: 20)
+        """
+        MAX_LIMIT = 20
+        query = request.query_params.get('q', '').strip()
+        try:
+            limit = min(int(request.query_params.get('limit', 8)), MAX_LIMIT)
+        except ValueError:
+            return Response({'detail': 'Le paramètre limit doit être un entier.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        suggestions = suggest_index.ensure_loaded().search(query, limit) if query else []
+        return Response({
+            'query': query,
+            'results': suggestions,
+        })
+
 
 # Promotions (page avec pagination)
 # Promotions (page avec pagination)
@@ -419,6 +626,7 @@ class PromotionsViewSet(viewsets.ViewSet):
     serializer_class = ProductPromotionSerializer
     throttle_classes = [AnonRateThrottle, UserRateThrottle]
 
+    @conditional_response(*PRICED_PRODUCT_VERSIONS, period=PRICE_VALIDATION_PERIOD)
     def list(self, request):
         """
         Liste tous les produits en promotion actifs avec pagination et mélange.
@@ -456,30 +664,23 @@ class PromotionsViewSet(viewsets.ViewSet):
         
         queryset = queryset.select_related('product').order_by('-created_at')
         
-        # Debug: compter le nombre de promotions trouvées
-        total_before_shuffle = queryset.count()
-        
-        # Calculer le seed pour le mélange basé sur l'heure actuelle (change toutes les 2 heures)
-        current_time = now()
-        two_hours_period = int(current_time.timestamp() // 7200)
-        
-        # Utiliser ce nombre comme seed pour le random
-        random.seed(two_hours_period)
-        
-        # Évaluer le queryset et convertir en liste pour pouvoir le mélanger
-        # Utiliser list() pour forcer l'évaluation du queryset
-        promotions_list = list(queryset.all())
-        
-        # Mélanger la liste avec le seed
-        random.shuffle(promotions_list)
-        
-        # Calculer le nombre total
-        total_count = len(promotions_list)
+        # Index mélangé des ids (change toutes les 2 heures, recalculé au début/fin d'une promotion)
+        promotion_ids = get_shuffled_ids(
+            'promotions',
+            queryset,
+            version_names=('product', 'promotion'),
+            now=today,
+            valid_until=_next_promotion_boundary,
+        )
+        total_before_shuffle = total_count = len(promotion_ids)
         
-        # Pagination
+        # Pagination : seules les promotions de la page sont chargées
         start = (page - 1) * page_size
         end = start + page_size
-        paginated_promotions = promotions_list[start:end]
+        paginated_promotions = fetch_page(queryset, promotion_ids[start:end])
+
+        # Images de la page uniquement, en une requête
+        prefetch_related_objects(paginated_promotions, display_images_prefetch('product__'))
         
         # Sérialiser les résultats
         serializer = ProductPromotionSerializer(paginated_promotions, many=True)
@@ -521,11 +722,14 @@ class CategoryProductsViewSet(viewsets.ViewSet):
     Paramètres:
     - category_slug: slug de la catégorie (requis)
     - page: numéro de page (défaut: 1)
+    - min_price / max_price: bornes sur le prix effectif (optionnel)
+    - ordering: 'price' ou '-price' pour trier par prix effectif en SQL (remplace le mélange)
     """
     permission_classes = [AllowAny]
     serializer_class = BoutiqueProductSerializer
     throttle_classes = [AnonRateThrottle, UserRateThrottle]
 
+    @conditional_response('parametre_page', *PRICED_PRODUCT_VERSIONS, period=PRICE_VALIDATION_PERIOD)
     def list(self, request):
         """
         Liste tous les produits actifs d'une catégorie avec pagination et mélange.
@@ -562,42 +766,46 @@ class CategoryProductsViewSet(viewsets.ViewSet):
         if page_size < 1:
             page_size = 24
 
+        try:
+            price_params = _get_price_params(request)
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
         # Base queryset: uniquement les produits actifs de la catégorie
         queryset = Product.objects.filter(
             is_active=True,
             category=category
         ).select_related('category')
-        
-        # Calculer le seed pour le mélange basé sur l'heure actuelle (change toutes les 2 heures)
-        current_time = now()
-        two_hours_period = int(current_time.timestamp() // 7200)
-        
-        # Utiliser ce nombre comme seed pour le random
-        random.seed(two_hours_period)
-        
-        # Convertir le queryset en liste pour pouvoir le mélanger
-        products_list = list(queryset)
-        
-        # Mélanger la liste avec le seed
-        random.shuffle(products_list)
-        
-        # Calculer le nombre total
-        total_count = len(products_list)
-        
+        queryset = _filter_by_price(queryset, price_params)
+
         # Pagination
         start = (page - 1) * page_size
         end = start + page_size
-        paginated_products = products_list[start:end]
+
+        if price_params['ordering']:
+            # Tri par prix effectif : entièrement en SQL
+            queryset = queryset.order_by(*PRICE_ORDERINGS[price_params['ordering']])
+            total_count = queryset.count()
+            paginated_products = list(queryset.only(*PRODUCT_LIST_FIELDS)[start:end])
+        else:
+            # Index mélangé des ids (change toutes les 2 heures), puis uniquement les lignes de la page
+            product_ids = get_shuffled_ids(
+                _shuffle_scope(f'category:{category.id}', price_params),
+                queryset,
+                version_names=('product',),
+            )
+            total_count = len(product_ids)
+            paginated_products = fetch_page(queryset.only(*PRODUCT_LIST_FIELDS), product_ids[start:end])
         
-        # Sérialiser les résultats
-        serializer = BoutiqueProductSerializer(paginated_products, many=True)
+        # Représentation de BoutiqueProductSerializer (prix résolus en lot : 1 requête par source)
+        results = product_list_data(paginated_products, PricingResolver(paginated_products))
         
         return Response({
             'count': total_count,
             'page': page,
             'page_size': page_size,
             'total_pages': (total_count + page_size - 1) // page_size if total_count > 0 else 0,
-            'results': serializer.data,
+            'results': results,
             'has_next': end < total_count,
             'has_previous': page > 1,
             'category': {
@@ -624,11 +832,14 @@ class BoutiqueViewSet(viewsets.ViewSet):
     Paramètres:
     - page: numéro de page (défaut: 1)
     - page_size: nombre de résultats par page (max: valeur configurée dans ParametrePage)
+    - min_price / max_price: bornes sur le prix effectif (optionnel)
+    - ordering: 'price' ou '-price' pour trier par prix effectif en SQL (remplace le mélange)
     """
     permission_classes = [AllowAny]
     serializer_class = BoutiqueProductSerializer
     throttle_classes = [AnonRateThrottle, UserRateThrottle]
 
+    @conditional_response('parametre_page', *PRICED_PRODUCT_VERSIONS, period=PRICE_VALIDATION_PERIOD)
     def list(self, request):
         """
         Liste tous les produits actifs avec pagination et mélange.
@@ -652,41 +863,46 @@ class BoutiqueViewSet(viewsets.ViewSet):
         if page_size < 1:
             page_size = 24
 
+        try:
+            price_params = _get_price_params(request)
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
         # Base queryset: uniquement les produits actifs
         queryset = Product.objects.filter(is_active=True).select_related('category')
-        
-        # Calculer le seed pour le mélange basé sur l'heure actuelle (change toutes les 2 heures)
-        # Utiliser le timestamp divisé par 7200 (2 heures en secondes) comme seed
-        current_time = now()
-        # Calculer le nombre de périodes de 2 heures depuis l'epoch
-        two_hours_period = int(current_time.timestamp() // 7200)
-        
-        # Utiliser ce nombre comme seed pour le random
-        random.seed(two_hours_period)
-        
-        # Convertir le queryset en liste pour pouvoir le mélanger
-        products_list = list(queryset)
-        
-        # Mélanger la liste avec le seed
-        random.shuffle(products_list)
-        
-        # Calculer le nombre total
-        total_count = len(products_list)
-        
+        queryset = _filter_by_price(queryset, price_params)
+
+        # Période de 2 heures courante (seed du mélange)
+        two_hours_period = current_shuffle_period()
+
         # Pagination
         start = (page - 1) * page_size
         end = start + page_size
-        paginated_products = products_list[start:end]
+
+        if price_params['ordering']:
+            # Tri par prix effectif : entièrement en SQL
+            queryset = queryset.order_by(*PRICE_ORDERINGS[price_params['ordering']])
+            total_count = queryset.count()
+            paginated_products = list(queryset.only(*PRODUCT_LIST_FIELDS)[start:end])
+        else:
+            # Index mélangé des ids (calculé une fois par période), puis uniquement les lignes de la page
+            product_ids = get_shuffled_ids(
+                _shuffle_scope('boutique', price_params),
+                queryset,
+                version_names=('product',),
+            )
+            total_count = len(product_ids)
+            paginated_products = fetch_page(queryset.only(*PRODUCT_LIST_FIELDS), product_ids[start:end])
         
-        # Sérialiser les résultats
-        serializer = BoutiqueProductSerializer(paginated_products, many=True)
+        # Représentation de BoutiqueProductSerializer (prix résolus en lot : 1 requête par source)
+        results = product_list_data(paginated_products, PricingResolver(paginated_products))
         
         return Response({
             'count': total_count,
             'page': page,
             'page_size': page_size,
             'total_pages': (total_count + page_size - 1) // page_size if total_count > 0 else 0,
-            'results': serializer.data,
+            'results': results,
             'has_next': end < total_count,
             'has_previous': page > 1,
             'shuffle_seed': two_hours_period,  # Pour debug (peut être retiré en production)
@@ -704,6 +920,7 @@ class ProductDetailViewSet(viewsets.ViewSet):
     serializer_class = ProductDetailSerializer
     throttle_classes = []  # Désactiver le rate limiting pour les endpoints publics essentiels
 
+    @conditional_response(*PRICED_PRODUCT_VERSIONS, period=PRICE_VALIDATION_PERIOD)
     def retrieve(self, request, pk=None):
         """
         Récupère un produit par son slug ou son id.
@@ -727,7 +944,7 @@ class ProductDetailViewSet(viewsets.ViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        serializer = ProductDetailSerializer(product)
+        serializer = ProductDetailSerializer(product, context={'pricing': PricingResolver([product])})
         return Response(serializer.data)
 
 
@@ -855,12 +1072,25 @@ class CommentaireViewSet(viewsets.ModelViewSet):
     def list(self, request, *args, **kwargs):
         """
         Liste les commentaires approuvés avec pagination.
+        pagination=cursor puis cursor=<next|previous> : pagination par curseur (total si count=1).
         """
         queryset = self.get_queryset()
         
         # Pagination
         page = int(request.query_params.get('page', 1))
         page_size = min(int(request.query_params.get('page_size', 10)), 50)  # Max 50 par page
+
+        if wants_cursor(request):
+            # Pagination par curseur : coût constant quelle que soit la page, total sur demande
+            try:
+                paginator = KeysetPaginator(request, page_size)
+            except ValueError as e:
+                return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            rows = paginator.page(paginator.filter(queryset)[:paginator.limit + 1])
+            data = {'results': self.get_serializer(rows, many=True).data, **paginator.get_links()}
+            if wants_count(request):
+                data['count'] = queryset.count()
+            return Response(data)
         
         start = (page - 1) * page_size
         end = start + page_size
@@ -892,13 +1122,14 @@ class ProductCommentairesViewSet(viewsets.ViewSet):
     def retrieve(self, request, pk=None):
         """
         Récupère les commentaires d'un produit avec statistiques.
+        pagination=cursor puis cursor=<next|previous> : pagination par curseur.
         """
         try:
             # Récupérer le produit par slug ou id
             if pk and not pk.isdigit():
-                product = Product.objects.get(slug=pk, is_active=True)
+                product = Product.objects.select_related('rating_summary').get(slug=pk, is_active=True)
             else:
-                product = Product.objects.get(id=pk, is_active=True)
+                product = Product.objects.select_related('rating_summary').get(id=pk, is_active=True)
         except Product.DoesNotExist:
             return Response(
                 {'detail': 'Produit non trouvé.'},
@@ -910,27 +1141,34 @@ class ProductCommentairesViewSet(viewsets.ViewSet):
             product=product,
             is_approved=True,
             is_flagged=False
-        ).order_by('-created_at')
-        
-        # Calculer les statistiques
-        total_count = commentaires.count()
-        
-        # Note moyenne
-        avg_rating = commentaires.aggregate(Avg('note'))['note__avg']
-        average_rating = round(avg_rating, 1) if avg_rating else 0.0
+        ).select_related('product').order_by('-created_at')
         
-        # Distribution des notes
-        rating_distribution = {}
-        for i in range(1, 6):
-            count = commentaires.filter(note=i).count()
-            rating_distribution[i] = {
-                'count': count,
-                'percent': round((count / total_count * 100) if total_count > 0 else 0, 1)
-            }
+        # Statistiques lues dans le résumé dénormalisé (chargé avec le produit)
+        summary = product.get_rating_summary() or ProductRatingSummary(product=product)
+        total_count = summary.approved_count
+        average_rating = summary.average_rating
+        rating_distribution = summary.rating_distribution
         
         # Pagination
         page = int(request.query_params.get('page', 1))
         page_size = min(int(request.query_params.get('page_size', 10)), 50)
+
+        if wants_cursor(request):
+            # Pagination par curseur : coût constant quelle que soit la page (total lu dans le résumé)
+            try:
+                paginator = KeysetPaginator(request, page_size)
+            except ValueError as e:
+                return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            rows = paginator.page(paginator.filter(commentaires)[:paginator.limit + 1])
+            return Response({
+                'product_id': product.id,
+                'product_name': product.name,
+                'total_count': total_count,
+                'average_rating': average_rating,
+                'rating_distribution': rating_distribution,
+                'commentaires': CommentaireSerializer(rows, many=True).data,
+                **paginator.get_links(),
+            })
         
         start = (page - 1) * page_size
         end = start + page_size
@@ -964,10 +1202,30 @@ PAYPAL_MAX_AMOUNT_EUR = 50000
 CFA_TO_EUR_DEFAULT = Decimal("655.957")
 
 
+def _cart_product_id(item):
+    """Retourne l'id produit (int) d'un article du panier, ou None."""
+    try:
+        return int(item.get("id"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
 def _validate_cart(cart):
-    """Valide le panier et retourne (total_cfa, cart_snapshot) ou lève ValueError."""
+    """
+    Valide le panier et retourne (total_cfa, cart_snapshot) ou lève ValueError.
+    Le prix unitaire des produits actifs connus est recalculé côté serveur
+    (PricingResolver : flash / promotion / prix normal), en un nombre fixe de requêtes.
+    """
     if not isinstance(cart, list) or len(cart) > PAYPAL_MAX_ITEMS:
         raise ValueError("Panier invalide ou trop d'articles.")
+
+    product_ids = {_cart_product_id(item) for item in cart} - {None}
+    products = {
+        product.pk: product
+        for product in Product.objects.filter(pk__in=product_ids, is_active=True)
+    } if product_ids else {}
+    pricing = PricingResolver(products.values())
+
     total_cfa = 0
     snapshot = []
     for i, item in enumerate(cart):
@@ -980,6 +1238,9 @@ def _validate_cart(cart):
             qty = max(1, int(item.get("quantity", 1)))
         except (TypeError, ValueError):
             raise ValueError(f"Article {i}: champs invalides.")
+        product = products.get(_cart_product_id(item))
+        if product is not None:
+            price = pricing.final_price(product)
         if price < 0 or not name:
             raise ValueError(f"Article {i}: nom ou prix invalide.")
         total_cfa += price * qty
@@ -1578,35 +1839,105 @@ class MaSelectionViewSet(viewsets.ViewSet):
     permission_classes = [AllowAny]
     throttle_classes = []  # Désactiver le rate limiting pour les endpoints publics essentiels
 
+    @conditional_response('ma_selection', 'product', 'product_image')
+    @cached_response('ma_selection', 'product', 'product_image')
     def list(self, request):
         """
         Retourne la configuration Ma Selection avec les produits sélectionnés.
         """
-        ma_selection = MaSelection.load()
-        
-        if not ma_selection:
-            return Response({
-                'title': 'Ma Selection',
-                'is_active': False,
-                'products': []
-            })
-        
-        # Vérifier si la section est active
-        if not ma_selection.is_active:
-            return Response({
-                'title': ma_selection.title,
-                'is_active': False,
-                'products': []
-            })
-        
-        # Récupérer les produits actifs seulement
-        products = ma_selection.products.filter(is_active=True)
-        
-        serializer = MaSelectionSerializer(ma_selection)
-        
-        return Response({
-            'title': ma_selection.title,
-            'is_active': ma_selection.is_active,
-            'count': products.count(),
-            'results': MaSelectionProductSerializer(products, many=True).data
-        })
\ No newline at end of file
+        return Response(ma_selection_payload(MaSelection.load()))
+
+
+# Page d'accueil (toutes les sections en une requête HTTP)
+# Page d'accueil (toutes les sections en une requête HTTP)
+
+def _accepts_gzip(request):
+    """
+    Accept-Encoding autorise-t-il gzip ? Valeurs q respectées (gzip;q=0 : refusé),
+    '*' pris en compte si gzip n'est pas cité.
+    """
+    qualities = {}
+    for part in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        coding, *params = [item.strip() for item in part.split(';')]
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding.lower()] = quality
+    quality = qualities.get('gzip', qualities.get('x-gzip', qualities.get('*', 0.0)))
+    return quality > 0
+
+
+class HomepageViewSet(viewsets.ViewSet):
+    """
+    API endpoint agrégé de la page d'accueil : toutes les sections en une seule requête HTTP.
+    Chaque section a le même contenu que son endpoint dédié (mêmes serializers) ;
+    les images des produits du carousel et des promotions sont chargées en une requête,
+    le flash actif une seule fois pour ses deux sections.
+
+    Paramètres:
+    - sections: liste séparée par des virgules (défaut: toutes), parmi
+      site_settings, product_carousel, featured_promotions, flash_main_product,
+      flash_secondary_products, new_products, ma_selection
+
+    /api/homepage/snapshot/ : toutes les sections, pré-rendues (voir api.services.homepage)
+    """
+    permission_classes = [AllowAny]
+    throttle_classes = []  # Désactiver le rate limiting pour les endpoints publics essentiels
+
+    @cached_response(*HOMEPAGE_VERSION_NAMES, timeout=60, refresh=refresh_homepage)
+    def list(self, request):
+        requested = request.query_params.get('sections', '').strip()
+        sections = [name.strip() for name in requested.split(',') if name.strip()] or list(HOMEPAGE_SECTIONS)
+        unknown = [name for name in sections if name not in HOMEPAGE_SECTIONS]
+        if unknown:
+            return Response(
+                {'detail': f"Section(s) inconnue(s): {', '.join(unknown)}.", 'sections': HOMEPAGE_SECTIONS},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(build_homepage_data(sections))
+
+    @action(detail=False, methods=['get'])
+    def snapshot(self, request):
+        """
+        Instantané pré-rendu : octets JSON servis tels quels (gzip si Accept-Encoding
+        l'accepte), ETag fort, 304 si If-None-Match correspond (comparaison faible).
+        """
+        snapshot = get_homepage_snapshot()
+        use_gzip = _accepts_gzip(request)
+        etag = f'"{snapshot.etag}-gz"' if use_gzip else f'"{snapshot.etag}"'
+
+        # Comparaison faible d'If-None-Match (W/ ajouté par un proxy qui recompresse), '*' compris
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = HttpResponse(
+                snapshot.gzip_body if use_gzip else snapshot.body, content_type='application/json'
+            )
+            if use_gzip:
+                response['Content-Encoding'] = 'gzip'
+        response['ETag'] = etag
+        response['Vary'] = 'Accept-Encoding'
+        response['Cache-Control'] = 'public, max-age=0, must-revalidate'
+        return response
+
+
+# Métriques Prometheus
+# Métriques Prometheus
+
+
+def metrics_view(request):
+    """
+    Exposition Prometheus (/metrics) : métriques additionnées sur tous les workers.
+    404 si METRICS_ENABLED est désactivé, 403 si le jeton METRICS_TOKEN ne correspond pas.
+    """
+    if not metrics_enabled():
+        raise Http404
+    if not metrics_authorized(request):
+        return HttpResponse(status=403)
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+import sys
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -57,6 +58,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.MetricsMiddleware',  # inactif sauf METRICS_ENABLED
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -65,6 +67,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.middleware.QueryBudgetMiddleware',  # inactif sauf QUERY_BUDGET_ENABLED
 ]
 
 ROOT_URLCONF = 'commerce.urls'
@@ -91,6 +94,16 @@ WSGI_APPLICATION = 'commerce.wsgi.application'
 
 # Configuration minimale pour Django REST framework
 REST_FRAMEWORK = {
+    # JSON encodé / décodé par orjson s'il est installé (api/renderers.py)
+    "DEFAULT_RENDERER_CLASSES": [
+        "api.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+    "DEFAULT_PARSER_CLASSES": [
+        "api.renderers.FastJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ],
     "DEFAULT_AUTHENTICATION_CLASSES": [
         "rest_framework.authentication.SessionAuthentication",
         "rest_framework.authentication.TokenAuthentication",  # si utilisé
@@ -106,6 +119,7 @@ REST_FRAMEWORK = {
     "DEFAULT_THROTTLE_RATES": {
         "anon": "100/hour",  # 100 requêtes par heure pour les utilisateurs anonymes
         "user": "1000/hour",  # 1000 requêtes par heure pour les utilisateurs authentifiés
+        "suggest": "3000/hour",  # Autocomplétion : une requête par frappe, noms uniquement
     },
 }
 # ...existing code...
@@ -123,6 +137,12 @@ DATABASES = {
 }
 
 
+# Tests : l'historique des migrations api (0014–0017) crée deux fois les mêmes tables/champs,
+# la base de test est donc construite directement depuis les modèles.
+if len(sys.argv) > 1 and sys.argv[1] == "test":
+    MIGRATION_MODULES = {"api": None}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -217,9 +237,25 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 CAROUSEL_REMOVE_BACKGROUND = os.environ.get(
     "CAROUSEL_REMOVE_BACKGROUND", "true"
 ).strip().lower() in ("true", "1", "yes")
+# Profil de suppression de fond (api/services/background_removal.py, REMOVAL_PROFILES) :
+# fast (petit modèle u2netp, pour les petits VPS), default (u2net), default-downscaled, quality
+# Variable d'environnement : CAROUSEL_NOBG_PROFILE (défaut: default)
+CAROUSEL_NOBG_PROFILE = os.environ.get("CAROUSEL_NOBG_PROFILE", "default").strip()
 
 # PayPal (paiement géré côté backend uniquement)
 # Définir dans l'environnement : PAYPAL_CLIENT_ID, PAYPAL_CLIENT_SECRET
 # Optionnel : PAYPAL_MODE=sandbox|live, PAYPAL_CURRENCY=EUR, PAYPAL_CFA_TO_EUR=655.957
 
-
+# Instrumentation SQL par requête (api/middleware.py) : en-têtes X-DB-Queries / Server-Timing
+# (hors production) et avertissement quand une route dépasse son budget de requêtes
+# (api/services/query_budget.py) ou répète la même requête (N+1).
+# Variable d'environnement : QUERY_BUDGET_ENABLED (true/false), désactivé par défaut
+QUERY_BUDGET_ENABLED = os.environ.get("QUERY_BUDGET_ENABLED", "false").strip().lower() in ("true", "1", "yes")
+QUERY_BUDGET_HEADERS = DEBUG
+
+# Métriques Prometheus (api/services/metrics.py) exposées sur /metrics : latence et codes
+# par route, temps SQL, hit / miss des caches, durée des appels PayPal / MTN / Orange.
+# Variables d'environnement : METRICS_ENABLED (true/false), désactivé par défaut ;
+# METRICS_TOKEN (optionnel) : /metrics exige alors l'en-tête Authorization: Bearer <jeton>
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "false").strip().lower() in ("true", "1", "yes")
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
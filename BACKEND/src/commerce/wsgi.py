@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'commerce.settings')
 
 application = get_wsgi_application()
+
+# Index d'autocomplétion construit au démarrage du worker, hors du chemin des requêtes
+from api.services.suggest import warm_up_in_background  # noqa: E402
+
+warm_up_in_background()